@@ -0,0 +1,92 @@
+"""
+Headless agent: runs AgentService, plus the Syncer when upload sinks are
+configured, without loading tkinter, PIL or the updater.
+
+    python agent.py [--config path/to/insight.yaml]
+
+Stops cleanly on Ctrl+C / SIGTERM (SIGBREAK on Windows). Cold-start time is
+recorded in the agent's telemetry as the "startup" stage (since process
+creation) and "startup.imports" (loading the agent's modules).
+"""
+import time
+
+_T0 = time.perf_counter()
+
+import argparse
+import os
+import signal
+import sys
+import threading
+
+
+def _since_process_start() -> float:
+    """Seconds since the OS created this process, interpreter start-up included."""
+    try:
+        import psutil
+
+        return max(0.0, time.time() - psutil.Process(os.getpid()).create_time())
+    except Exception:
+        return time.perf_counter() - _T0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Run the Insight agent without the GUI.")
+    ap.add_argument("--config", help="insight.yaml to use (default: ./insight.yaml)")
+    ap.add_argument("--run-for", type=float, help="stop after this many seconds")
+    args = ap.parse_args(argv)
+
+    stop = threading.Event()
+
+    def on_signal(signum, frame):
+        stop.set()
+
+    for name in ("SIGINT", "SIGTERM", "SIGBREAK"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), on_signal)
+
+    from config import load_cfg
+    from service import AgentService
+    from transport.local_store import StoreBusy
+
+    cfg = load_cfg(args.config)
+    imports = time.perf_counter() - _T0
+
+    try:
+        agent = AgentService(cfg)
+    except StoreBusy as e:
+        print(f"insight agent: {e}", file=sys.stderr)
+        return 1
+    agent.start()
+    syncer = None
+    if cfg.get("enable_http") or cfg.get("sinks"):
+        from syncer import Syncer
+
+        syncer = Syncer(cfg, store=agent.store)
+        syncer.start()
+
+    startup = _since_process_start()
+    agent.telemetry.record("startup", startup)
+    agent.telemetry.record("startup.imports", imports)
+    rss = agent.telemetry.rss_mb() or 0.0
+    print(
+        f"insight agent running: startup {startup * 1000:.0f} ms (imports {imports * 1000:.0f} ms), "
+        f"rss {rss:.1f} MB, sinks: {', '.join(syncer.sinks) if syncer and syncer.sinks else 'none'}",
+        file=sys.stderr,
+        flush=True,
+    )
+
+    deadline = time.monotonic() + args.run_for if args.run_for else None
+    try:
+        # short waits so signals are handled promptly on every platform
+        while not stop.wait(1.0):
+            if deadline and time.monotonic() >= deadline:
+                break
+    finally:
+        if syncer:
+            syncer.stop()
+        agent.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,178 @@
+import math
+
+from transport.rollups import QuantileSketch
+
+# severity -> priority stored with the alert; higher is sent first
+SEVERITIES = {"critical": 2, "warning": 1, "info": 0}
+# derived from the sample rather than collected
+DERIVED_FIELDS = ("disk_percent",)
+WARMUP_SAMPLES = 30
+# the rolling sketch is halved every this many samples, so it tracks roughly the last 2x that many
+SKETCH_WINDOW = 720
+
+
+class Ewma:
+    """Exponentially weighted mean and variance in O(1) memory; `halflife` is in samples."""
+
+    __slots__ = ("alpha", "mean", "var", "n")
+
+    def __init__(self, halflife: float = 60):
+        self.alpha = 1 - 0.5 ** (1 / max(1.0, halflife))
+        self.mean = 0.0
+        self.var = 0.0
+        self.n = 0
+
+    def add(self, x: float):
+        if self.n == 0:
+            self.mean = x
+        else:
+            d = x - self.mean
+            incr = self.alpha * d
+            self.mean += incr
+            self.var = (1 - self.alpha) * (self.var + d * incr)
+        self.n += 1
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.var)
+
+
+class FieldStats:
+    """Running statistics for one field: an EWMA and a decaying quantile sketch."""
+
+    __slots__ = ("ewma", "sketch", "_since_decay")
+
+    def __init__(self, halflife: float = 60):
+        self.ewma = Ewma(halflife)
+        self.sketch = QuantileSketch()
+        self._since_decay = 0
+
+    @property
+    def n(self) -> int:
+        return self.ewma.n
+
+    def add(self, x: float):
+        self.ewma.add(x)
+        self.sketch.add(x)
+        self._since_decay += 1
+        if self._since_decay >= SKETCH_WINDOW:
+            self.sketch.scale(0.5)
+            self._since_decay = 0
+
+
+class Rule:
+    """
+    One alert rule from `alerts:` in insight.yaml. Exactly one condition:
+
+      above / below: X    fixed threshold
+      deviation: K        more than K standard deviations from the field's EWMA
+                          (direction: up | down | both, default up)
+      quantile: Q         above the field's rolling Q-quantile (e.g. 0.99)
+
+    `for: N` consecutive breaching samples fire the alert and N clean ones
+    resolve it (default 1). `min_delta` widens a deviation band to at least
+    that far from the average, so a field that is nearly constant does not
+    alert on noise. Deviation and quantile rules stay quiet until
+    the field has `warmup` samples.
+    """
+
+    def __init__(self, spec: dict, fields):
+        self.name = spec.get("name") or f"{spec.get('field')}"
+        self.field = spec.get("field")
+        if self.field not in fields:
+            raise ValueError(f"Alert rule {self.name!r}: unknown field {self.field!r}")
+        kinds = [k for k in ("above", "below", "deviation", "quantile") if spec.get(k) is not None]
+        if len(kinds) != 1:
+            raise ValueError(f"Alert rule {self.name!r}: set exactly one of above, below, deviation, quantile")
+        self.kind = kinds[0]
+        self.arg = float(spec[self.kind])
+        if self.kind == "quantile" and not 0 < self.arg < 1:
+            raise ValueError(f"Alert rule {self.name!r}: quantile must be between 0 and 1")
+        self.direction = spec.get("direction", "up")
+        if self.direction not in ("up", "down", "both"):
+            raise ValueError(f"Alert rule {self.name!r}: direction must be up, down or both")
+        self.severity = spec.get("severity", "warning")
+        if self.severity not in SEVERITIES:
+            raise ValueError(f"Alert rule {self.name!r}: severity must be one of {', '.join(SEVERITIES)}")
+        self.samples = max(1, int(spec.get("for", 1)))
+        self.warmup = int(spec.get("warmup", WARMUP_SAMPLES))
+        self.min_delta = float(spec.get("min_delta", 0))
+        self.firing = False
+        self._streak = 0
+
+    def check(self, x: float, stats: FieldStats):
+        """(breached, limit) for value x against stats gathered before it; breached is None while warming up."""
+        if self.kind == "above":
+            return x > self.arg, self.arg
+        if self.kind == "below":
+            return x < self.arg, self.arg
+        if stats.n < self.warmup:
+            return None, None
+        if self.kind == "quantile":
+            limit = stats.sketch.quantile(self.arg)
+            return limit is not None and x > limit, limit
+        mean, band = stats.ewma.mean, max(self.arg * stats.ewma.std, self.min_delta)
+        if self.direction == "down":
+            return x < mean - band, mean - band
+        if self.direction == "both" and x < mean:
+            return x < mean - band, mean - band
+        return x > mean + band, mean + band
+
+    def step(self, breached: bool):
+        """Advance the fire/resolve debounce; returns "firing", "resolved" or None."""
+        if breached == self.firing:
+            self._streak = 0
+            return None
+        self._streak += 1
+        if self._streak < self.samples:
+            return None
+        self._streak = 0
+        self.firing = breached
+        return "firing" if breached else "resolved"
+
+
+class RuleEngine:
+    """
+    Evaluates alert rules against every resource sample as it is collected,
+    so alerts do not wait for upload or server-side processing.
+
+    Per field it keeps one FieldStats (constant memory however long the
+    agent runs); each sample is checked against the statistics from before
+    it, then folded in. feed() returns alert dicts shaped like schema.Alert.
+    """
+
+    def __init__(self, specs, fields, halflife: float = 60):
+        self.fields = tuple(fields) + DERIVED_FIELDS
+        self.rules = [Rule(spec, self.fields) for spec in specs or ()]
+        self._stats = {r.field: FieldStats(halflife) for r in self.rules}
+
+    def feed(self, ts, values: dict) -> list:
+        if not self.rules:
+            return []
+        values = dict(values)
+        if values.get("disk_total_gb"):
+            values["disk_percent"] = 100.0 * (values.get("disk_used_gb") or 0) / values["disk_total_gb"]
+        out = []
+        for rule in self.rules:
+            x = values.get(rule.field)
+            if x is None:
+                continue
+            breached, limit = rule.check(x, self._stats[rule.field])
+            if breached is None:
+                continue
+            state = rule.step(breached)
+            if state:
+                out.append({
+                    "ts": ts,
+                    "rule": rule.name,
+                    "field": rule.field,
+                    "state": state,
+                    "severity": rule.severity,
+                    "value": x,
+                    "limit": limit,
+                })
+        for field, stats in self._stats.items():
+            x = values.get(field)
+            if x is not None:
+                stats.add(x)
+        return out
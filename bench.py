@@ -0,0 +1,480 @@
+"""
+Benchmarks for the agent's hot paths.
+
+    python bench.py                      # full scale: 14 days at 30 s, 1,000 processes
+    python bench.py --quick              # ~1/10 scale smoke run
+    python bench.py --out before.json
+    python bench.py --out after.json --compare before.json
+
+Every case reports seconds, ops and ops/sec; results are written as JSON so
+runs from different versions can be diffed with --compare. Synthetic data
+is seeded, so two runs at the same scale do the same work.
+"""
+import argparse
+import gzip
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import VERSION
+from schema import InsightEnvelope, DeviceIdentity, ResourceSample, ProcessSample, ProcessInfo, NicRate, DiskRate
+from transport import columnar
+from transport.local_store import LocalStore
+import collectors.processes as processes
+
+TICK_SECONDS = 30
+TOP_N = 8
+GIB = 1024 ** 3
+MEM_TOTAL = 16 * GIB
+DISK_TOTAL = 511_705_088_000
+
+
+# ---------- Synthetic data ----------
+def _device():
+    return DeviceIdentity(
+        hostname="BENCH-PC-0042",
+        os="Windows",
+        os_version="10.0.19045",
+        macs=["00:15:5d:01:02:03", "00:15:5d:01:02:04"],
+        serial="PF3ABCDE",
+        model="ThinkPad T14 Gen 3",
+        domain="corp.example.com",
+    )
+
+
+def _envelopes(days: float, seed: int = 42):
+    """
+    One resource and one process envelope per tick, `days` back from now,
+    with values shaped like the collectors' output: psutil CPU% / memory%
+    in steps of 0.1, rates rounded as collectors.net / collectors.disk do,
+    and unrounded disk sizes (bytes / 2**30) and process memory% (RSS / RAM).
+    """
+    rnd = random.Random(seed)
+    dev = _device()
+    tags = {"site": "HQ", "dept": "IT"}
+    names = [f"proc{i:03d}.exe" for i in range(200)]
+    ticks = int(days * 86400 / TICK_SECONDS)
+    start = datetime.utcnow() - timedelta(days=days)
+    disk_used = 200 * GIB
+    for i in range(ticks):
+        ts = start + timedelta(seconds=i * TICK_SECONDS)
+        disk_used += rnd.randint(-64, 256) * 4096
+        sample = ResourceSample(
+            ts=ts,
+            cpu_percent=round(rnd.uniform(0, 100), 1),
+            mem_percent=round(rnd.uniform(30, 90), 1),
+            disk_used_gb=disk_used / GIB,
+            disk_total_gb=DISK_TOTAL / GIB,
+            uptime_seconds=i * TICK_SECONDS,
+            net_tx_kbps=round(rnd.expovariate(1 / 50), 1),
+            net_rx_kbps=round(rnd.expovariate(1 / 200), 1),
+            nics=[NicRate(name="Ethernet", tx_bps=round(rnd.uniform(0, 1e5), 1), rx_bps=round(rnd.uniform(0, 1e6), 1),
+                          tx_pps=round(rnd.uniform(0, 100), 2), rx_pps=round(rnd.uniform(0, 800), 2))],
+            disks=[DiskRate(name="PhysicalDrive0", read_bps=round(rnd.uniform(0, 1e7), 1),
+                            write_bps=round(rnd.uniform(0, 1e7), 1), read_iops=round(rnd.uniform(0, 300), 2),
+                            write_iops=round(rnd.uniform(0, 300), 2))],
+        )
+        yield InsightEnvelope(device=dev, samples=[sample], tags=tags)
+        top = [
+            ProcessInfo(pid=rnd.randint(4, 60000), name=rnd.choice(names),
+                        cpu_percent=round(rnd.uniform(0, 50), 1),
+                        mem_percent=rnd.randint(1, 400_000) * 4096 / MEM_TOTAL * 100)
+            for _ in range(TOP_N)
+        ]
+        yield InsightEnvelope(device=dev, processes=ProcessSample(ts=ts, top=top), tags=tags)
+
+
+class _FakeProcess:
+    __slots__ = ("pid", "_name", "_cpu", "_mem")
+
+    def __init__(self, pid, rnd):
+        self.pid = pid
+        self._name = f"svc{pid % 300:03d}.exe"
+        self._cpu = rnd.uniform(0, 25)
+        self._mem = rnd.uniform(0, 5)
+
+    def oneshot(self):
+        return _NullContext()
+
+    def cpu_percent(self, interval=None):
+        return self._cpu
+
+    def name(self):
+        return self._name
+
+    def memory_percent(self):
+        return self._mem
+
+
+class _NullContext:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FakePsutil:
+    """Stands in for psutil inside collectors.processes so the process count is fixed."""
+
+    NoSuchProcess = processes.psutil.NoSuchProcess
+    AccessDenied = processes.psutil.AccessDenied
+
+    def __init__(self, count: int, seed: int = 42):
+        rnd = random.Random(seed)
+        self._procs = {pid: _FakeProcess(pid, rnd) for pid in range(1000, 1000 + count)}
+
+    def pids(self):
+        return list(self._procs)
+
+    def Process(self, pid):
+        return self._procs[pid]
+
+
+class _Sink(BaseHTTPRequestHandler):
+    """Local ingest endpoint: reads, unzips and acknowledges every body."""
+
+    protocol_version = "HTTP/1.1"
+    received = 0
+
+    def do_POST(self):
+        if self.headers.get("Transfer-Encoding") == "chunked":
+            data = bytearray()
+            while True:
+                n = int(self.rfile.readline().strip(), 16)
+                if n == 0:
+                    self.rfile.readline()
+                    break
+                data += self.rfile.read(n)
+                self.rfile.readline()
+        else:
+            data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+        type(self).received += len(data)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+# ---------- Harness ----------
+def _result(seconds: float, ops: int, **extra):
+    out = {"seconds": round(seconds, 6), "ops": ops, "ops_per_sec": round(ops / seconds, 1) if seconds else None}
+    out.update(extra)
+    return out
+
+
+def _best(fn, repeat: int):
+    """Fastest of `repeat` runs of fn() (least disturbed by the rest of the machine)."""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+class Bench:
+    def __init__(self, days: float, procs: int, repeat: int, workdir: str):
+        self.days = days
+        self.procs = procs
+        self.repeat = repeat
+        self.workdir = workdir
+        self.results = {}
+        self.filled = os.path.join(workdir, "filled.db")
+
+    def run(self, only=None):
+        cases = [
+            ("store.append_envelope", self.store_append_envelope),
+            ("store.append_json", self.store_append_json),
+            ("store.batch", self.store_batch),
+            ("store.row_groups", self.store_row_groups),
+            ("store.query", self.store_query),
+            ("store.prune_days", self.store_prune_days),
+            ("processes.top_n", self.processes_top_n),
+            ("processes.top_n_host", self.processes_top_n_host),
+            ("serialize.json", self.serialize_json),
+            ("serialize.columnar", self.serialize_columnar),
+            ("serialize.roundtrip_host", self.serialize_roundtrip_host),
+            ("sync.json", lambda: self.sync("json")),
+            ("sync.columnar", lambda: self.sync("columnar")),
+        ]
+        for name, fn in cases:
+            # the store fill feeds every later store/sync case
+            if only and name not in only and name != "store.append_envelope":
+                continue
+            print(f"  {name} ...", file=sys.stderr, flush=True)
+            self.results[name] = fn()
+        return self.results
+
+    def _copy(self, name: str) -> str:
+        path = os.path.join(self.workdir, name)
+        shutil.copyfile(self.filled, path)
+        return path
+
+    # ----- store -----
+    def store_append_envelope(self):
+        envs = list(_envelopes(self.days))
+        store = LocalStore(self.filled, commit_interval=2.0)
+        t0 = time.perf_counter()
+        futs = [store.append_envelope(e) for e in envs]
+        store.flush()
+        dt = time.perf_counter() - t0
+        for f in futs:
+            f.result()
+        store.close()
+        return _result(dt, len(envs), db_bytes=os.path.getsize(self.filled))
+
+    def store_append_json(self):
+        envs = list(_envelopes(min(self.days, 1.0), seed=7))
+        rows = [(e.samples[0].ts.isoformat() if e.samples else e.processes.ts.isoformat(), e.model_dump_json())
+                for e in envs]
+        store = LocalStore(os.path.join(self.workdir, "append_json.db"), commit_interval=2.0)
+        t0 = time.perf_counter()
+        for ts, payload in rows:
+            store.append_json(ts, payload)
+        store.flush()
+        dt = time.perf_counter() - t0
+        store.close()
+        return _result(dt, len(rows))
+
+    def _drain(self, read):
+        store = LocalStore(self.filled)
+        try:
+            def walk():
+                after, n = 0, 0
+                while True:
+                    got = read(store, after)
+                    if not got:
+                        return n
+                    after, n = got[-1][0], n + len(got)
+            rows = walk()
+            return _result(_best(walk, self.repeat), rows)
+        finally:
+            store.close()
+
+    def store_batch(self):
+        return self._drain(lambda s, after: s.batch(limit=200, after_id=after))
+
+    def store_row_groups(self):
+        def read(s, after):
+            groups = s.row_groups(limit=1000, after_id=after)
+            return [(g[1],) for g in groups for _ in range(g[2])]
+        return self._drain(read)
+
+    def store_query(self):
+        """A technician's lookup: 10 minutes at 1 m buckets, a day ago."""
+        store = LocalStore(self.filled)
+        try:
+            end = datetime.utcnow() - timedelta(days=min(1.0, self.days / 2))
+            start = end - timedelta(minutes=10)
+            return _result(_best(lambda: list(store.query(start, end, bucket=60)), self.repeat), 1)
+        finally:
+            store.close()
+
+    def store_prune_days(self):
+        path = self._copy("prune.db")
+        store = LocalStore(path)
+        keep = max(1, int(self.days // 2))
+        t0 = time.perf_counter()
+        store.prune_days(keep)
+        store.flush()
+        dt = time.perf_counter() - t0
+        store.close()
+        return _result(dt, 1, kept_days=keep)
+
+    # ----- collectors -----
+    def processes_top_n(self):
+        real = processes.psutil
+        processes.psutil = _FakePsutil(self.procs)
+        try:
+            coll = processes.ProcessCollector()
+            coll.top_n(TOP_N)  # first call creates the handles
+            dt = _best(lambda: coll.top_n(TOP_N), self.repeat)
+        finally:
+            processes.psutil = real
+        return _result(dt, 1, processes=self.procs)
+
+    def processes_top_n_host(self):
+        coll = processes.ProcessCollector()
+        coll.top_n(TOP_N)
+        dt = _best(lambda: coll.top_n(TOP_N), self.repeat)
+        return _result(dt, 1, processes=len(coll._procs))
+
+    # ----- serialization -----
+    def _groups(self, rows: int = 2000):
+        store = LocalStore(self.filled)
+        try:
+            groups = store.row_groups(limit=rows)
+            return [g[3] for g in groups], sum(g[2] for g in groups)
+        finally:
+            store.close()
+
+    def serialize_json(self):
+        groups, rows = self._groups()
+        envs = [columnar.to_envelope(g) for g in groups]
+        body = "[" + ",".join(e.model_dump_json() for e in envs) + "]"
+        enc = _best(lambda: [e.model_dump_json() for e in envs], self.repeat)
+        dec = _best(lambda: [InsightEnvelope.model_validate(x) for x in json.loads(body)], self.repeat)
+        raw = _best(lambda: json.loads(body), self.repeat)
+        return _result(enc, rows, decode_seconds=round(dec, 6), raw_decode_seconds=round(raw, 6), bytes=len(body),
+                       gzip_bytes=len(gzip.compress(body.encode("utf-8"), 6)))
+
+    def serialize_columnar(self):
+        groups, rows = self._groups()
+        body = columnar.encode_groups(groups)
+        enc = _best(lambda: columnar.encode_groups(groups), self.repeat)
+        dec = _best(lambda: columnar.decode(body), self.repeat)
+        raw = _best(lambda: columnar.decode_dicts(body), self.repeat)
+        return _result(enc, rows, decode_seconds=round(dec, 6), raw_decode_seconds=round(raw, 6), bytes=len(body),
+                       gzip_bytes=len(gzip.compress(body, 6)))
+
+    def serialize_roundtrip_host(self):
+        """This host's real collector output through the columnar codec; fails unless every value comes back."""
+        import system_info
+        from collectors.disk import DiskIOCollector
+        from collectors.net import NetCollector
+
+        net, disk, procs = NetCollector(), DiskIOCollector(), processes.ProcessCollector()
+        system_info.resources(cpu_interval=None)
+        net.collect(), disk.collect(), procs.collect()
+        envs = []
+        for _ in range(3):
+            time.sleep(0.5)
+            ts = datetime.utcnow()
+            totals = net.collect()
+            nics = totals.pop("nics")
+            sample = ResourceSample(ts=ts, nics=[NicRate(**n) for n in nics],
+                                    disks=[DiskRate(**d) for d in disk.collect()],
+                                    **system_info.resources(cpu_interval=None), **totals)
+            tick = procs.churn(TOP_N)
+            # every process, not just the top N: the small mem_percent values are the ones a rounding codec loses
+            tick["top"] = procs.collect()
+            snap = ProcessSample(ts=ts, **{kind: [ProcessInfo(**p) for p in ps] for kind, ps in tick.items()})
+            envs.append(InsightEnvelope(device=_device(), samples=[sample], processes=snap))
+        body = columnar.encode(envs)
+        dec = _best(lambda: columnar.decode(body), self.repeat)
+        changed = [i for i, (a, b) in enumerate(zip(envs, columnar.decode(body))) if a != b]
+        if changed or len(columnar.decode(body)) != len(envs):
+            raise AssertionError(f"columnar round trip changed envelope(s) {changed}")
+        return _result(dec, len(envs), processes=sum(len(e.processes.top) for e in envs), bytes=len(body))
+
+    # ----- sync -----
+    def sync(self, encoding: str):
+        from syncer import Syncer
+
+        path = self._copy(f"sync_{encoding}.db")
+        srv = ThreadingHTTPServer(("127.0.0.1", 0), _Sink)
+        threading.Thread(target=srv.serve_forever, daemon=True).start()
+        _Sink.received = 0
+        store = LocalStore(path, commit_interval=0.5)
+        last = store.conn.execute("SELECT value FROM meta WHERE key='last_id'").fetchone()
+        last = int(last[0]) if last else 0
+        cfg = {
+            "enable_http": True,
+            "http_endpoint": f"http://127.0.0.1:{srv.server_port}/ingest",
+            "device_token": "bench",
+            "http_encoding": encoding,
+            "sync_idle_seconds": 0.2,
+        }
+        syncer = Syncer(cfg, store=store)
+        t0 = time.perf_counter()
+        syncer.start()
+        while store.get_cursor(Syncer.CURSOR) < last and time.perf_counter() - t0 < 600:
+            time.sleep(0.05)
+        dt = time.perf_counter() - t0
+        syncer.stop()
+        store.close()
+        srv.shutdown()
+        srv.server_close()
+        return _result(dt, last, wire_bytes=_Sink.received)
+
+
+# ---------- Compare ----------
+def compare(old: dict, new: dict, threshold: float) -> int:
+    """Print per-case speed ratios; returns how many cases got slower than `threshold`."""
+    slower = 0
+    out = sys.stderr
+    print(f"{'case':<24}{'before s':>12}{'after s':>12}{'ratio':>9}", file=out)
+    for name, cur in new["results"].items():
+        prev = old.get("results", {}).get(name)
+        if not prev or not prev.get("seconds") or not cur.get("seconds"):
+            print(f"{name:<24}{'-':>12}{cur.get('seconds', 0):>12.4f}", file=out)
+            continue
+        # normalise by ops so runs at different scales still compare
+        before = prev["seconds"] / max(1, prev["ops"])
+        after = cur["seconds"] / max(1, cur["ops"])
+        ratio = after / before if before else float("inf")
+        flag = ""
+        if ratio > 1 + threshold:
+            flag, slower = "  slower", slower + 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+        print(f"{name:<24}{prev['seconds']:>12.4f}{cur['seconds']:>12.4f}{ratio:>9.2f}{flag}", file=out)
+    return slower
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark the agent's hot paths.")
+    ap.add_argument("--days", type=float, default=14, help="days of 30 s samples to generate (default 14)")
+    ap.add_argument("--procs", type=int, default=1000, help="synthetic processes for top_n (default 1000)")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per read-only case; the fastest is kept")
+    ap.add_argument("--quick", action="store_true", help="1.5 days, one run per case: a fast smoke run")
+    ap.add_argument("--only", nargs="*", help="case names to run")
+    ap.add_argument("--out", help="write results JSON here (default: stdout)")
+    ap.add_argument("--compare", help="previous results JSON to compare against")
+    ap.add_argument("--threshold", type=float, default=0.10, help="ratio change reported as slower/faster")
+    ap.add_argument("--keep", action="store_true", help="keep the scratch directory with the generated DBs")
+    args = ap.parse_args(argv)
+    if args.quick:
+        args.days, args.repeat = 1.5, 1
+
+    workdir = tempfile.mkdtemp(prefix="insight-bench-")
+    try:
+        print(f"insight bench: {args.days} days, {args.procs} processes -> {workdir}", file=sys.stderr)
+        results = Bench(args.days, args.procs, args.repeat, workdir).run(args.only)
+    finally:
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    doc = {
+        "meta": {
+            "version": VERSION,
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds") + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "days": args.days,
+            "procs": args.procs,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    text = json.dumps(doc, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        return 1 if compare(old, doc, args.threshold) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,186 @@
+"""
+Command-line access to the local store, for use on the device.
+
+    python cli.py query --at "yesterday 14:05" --window 10m
+    python cli.py query --from=-6h --bucket 5m --fields cpu_percent mem_percent --format csv
+    python cli.py export --from=-14d --format jsonl -o history.jsonl
+
+Times without a zone are local time; output is local time unless --utc.
+Relative times start with "-", so pass them as --from=-6h.
+"""
+import argparse
+import csv
+import json
+import os
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+from config import load_cfg
+from exporter import FORMATS, export_history
+from transport.local_store import LocalStore, RESOURCE_FIELDS
+
+DEFAULT_FIELDS = ("cpu_percent", "mem_percent", "net_tx_kbps", "net_rx_kbps")
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+# ---------- Parsing ----------
+def parse_duration(text: str) -> float:
+    """"90", "90s", "5m", "1.5h", "2d" -> seconds."""
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*", text or "")
+    if not m:
+        raise argparse.ArgumentTypeError(f"Bad duration: {text!r} (use e.g. 30s, 5m, 1h, 1d)")
+    return float(m.group(1)) * _UNITS[m.group(2) or "s"]
+
+
+def parse_time(text: str, now: datetime = None) -> datetime:
+    """
+    Point in time -> naive UTC. Accepts "now", relative offsets ("-2h"),
+    "HH:MM" (today), "yesterday HH:MM" and ISO dates/times; anything without
+    a zone is taken as local time.
+    """
+    now = now or datetime.now().astimezone()
+    text = (text or "").strip().lower()
+    if text == "now":
+        dt = now
+    elif text.startswith("-"):
+        dt = now - timedelta(seconds=parse_duration(text[1:]))
+    else:
+        day = now.date()
+        if text.startswith("yesterday"):
+            day -= timedelta(days=1)
+            text = text[len("yesterday"):].strip() or "00:00"
+        elif text.startswith("today"):
+            text = text[len("today"):].strip() or "00:00"
+        try:
+            if re.fullmatch(r"\d{1,2}:\d{2}(:\d{2})?", text):
+                fmt = "%H:%M:%S" if text.count(":") == 2 else "%H:%M"
+                dt = datetime.combine(day, datetime.strptime(text, fmt).time())
+            else:
+                dt = datetime.fromisoformat(text)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"Bad time: {text!r}")
+    if dt.tzinfo is None:
+        dt = dt.astimezone()  # local
+    return dt.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _db_path(args) -> str:
+    return args.db or load_cfg().get("sqlite_path") or "insight.db"
+
+
+def _fmt_ts(ts: datetime, utc: bool) -> str:
+    if utc:
+        return ts.strftime("%Y-%m-%d %H:%M:%S") + "Z"
+    return ts.replace(tzinfo=timezone.utc).astimezone().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _num(v, width=0):
+    return f"{v:>{width}.1f}" if v is not None else f"{'-':>{width}}"
+
+
+# ---------- Commands ----------
+def cmd_query(args) -> int:
+    if args.at:
+        half = timedelta(seconds=args.window / 2)
+        start, end = args.at - half, args.at + half
+    else:
+        start, end = args.start, args.end
+    if end <= start:
+        print("Empty time range", file=sys.stderr)
+        return 2
+
+    # the configured tier retention tells query() which rollups still cover the range
+    store = LocalStore(_db_path(args), rollup_retention=load_cfg().get("rollup_retention_days"), read_only=True)
+    try:
+        points = store.query(start, end, args.fields, args.bucket)
+        out = sys.stdout
+        if args.format == "json":
+            for ts, point in points:
+                out.write(json.dumps({"ts": _fmt_ts(ts, args.utc), **point}, separators=(",", ":")) + "\n")
+        elif args.format == "csv":
+            w = csv.writer(out, lineterminator="\n")
+            w.writerow(["ts", *(f"{f}_{k}" for f in args.fields for k in ("min", "max", "avg", "n"))])
+            for ts, point in points:
+                w.writerow([_fmt_ts(ts, args.utc),
+                            *(point[f][k] for f in args.fields for k in ("min", "max", "avg", "n"))])
+        else:
+            width = 22
+            out.write(f"{'time':<20}" + "".join(f"{f:>{width}}" for f in args.fields) + "\n")
+            for ts, point in points:
+                cells = "".join(
+                    f"{_num(point[f]['avg'])} ({_num(point[f]['min'])}-{_num(point[f]['max'])})".rjust(width)
+                    for f in args.fields
+                )
+                out.write(f"{_fmt_ts(ts, args.utc):<20}{cells}\n")
+            out.write("values: avg (min-max) per bucket\n")
+    finally:
+        store.close()
+    return 0
+
+
+def cmd_export(args) -> int:
+    if args.end <= args.start:
+        print("Empty time range", file=sys.stderr)
+        return 2
+    path = args.output
+    if not os.path.splitext(path)[1]:
+        path += FORMATS[args.format]
+
+    def progress(done, total):
+        sys.stderr.write(f"\r{done}/{total} rows")
+        sys.stderr.flush()
+
+    store = LocalStore(_db_path(args), read_only=True)
+    try:
+        rows = export_history(store, path, args.start, args.end, args.format, args.fields,
+                              on_progress=progress if sys.stderr.isatty() else None)
+    finally:
+        store.close()
+    if sys.stderr.isatty():
+        sys.stderr.write("\n")
+    print(f"{rows} rows written to {path}")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(prog="cli.py", description="Query or export the local Insight store.")
+    ap.add_argument("--db", help="SQLite file (default: sqlite_path from insight.yaml, else insight.db)")
+    sub = ap.add_subparsers(dest="command", required=True)
+
+    q = sub.add_parser("query", help="aggregated series over a time range")
+    q.add_argument("--from", dest="start", type=parse_time, default="-1h",
+                   help='range start (default -1h; e.g. "yesterday 14:00", --from=-6h)')
+    q.add_argument("--to", dest="end", type=parse_time, default="now", help="range end (default now)")
+    q.add_argument("--at", type=parse_time, help="centre of the range instead of --from/--to")
+    q.add_argument("--window", type=parse_duration, default=parse_duration("10m"), help="range width with --at")
+    q.add_argument("--bucket", type=parse_duration, default=parse_duration("1m"), help="bucket size (default 1m)")
+    q.add_argument("--fields", nargs="+", default=list(DEFAULT_FIELDS), choices=RESOURCE_FIELDS, metavar="FIELD",
+                   help=f"fields to aggregate (default: {' '.join(DEFAULT_FIELDS)})")
+    q.add_argument("--format", choices=("table", "csv", "json"), default="table")
+    q.add_argument("--utc", action="store_true", help="print times in UTC")
+    q.set_defaults(func=cmd_query)
+
+    e = sub.add_parser("export", help="write stored history to a file (CSV, JSON Lines or columnar)")
+    e.add_argument("--from", dest="start", type=parse_time, default="-1d", help="range start (default -1d)")
+    e.add_argument("--to", dest="end", type=parse_time, default="now", help="range end (default now)")
+    e.add_argument("--format", choices=tuple(FORMATS), default="csv",
+                   help="csv / jsonl: one line per resource sample; columnar: everything stored, compact")
+    e.add_argument("--fields", nargs="+", default=list(RESOURCE_FIELDS), choices=RESOURCE_FIELDS, metavar="FIELD",
+                   help="sample fields for csv / jsonl (default: all)")
+    e.add_argument("-o", "--output", required=True, help="file to write (extension added if missing)")
+    e.set_defaults(func=cmd_export)
+    return ap
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except (ValueError, OSError) as e:
+        print(str(e), file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,45 @@
+import os
+
+import psutil
+
+from collectors.rates import RateTracker
+
+# virtual block devices that are never the disk a user is complaining about
+_SKIP_PREFIXES = ("loop", "ram", "zram", "fd", "sr")
+
+
+def _is_physical(name: str) -> bool:
+    if name.startswith(_SKIP_PREFIXES):
+        return False
+    # Linux lists partitions (sda1) too; whole disks are the ones in /sys/block
+    if os.path.isdir("/sys/block"):
+        return os.path.exists(os.path.join("/sys/block", name))
+    return True
+
+
+class DiskIOCollector:
+    """Per-physical-disk throughput and IOPS from one perdisk counter read per call."""
+
+    def __init__(self):
+        self._rates = RateTracker()
+
+    def collect(self):
+        try:
+            raw = psutil.disk_io_counters(perdisk=True, nowrap=False) or {}
+        except Exception:
+            raw = {}
+        counters = {
+            name: (c.read_bytes, c.write_bytes, c.read_count, c.write_count)
+            for name, c in raw.items()
+            if _is_physical(name)
+        }
+        return [
+            {
+                "name": name,
+                "read_bps": round(r[0], 1),
+                "write_bps": round(r[1], 1),
+                "read_iops": round(r[2], 2),
+                "write_iops": round(r[3], 2),
+            }
+            for name, r in sorted(self._rates.update(counters).items())
+        ]
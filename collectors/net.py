@@ -1,19 +1,49 @@
 import psutil
-import time
 
-_prev = None  # (ts, bytes_sent, bytes_recv)
+from collectors.rates import RateTracker
+
+
+class NetCollector:
+    """
+    Per-NIC and total throughput from one pernic counter read per call.
+
+    Returns the legacy totals (net_tx_kbps / net_rx_kbps, kilobits per second,
+    summed over every interface) plus a `nics` list of per-interface byte and
+    packet rates. Counter wrap/reset is handled per interface by RateTracker.
+    """
+
+    def __init__(self):
+        self._rates = RateTracker()
+
+    def collect(self):
+        counters = {
+            name: (c.bytes_sent, c.bytes_recv, c.packets_sent, c.packets_recv)
+            for name, c in psutil.net_io_counters(pernic=True, nowrap=False).items()
+            if any((c.bytes_sent, c.bytes_recv))
+        }
+        rates = self._rates.update(counters)
+        tx = sum(r[0] for r in rates.values()) * 8.0 / 1000.0
+        rx = sum(r[1] for r in rates.values()) * 8.0 / 1000.0
+        nics = [
+            {
+                "name": name,
+                "tx_bps": round(r[0], 1),
+                "rx_bps": round(r[1], 1),
+                "tx_pps": round(r[2], 2),
+                "rx_pps": round(r[3], 2),
+            }
+            for name, r in sorted(rates.items())
+        ]
+        return {"net_tx_kbps": round(tx, 1), "net_rx_kbps": round(rx, 1), "nics": nics}
+
+
+_default = None
+
 
 def throughput():
     """Return kbps tx/rx since last call. First call returns zeros."""
-    global _prev
-    now = psutil.net_io_counters()
-    ts = time.time()
-    if not _prev:
-        _prev = (ts, now.bytes_sent, now.bytes_recv)
-        return {"net_tx_kbps": 0.0, "net_rx_kbps": 0.0}
-    pts, psent, precv = _prev
-    dt = max(0.001, ts - pts)
-    tx = (now.bytes_sent - psent) * 8.0 / 1000.0 / dt
-    rx = (now.bytes_recv - precv) * 8.0 / 1000.0 / dt
-    _prev = (ts, now.bytes_sent, now.bytes_recv)
-    return {"net_tx_kbps": round(tx, 1), "net_rx_kbps": round(rx, 1)}
+    global _default
+    if _default is None:
+        _default = NetCollector()
+    res = _default.collect()
+    return {"net_tx_kbps": res["net_tx_kbps"], "net_rx_kbps": res["net_rx_kbps"]}
@@ -1,24 +1,112 @@
+import heapq
+import time
+
 import psutil
 
+# a process "moves" when its CPU% or memory% changes by at least this much between ticks
+MIN_MOVE = 1.0
+
+
+class ProcessCollector:
+    """
+    Keeps psutil.Process handles between calls so per-process CPU% is measured
+    over the real interval since the previous collection, not a few ms.
+
+    One pass per call: new PIDs get a handle (and report 0% on their first
+    tick), dead PIDs are evicted, and the top N is picked with a heap
+    instead of sorting every process.
+
+    The same pass records churn since the previous call from the PID set
+    it already maintains: `spawned` (new PIDs), `exited` (PIDs that are
+    gone, with their last values) and the processes whose usage moved by
+    at least MIN_MOVE. A PID whose name changed was reused and counts as
+    both exited and spawned. Only a PID that is gone (NoSuchProcess, or
+    missing from psutil.pids()) counts as exited; a transient error
+    carries the previous values forward. See churn().
+    """
+
+    def __init__(self):
+        self._procs: dict[int, psutil.Process] = {}
+        self._last: dict[int, dict] = {}
+        self.spawned = []
+        self.exited = []
+        self._moves = []
+        self.last_ts = None
+
+    def collect(self):
+        """Return [{pid, name, cpu_percent, mem_percent}] for every live process."""
+        first = not self._last
+        last = self._last
+        cur = {}
+        spawned, exited, moves = [], [], []
+        keep = set()
+        for pid in psutil.pids():
+            p = self._procs.get(pid)
+            if p is None:
+                try:
+                    p = psutil.Process(pid)
+                except (psutil.NoSuchProcess, psutil.AccessDenied):
+                    continue
+                self._procs[pid] = p
+            try:
+                with p.oneshot():
+                    cpu = p.cpu_percent(interval=None)
+                    rec = {
+                        "pid": pid,
+                        "name": (p.name() or "")[:128],
+                        "cpu_percent": float(cpu or 0.0),
+                        "mem_percent": float(p.memory_percent() or 0.0),
+                    }
+            except psutil.NoSuchProcess:
+                self._procs.pop(pid, None)
+                continue
+            except Exception:
+                # transient (AccessDenied, a passing OSError): the process is still there, so keep its
+                # handle and CPU baseline and carry its last values instead of reporting exit + respawn
+                if pid in last:
+                    cur[pid] = last[pid]
+                keep.add(pid)
+                continue
+            cur[pid] = rec
+            prev = last.get(pid)
+            if prev is None or prev["name"] != rec["name"]:
+                if prev is not None:
+                    exited.append(prev)
+                if not first:
+                    spawned.append(rec)
+                continue
+            move = max(abs(rec["cpu_percent"] - prev["cpu_percent"]), abs(rec["mem_percent"] - prev["mem_percent"]))
+            if move >= MIN_MOVE:
+                moves.append((move, rec))
+        for pid in self._procs.keys() - cur.keys() - keep:
+            del self._procs[pid]
+        exited += [rec for pid, rec in last.items() if pid not in cur]
+        self._last = cur
+        self.spawned, self.exited, self._moves = spawned, exited, moves
+        self.last_ts = time.monotonic()
+        return list(cur.values())
+
+    def top_n(self, n: int = 8):
+        return heapq.nlargest(n, self.collect(), key=lambda x: (x["cpu_percent"], x["mem_percent"]))
+
+    def churn(self, n: int = 8) -> dict:
+        """
+        Collect once and return {"top", "spawned", "exited", "movers"}:
+        the top N, every PID that appeared or went away since the last call
+        (short-lived processes included, however little they used), and
+        the N biggest movers.
+        """
+        top = self.top_n(n)
+        movers = [rec for _, rec in heapq.nlargest(n, self._moves, key=lambda m: m[0])]
+        return {"top": top, "spawned": self.spawned, "exited": self.exited, "movers": movers}
+
+
+_default = None
+
+
 def top_n(n: int = 8):
-    procs = []
-    # first call to cpu_percent establishes baseline; second returns real values
-    for p in psutil.process_iter(attrs=["pid", "name"]):
-        try:
-            p.cpu_percent(interval=None)
-        except Exception:
-            pass
-    for p in psutil.process_iter(attrs=["pid", "name", "memory_percent"]):
-        try:
-            info = p.info
-            cpu = p.cpu_percent(interval=0.0)  # non-blocking
-            procs.append({
-                "pid": int(info.get("pid") or 0),
-                "name": (info.get("name") or "")[:128],
-                "cpu_percent": float(cpu or 0.0),
-                "mem_percent": float(info.get("memory_percent") or 0.0),
-            })
-        except Exception:
-            continue
-    procs.sort(key=lambda x: (x["cpu_percent"], x["mem_percent"]), reverse=True)
-    return procs[:n]
+    """Module-level convenience wrapper around a shared ProcessCollector."""
+    global _default
+    if _default is None:
+        _default = ProcessCollector()
+    return _default.top_n(n)
@@ -0,0 +1,58 @@
+import time
+
+_WRAP_32 = 1 << 32
+_WRAP_64 = 1 << 64
+
+
+def counter_delta(prev: int, cur: int):
+    """
+    Increase of a monotonically growing OS counter between two reads.
+
+    A counter that went backwards either wrapped (32-bit counters on some
+    Windows NIC drivers and older kernels, 64-bit in theory) or was reset
+    (driver reload, device re-plugged). A wrap is assumed when the implied
+    increase is small relative to the counter width; otherwise it is a reset
+    and None is returned, because the increase since the reset is unknown.
+    """
+    if cur >= prev:
+        return cur - prev
+    for limit in (_WRAP_32, _WRAP_64):
+        if prev < limit:
+            wrapped = limit - prev + cur
+            if wrapped < limit // 4:
+                return wrapped
+            break
+    return None
+
+
+class RateTracker:
+    """
+    Turns per-device counter tuples into per-second rates between calls.
+
+    update({name: (c1, c2, ...)}) returns {name: (r1, r2, ...)} for devices
+    seen on the previous call too; new devices, and devices whose counters
+    were reset, are baselined and reported from the next call.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.clock = clock
+        self._prev = {}
+        self._ts = None
+
+    def update(self, counters: dict) -> dict:
+        now = self.clock()
+        rates = {}
+        if self._ts is not None:
+            dt = max(0.001, now - self._ts)
+            for name, cur in counters.items():
+                prev = self._prev.get(name)
+                if prev is None:
+                    continue
+                deltas = [counter_delta(p, c) for p, c in zip(prev, cur)]
+                if any(d is None for d in deltas):
+                    continue
+                rates[name] = tuple(d / dt for d in deltas)
+        # devices that disappeared simply drop out of _prev
+        self._prev = dict(counters)
+        self._ts = now
+        return rates
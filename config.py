@@ -1,6 +1,48 @@
+import os
+
 APP_NAME = "FSI Insight"
 VERSION = "1.7"
 
 GITHUB_OWNER = "Fractured-Systems-Integration"
 GITHUB_REPO = "ProjectInsight"
 DEFAULT_THEME = "light"
+
+# Agent settings; insight.yaml (next to the working directory) overrides any of these
+DEFAULTS = {
+    "interval_seconds": 30,
+    "sqlite_path": "insight.db",
+    "retention_days": 14,
+    "spool_max_mb": 256,
+    "commit_interval_seconds": 5,
+    "rollup_retention_days": {"1m": 3, "1h": 180, "1d": 1825},
+    "enable_http": False,
+    "http_endpoint": None,
+    "device_token": None,
+    "http_compress": True,
+    "http_encoding": "json",
+    "sync_max_in_flight": 4,
+    "sync_batch_rows": 200,
+    "sync_idle_seconds": 10,
+    "fact_cache_path": "insight_facts.json",
+    "telemetry_seconds": 300,
+    "process_full_every": 10,
+    "alerts": [],
+    "tags": {},
+}
+
+
+def load_cfg(path: str = None) -> dict:
+    """Load insight.yaml if present; fall back to safe defaults."""
+    base = dict(DEFAULTS)
+    path = path or os.path.join(os.getcwd(), "insight.yaml")
+    if os.path.exists(path):
+        try:
+            import yaml  # only needed when there is a file to read
+
+            with open(path, "r", encoding="utf-8") as f:
+                data = yaml.safe_load(f) or {}
+                base.update(data)
+        except Exception:
+            # Keep defaults if YAML is malformed
+            pass
+    return base
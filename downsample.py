@@ -0,0 +1,42 @@
+from bisect import bisect_left
+
+
+def minmax(xs, ys, x0: float, x1: float, buckets: int):
+    """
+    Shape-preserving downsample of a time-ordered series to `buckets` equal
+    x-slices over [x0, x1): each slice keeps its first, min, max and last
+    point (in x order), so spikes and the line's ends survive. Returns
+    (xs, ys) lists with at most 4 points per bucket; series that already
+    fit are returned unchanged.
+    """
+    lo, hi = bisect_left(xs, x0), bisect_left(xs, x1)
+    if hi - lo <= 4 * buckets or buckets <= 0:
+        return xs[lo:hi], ys[lo:hi]
+    out_x, out_y = [], []
+    width = (x1 - x0) / buckets
+    start = lo
+    for b in range(1, buckets + 1):
+        end = hi if b == buckets else bisect_left(xs, x0 + b * width, start, hi)
+        if end > start:
+            seg = ys[start:end]
+            i_min = start + seg.index(min(seg))
+            i_max = start + seg.index(max(seg))
+            for i in sorted({start, i_min, i_max, end - 1}):
+                out_x.append(xs[i])
+                out_y.append(ys[i])
+        start = end
+    return out_x, out_y
+
+
+def segments(xs, ys, max_gap: float):
+    """Split a series where consecutive points are more than `max_gap` apart (agent was off)."""
+    if not xs:
+        return []
+    out, cur = [], [(xs[0], ys[0])]
+    for i in range(1, len(xs)):
+        if xs[i] - xs[i - 1] > max_gap:
+            out.append(cur)
+            cur = []
+        cur.append((xs[i], ys[i]))
+    out.append(cur)
+    return out
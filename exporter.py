@@ -1,6 +1,99 @@
+import csv
+import json
+import os
+from itertools import islice
+
+from transport import columnar
+from transport.local_store import RESOURCE_FIELDS
+
+# format -> default file extension
+FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "columnar": ".isc"}
+CHUNK_ROWS = 5000
+
+
 def export_to_file(filepath, text_data):
     try:
         with open(filepath, 'w') as f:
             f.write(text_data)
     except Exception as e:
         raise IOError(f"Failed to save file: {e}")
+
+
+def _fmt_ts(ts) -> str:
+    return ts.isoformat() + "Z"
+
+
+def _write_rows(f, fmt, store, start, end, fields, chunk_rows, progress):
+    rows = store.samples_between(start, end, fields)
+    if fmt == "csv":
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(["ts", *fields])
+    while True:
+        chunk = list(islice(rows, chunk_rows))
+        if not chunk:
+            return
+        if fmt == "csv":
+            w.writerows([(_fmt_ts(ts), *values) for ts, *values in chunk])
+        else:
+            f.writelines(
+                json.dumps({"ts": _fmt_ts(ts), **dict(zip(fields, values))}, separators=(",", ":")) + "\n"
+                for ts, *values in chunk
+            )
+        if not progress(len(chunk)):
+            return
+
+
+def _write_columnar(f, store, start, end, chunk_rows, progress):
+    f.write(columnar.MAGIC)
+    for groups in store.groups_between(start, end, chunk_rows):
+        for _, _, _, group in groups:
+            f.write(columnar.frame_group(group))
+        if not progress(sum(n for _, _, n, _ in groups)):
+            return
+
+
+def export_history(store, filepath, start, end, fmt: str = "csv", fields=RESOURCE_FIELDS,
+                   on_progress=None, cancel=None, chunk_rows: int = CHUNK_ROWS):
+    """
+    Stream stored history for [start, end) (naive UTC) from a LocalStore to
+    a file, `chunk_rows` rows at a time, so memory stays flat however long
+    the range is.
+
+    csv / jsonl: one line per resource sample (`fields`, ISO UTC times).
+    columnar: every row with its per-device rates, process snapshots and
+    inventory records, as a transport.columnar body (decode_groups reads it).
+
+    on_progress(done, total) is called after each chunk; setting the
+    `cancel` event stops the export. The file is written under a temporary
+    name and only renamed into place once complete. Returns the number of
+    rows written, or None if cancelled.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    total = store.count_between(start, end, samples_only=fmt != "columnar")
+    done = 0
+
+    def progress(n):
+        nonlocal done
+        done += n
+        if on_progress:
+            on_progress(done, total)
+        return not (cancel and cancel.is_set())
+
+    tmp = filepath + ".part"
+    try:
+        if fmt == "columnar":
+            with open(tmp, "wb") as f:
+                _write_columnar(f, store, start, end, chunk_rows, progress)
+        else:
+            with open(tmp, "w", newline="", encoding="utf-8") as f:
+                _write_rows(f, fmt, store, start, end, tuple(fields), chunk_rows, progress)
+        if cancel and cancel.is_set():
+            os.remove(tmp)
+            return None
+        os.replace(tmp, filepath)
+    except Exception as e:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise IOError(f"Failed to export history: {e}")
+    return done
@@ -0,0 +1,101 @@
+import json
+import os
+import threading
+import time
+
+
+class FactCache:
+    """
+    Persistent cache for slow-changing host facts (serial, model, public IP...).
+
+    Entries live in a small JSON file as {key: {"v": value, "t": stored_at}}
+    and expire per key after ttls[key] seconds (prefix match on "name:"
+    for keyed facts such as "geo:1.2.3.4"). Hit/miss counters are kept for
+    instrumentation.
+    """
+
+    def __init__(self, path: str = "insight_facts.json", ttls: dict = None, default_ttl: float = 3600):
+        self.path = path
+        self.ttls = dict(ttls or {})
+        self.default_ttl = default_ttl
+        self._lock = threading.Lock()
+        self._data = {}
+        self.hits = {}
+        self.misses = {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f) or {}
+        except Exception:
+            # missing or corrupt cache file: start cold
+            self._data = {}
+
+    def _ttl(self, key: str) -> float:
+        if key in self.ttls:
+            return self.ttls[key]
+        return self.ttls.get(key.split(":", 1)[0], self.default_ttl)
+
+    def peek(self, key: str):
+        """Fresh cached value for `key`, or None. Does not count as a hit or miss."""
+        with self._lock:
+            entry = self._data.get(key)
+        if entry and time.time() - entry.get("t", 0) < self._ttl(key):
+            return entry.get("v")
+        return None
+
+    def get(self, key: str, fetch, cacheable=None):
+        """
+        Return the cached value for `key` if still fresh, else call `fetch()`,
+        store its result (when cacheable(result) is true) and return it.
+        """
+        value = self.peek(key)
+        name = key.split(":", 1)[0]
+        if value is not None:
+            with self._lock:
+                self.hits[name] = self.hits.get(name, 0) + 1
+            return value
+        with self._lock:
+            self.misses[name] = self.misses.get(name, 0) + 1
+        value = fetch()
+        if value is not None and (cacheable is None or cacheable(value)):
+            self.put(key, value)
+        return value
+
+    def put(self, key: str, value):
+        with self._lock:
+            self._data[key] = {"v": value, "t": time.time()}
+            self._save()
+
+    def invalidate(self, key: str = None):
+        """Drop one key (or every key with that "name:" prefix), or everything."""
+        with self._lock:
+            if key is None:
+                self._data = {}
+            else:
+                self._data = {
+                    k: v for k, v in self._data.items()
+                    if k != key and not k.startswith(key + ":")
+                }
+            self._save()
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits, misses = sum(self.hits.values()), sum(self.misses.values())
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": hits / (hits + misses) if hits + misses else None,
+                "by_key": {
+                    k: {"hits": self.hits.get(k, 0), "misses": self.misses.get(k, 0)}
+                    for k in sorted(set(self.hits) | set(self.misses))
+                },
+            }
+
+    def _save(self):
+        # caller holds the lock; write-then-rename so a crash never leaves half a file
+        tmp = self.path + ".tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, separators=(",", ":"))
+            os.replace(tmp, self.path)
+        except Exception:
+            pass
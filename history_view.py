@@ -0,0 +1,335 @@
+import threading
+import time
+import tkinter as tk
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from tkinter import ttk
+
+from downsample import minmax, segments
+from transport.local_store import to_epoch, from_epoch, QUERY_MIN_TIER_SECONDS
+
+# (title, [(field, colour)], fixed y-range or None)
+PANELS = (
+    ("CPU %", [("cpu_percent", "#4e9af1")], (0, 100)),
+    ("Memory %", [("mem_percent", "#9b59b6")], (0, 100)),
+    ("Disk used (GB)", [("disk_used_gb", "#e67e22")], None),
+    ("Network (kbps)", [("net_tx_kbps", "#2ecc71"), ("net_rx_kbps", "#e74c3c")], None),
+)
+FIELDS = [f for _, series, _ in PANELS for f, _ in series]
+WINDOWS = (("1 hour", 3600), ("6 hours", 6 * 3600), ("24 hours", 86400),
+           ("3 days", 3 * 86400), ("7 days", 7 * 86400), ("14 days", 14 * 86400))
+LIVE_REFRESH_MS = 30_000
+RESIZE_DEBOUNCE_MS = 120
+# live reloads re-read at least this much of the cached tail: samples are committed in groups, so rows
+# with a ts just before the last read can show up afterwards (see also LocalStore.commit_interval)
+TAIL_OVERLAP_SECONDS = 60
+# windows covering at least this many buckets of a rollup tier (hourly or coarser) are drawn from that tier's
+# min/max instead of the raw samples: 7 or 14 days is a few hundred rows per series rather than tens of thousands
+ROLLUP_MIN_BUCKETS = 150
+_PAD_L, _PAD_R, _PAD_T, _PAD_B = 64, 12, 22, 26
+
+
+class SeriesCache:
+    """
+    Raw samples for one contiguous span [lo, hi), grown at either end as the
+    view pans or zooms out, so each change only reads the missing slice.
+    Growing at the top end re-reads the last `overlap` seconds too, which
+    replace the cached tail, so late-committed rows are picked up without
+    duplicates. trim() bounds it to the neighbourhood of the view.
+    Touched only by the loader thread.
+    """
+
+    def __init__(self, overlap: float = TAIL_OVERLAP_SECONDS):
+        self.overlap = overlap
+        self.lo = self.hi = None
+        self.xs = []
+        self.ys = {f: [] for f in FIELDS}
+
+    def missing(self, lo: float, hi: float):
+        if self.lo is None or hi < self.lo or lo > self.hi:
+            return [(lo, hi)], True
+        spans = []
+        if lo < self.lo:
+            spans.append((lo, self.lo))
+        if hi > self.hi:
+            spans.append((max(self.lo, self.hi - self.overlap), hi))
+        return spans, False
+
+    def reset(self):
+        self.__init__(self.overlap)
+
+    def trim(self, lo: float, hi: float):
+        """Drop cached samples outside [lo, hi)."""
+        if self.lo is None:
+            return
+        if hi <= self.lo or lo >= self.hi:
+            self.reset()
+            return
+        a, b = bisect_left(self.xs, lo), bisect_left(self.xs, hi)
+        if a or b < len(self.xs):
+            self.xs = self.xs[a:b]
+            self.ys = {f: col[a:b] for f, col in self.ys.items()}
+        self.lo, self.hi = max(self.lo, lo), min(self.hi, hi)
+
+    def add(self, lo: float, hi: float, rows):
+        xs = [to_epoch(r[0]) for r in rows]
+        cols = {f: [r[1 + i] for r in rows] for i, f in enumerate(FIELDS)}
+        if self.lo is None:
+            self.lo, self.hi, self.xs, self.ys = lo, hi, xs, cols
+        elif hi <= self.lo:
+            self.xs = xs + self.xs
+            self.ys = {f: cols[f] + self.ys[f] for f in FIELDS}
+            self.lo = lo
+        else:
+            # [lo, hi) was read in full: it replaces whatever overlapping tail was cached
+            cut = bisect_left(self.xs, lo)
+            self.xs[cut:] = xs
+            for f in FIELDS:
+                self.ys[f][cut:] = cols[f]
+            self.hi = hi
+
+    def series(self, field: str, lo: float, hi: float):
+        """(xs, ys) within [lo, hi), skipping missing values."""
+        a, b = bisect_left(self.xs, lo), bisect_left(self.xs, hi)
+        col = self.ys[field]
+        xs, ys = [], []
+        for i in range(a, b):
+            v = col[i]
+            if v is not None:
+                xs.append(self.xs[i])
+                ys.append(v)
+        return xs, ys
+
+
+def rollup_lines(points, width: float):
+    """{field: (xs, ys)} tracing each rollup bucket's min then max, so the line spans the bucket's range."""
+    lines = {f: ([], []) for f in FIELDS}
+    for ts, stats in points:
+        x = to_epoch(ts)
+        for f, agg in stats.items():
+            if agg["min"] is None:
+                continue
+            xs, ys = lines[f]
+            xs += (x, x + width / 2)
+            ys += (agg["min"], agg["max"])
+    return lines
+
+
+class HistoryView(ttk.Frame):
+    """
+    History tab: CPU, memory, disk and network charts from LocalStore.
+
+    Reads and downsampling (min/max per pixel column) run on one loader
+    thread; the Tk thread only draws the few hundred points per series that
+    survive. Long windows are read from the store's rollup tiers (see
+    ROLLUP_MIN_BUCKETS). Results from a superseded window are dropped.
+    """
+
+    def __init__(self, master, store, **kw):
+        super().__init__(master, **kw)
+        self.store = store
+        self._cache = SeriesCache(max(TAIL_OVERLAP_SECONDS, 2 * store.commit_interval))
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="insight-history")
+        self._gen = 0
+        self._gen_lock = threading.Lock()
+        self._span = WINDOWS[2][1]
+        self._end = None  # None = follow "now"
+        self._resize_job = None
+        self._live_job = None
+
+        bar = ttk.Frame(self)
+        bar.pack(fill="x", pady=(0, 6))
+        ttk.Label(bar, text="Window:").pack(side="left", padx=(0, 6))
+        self.window_var = tk.StringVar(value=WINDOWS[2][0])
+        box = ttk.Combobox(bar, textvariable=self.window_var, values=[w for w, _ in WINDOWS],
+                           state="readonly", width=10)
+        box.pack(side="left")
+        box.bind("<<ComboboxSelected>>", self._on_window)
+        ttk.Button(bar, text="◀", width=3, command=lambda: self._pan(-0.5)).pack(side="left", padx=(12, 2))
+        ttk.Button(bar, text="▶", width=3, command=lambda: self._pan(0.5)).pack(side="left", padx=2)
+        ttk.Button(bar, text="Now", command=self._now).pack(side="left", padx=2)
+        self.info = ttk.Label(bar, anchor="e")
+        self.info.pack(side="right")
+
+        self.canvas = tk.Canvas(self, highlightthickness=0, background="#1e1e1e")
+        self.canvas.pack(fill="both", expand=True)
+        self.canvas.bind("<Configure>", self._on_resize)
+        self.canvas.bind("<MouseWheel>", self._on_wheel)          # Windows / macOS
+        self.canvas.bind("<Button-4>", lambda e: self._zoom(0.5))  # X11
+        self.canvas.bind("<Button-5>", lambda e: self._zoom(2.0))
+
+    # ---------- Window ----------
+    def window(self):
+        end = self._end if self._end is not None else to_epoch(datetime.utcnow())
+        return end - self._span, end
+
+    def _on_window(self, event=None):
+        self._span = dict(WINDOWS)[self.window_var.get()]
+        self.reload()
+
+    def _pan(self, frac: float):
+        lo, hi = self.window()
+        now = to_epoch(datetime.utcnow())
+        end = hi + frac * self._span
+        self._end = None if end >= now else end
+        self.reload()
+
+    def _zoom(self, factor: float):
+        lo, hi = self.window()
+        self._span = min(WINDOWS[-1][1], max(600, self._span * factor))
+        label = {secs: name for name, secs in WINDOWS}.get(self._span)
+        self.window_var.set(label or f"{self._span / 3600:g} hours")
+        if self._end is not None:
+            self._end = (lo + hi) / 2 + self._span / 2
+        self.reload()
+
+    def _on_wheel(self, event):
+        self._zoom(0.5 if event.delta > 0 else 2.0)
+
+    def _now(self):
+        self._end = None
+        self.reload()
+
+    def _on_resize(self, event=None):
+        if self._resize_job is not None:
+            self.after_cancel(self._resize_job)
+        self._resize_job = self.after(RESIZE_DEBOUNCE_MS, self.reload)
+
+    # ---------- Loading ----------
+    def reload(self):
+        """Fetch what the current window is missing and redraw, off the Tk thread."""
+        self._resize_job = None
+        with self._gen_lock:
+            self._gen += 1
+            gen = self._gen
+        lo, hi = self.window()
+        width = max(50, self.canvas.winfo_width() - _PAD_L - _PAD_R)
+        self.info.configure(text="Loading...")
+        self._loader.submit(self._load, gen, lo, hi, width)
+        if self._live_job is not None:
+            self.after_cancel(self._live_job)
+        self._live_job = self.after(LIVE_REFRESH_MS, self._live) if self._end is None else None
+
+    def _live(self):
+        self._live_job = None
+        if self.winfo_ismapped():
+            self.reload()
+        else:
+            self._live_job = self.after(LIVE_REFRESH_MS, self._live)
+
+    def _stale(self, gen: int) -> bool:
+        with self._gen_lock:
+            return gen != self._gen
+
+    def _tier(self, lo: float, hi: float):
+        """The coarsest retained rollup tier that still gives ROLLUP_MIN_BUCKETS over [lo, hi), or None."""
+        fits = [(tier, step) for tier, step in self.store.rollup_tiers(from_epoch(lo))
+                if step >= QUERY_MIN_TIER_SECONDS and (hi - lo) / step >= ROLLUP_MIN_BUCKETS]
+        return fits[-1] if fits else None
+
+    def _load(self, gen: int, lo: float, hi: float, width: int):
+        try:
+            if self._stale(gen):
+                return
+            t0 = time.perf_counter()
+            tier = self._tier(lo, hi)
+            if tier:
+                # a whole window is a few hundred rows per series: read it again rather than cache it
+                name, step = tier
+                points = list(self.store.rollup_series(name, from_epoch(lo - lo % step), from_epoch(hi), FIELDS))
+                lines = rollup_lines(points, step)
+                read, source = len(points), f" from {name} rollups"
+            else:
+                read, source = self._load_raw(gen, lo, hi), ""
+                if read is None:
+                    return
+                lines = {f: self._cache.series(f, lo, hi) for f in FIELDS}
+            plotted, total = [], 0
+            for title, series, fixed in PANELS:
+                panel = []
+                for field, colour in series:
+                    xs, ys = lines[field]
+                    total += len(xs)
+                    panel.append((colour, xs, ys, *minmax(xs, ys, lo, hi, width)))
+                plotted.append((title, fixed, panel))
+            elapsed = (time.perf_counter() - t0) * 1000
+            note = f"{total:,} points{source}, {read:,} read, {elapsed:.0f} ms"
+            self.after(0, self._draw, gen, lo, hi, plotted, note)
+        except Exception as e:
+            self.after(0, lambda: self.info.configure(text=f"History unavailable: {e}"))
+
+    def _load_raw(self, gen: int, lo: float, hi: float):
+        """Fill the raw-sample cache for [lo, hi); rows read, or None if the window was superseded."""
+        spans, fresh = self._cache.missing(lo, hi)
+        if fresh:
+            self._cache.reset()
+        read = 0
+        for a, b in spans:
+            rows = list(self.store.samples_between(from_epoch(a), from_epoch(b), FIELDS))
+            self._cache.add(a, b, rows)
+            read += len(rows)
+            if self._stale(gen):
+                return None
+        # keep one window either side for panning; anything further is re-read if needed
+        self._cache.trim(lo - (hi - lo), hi + (hi - lo))
+        return read
+
+    # ---------- Drawing ----------
+    def _draw(self, gen: int, lo: float, hi: float, plotted, note: str):
+        if self._stale(gen):
+            return
+        c = self.canvas
+        c.delete("all")
+        w, h = c.winfo_width(), c.winfo_height()
+        panel_h = h / len(plotted)
+        plot_w = max(1, w - _PAD_L - _PAD_R)
+        span = hi - lo
+
+        def x_of(x):
+            return _PAD_L + (x - lo) / span * plot_w
+
+        for p, (title, fixed, lines) in enumerate(plotted):
+            top = p * panel_h + _PAD_T
+            bottom = (p + 1) * panel_h - _PAD_B
+            ph = max(1, bottom - top)
+            if fixed:
+                y0, y1 = fixed
+            else:
+                vals = [v for line in lines for v in line[4]]
+                y0, y1 = (min(vals), max(vals)) if vals else (0, 1)
+                if y1 - y0 < 1e-9:
+                    y0, y1 = y0 - 1, y1 + 1
+
+            c.create_text(_PAD_L, top - 4, text=title, anchor="sw", fill="#cccccc", font=("Segoe UI", 9, "bold"))
+            c.create_rectangle(_PAD_L, top, _PAD_L + plot_w, bottom, outline="#444444")
+            for frac in (0, 0.5, 1):
+                y = bottom - frac * ph
+                c.create_line(_PAD_L, y, _PAD_L + plot_w, y, fill="#333333")
+                c.create_text(_PAD_L - 6, y, text=f"{y0 + frac * (y1 - y0):.4g}", anchor="e",
+                              fill="#999999", font=("Segoe UI", 8))
+
+            for colour, raw_x, _, xs, ys in lines:
+                # break the line where the agent was not running
+                step = (raw_x[-1] - raw_x[0]) / max(1, len(raw_x) - 1) if len(raw_x) > 1 else span
+                gap = max(3 * step, 2 * span / plot_w, 90)
+                for seg in segments(xs, ys, gap):
+                    coords = []
+                    for x, v in seg:
+                        coords += (x_of(x), bottom - (v - y0) / (y1 - y0) * ph)
+                    if len(coords) >= 4:
+                        c.create_line(*coords, fill=colour, width=1)
+                    else:
+                        c.create_oval(coords[0] - 1, coords[1] - 1, coords[0] + 1, coords[1] + 1,
+                                      outline=colour, fill=colour)
+
+        for frac, anchor in ((0, "nw"), (0.5, "n"), (1, "ne")):
+            ts = datetime.fromtimestamp(lo + frac * span, tz=timezone.utc).astimezone()
+            c.create_text(_PAD_L + frac * plot_w, h - _PAD_B + 6, text=f"{ts:%m-%d %H:%M}", anchor=anchor,
+                          fill="#999999", font=("Segoe UI", 8))
+        self.info.configure(text=note)
+
+    def close(self):
+        if self._live_job is not None:
+            self.after_cancel(self._live_job)
+        self._loader.shutdown(wait=False, cancel_futures=True)
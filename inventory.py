@@ -0,0 +1,88 @@
+import hashlib
+import json
+import re
+from datetime import datetime
+
+from system_info import FIELDS, TIMED_OUT
+
+# changes continuously and is already reported as disk_used_gb in every resource sample
+VOLATILE = ("Free Disk Space (GB)",)
+# answers that mean "not available on this machine"; stored as None so they compare equal
+_MISSING = ("Unavailable", "Unknown", "")
+# a full record is re-sent at least this often, so a receiver that lost state recovers
+FULL_EVERY_SECONDS = 7 * 86400
+
+
+def field_key(label: str) -> str:
+    """Report label -> stable snake_case key ("Logged-in Email/UPN" -> "logged_in_email_upn")."""
+    return re.sub(r"[^a-z0-9]+", "_", label.lower()).strip("_")
+
+
+def normalize(info: dict) -> dict:
+    """
+    get_system_info() report -> {key: value} for change tracking. Volatile
+    fields are dropped, placeholders become None, floats are rounded, and
+    fields whose probe timed out are left out (unknown this round, not a
+    change).
+    """
+    out = {}
+    for label in FIELDS:
+        if label in VOLATILE or label not in info:
+            continue
+        value = info[label]
+        if value == TIMED_OUT:
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+            if value in _MISSING:
+                value = None
+        elif isinstance(value, float):
+            value = round(value, 4)
+        out[field_key(label)] = value
+    return out
+
+
+def inventory_hash(fields: dict) -> str:
+    """Stable short hash of a normalized inventory."""
+    data = json.dumps(fields, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()[:16]
+
+
+class InventoryTracker:
+    """
+    Change detection for the inventory stream.
+
+    Holds the last reported inventory and its hash. update() returns a full
+    record the first time (and every FULL_EVERY_SECONDS), a record with
+    only the changed fields when the hash moves, and None when nothing
+    changed, which is almost always. Records are dicts shaped like
+    schema.InventoryRecord.
+    """
+
+    def __init__(self, state: dict = None, full_every: float = FULL_EVERY_SECONDS):
+        state = state or {}
+        self.fields = dict(state.get("fields") or {})
+        self.hash = state.get("hash")
+        self.full_at = state.get("full_at")
+        self.full_every = full_every
+
+    def state(self) -> dict:
+        return {"fields": self.fields, "hash": self.hash, "full_at": self.full_at}
+
+    def update(self, info: dict, now: datetime = None):
+        now = now or datetime.utcnow()
+        merged = {**self.fields, **normalize(info)}
+        h = inventory_hash(merged)
+        epoch = now.timestamp() if now.tzinfo else (now - datetime(1970, 1, 1)).total_seconds()
+        full = self.hash is None or self.full_at is None or epoch - self.full_at >= self.full_every
+        if not full and h == self.hash:
+            return None
+        if full:
+            record = {"ts": now, "hash": h, "base": None, "full": True, "fields": merged}
+            self.full_at = epoch
+        else:
+            changed = {k: merged.get(k) for k in merged.keys() | self.fields.keys()
+                       if merged.get(k) != self.fields.get(k)}
+            record = {"ts": now, "hash": h, "base": self.hash, "full": False, "fields": changed}
+        self.fields, self.hash = merged, h
+        return record
@@ -2,17 +2,18 @@ import os
 import sys
 import threading
 import tkinter as tk
+from datetime import datetime, timedelta
 from tkinter import ttk, messagebox, filedialog
 
 from PIL import Image, ImageTk
 
-import yaml
-
 # App modules
-from system_info import get_system_info
-from exporter import export_to_file
-from config import VERSION, APP_NAME
+from system_info import get_system_info, TIMED_OUT
+from exporter import export_to_file, export_history, FORMATS
+from config import VERSION, APP_NAME, load_cfg
 from service import AgentService
+from transport.local_store import StoreBusy
+from history_view import HistoryView
 
 # Optional: updater
 try:
@@ -39,27 +40,18 @@ except Exception:
 # --------------------
 # Helpers / Config
 # --------------------
-def _load_cfg():
-    """Load insight.yaml if present; fall back to safe defaults."""
-    base = {
-        "interval_seconds": 30,
-        "sqlite_path": "insight.db",
-        "retention_days": 14,
-        "enable_http": False,
-        "http_endpoint": None,
-        "device_token": None,
-        "tags": {},
-    }
-    path = os.path.join(os.getcwd(), "insight.yaml")
-    if os.path.exists(path):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                data = yaml.safe_load(f) or {}
-                base.update(data)
-        except Exception:
-            # Keep defaults if YAML is malformed
-            pass
-    return base
+FILTER_DEBOUNCE_MS = 150
+EXPORT_RANGES = (
+    ("Last hour", 3600),
+    ("Last 24 hours", 86400),
+    ("Last 7 days", 7 * 86400),
+    ("Last 14 days", 14 * 86400),
+)
+EXPORT_FORMATS = (("CSV", "csv"), ("JSON Lines", "jsonl"), ("Columnar (all detail)", "columnar"))
+
+
+def _fmt(value, unit: str = "") -> str:
+    return "-" if value is None else f"{value:.2f}{unit}"
 
 
 def resource_path(relative_path: str) -> str:
@@ -91,13 +83,18 @@ class App:
             pass
 
         # Background agent + optional syncer
-        self.cfg = _load_cfg()
-        self.agent = AgentService(self.cfg)
+        self.cfg = load_cfg()
+        try:
+            self.agent = AgentService(self.cfg)
+        except StoreBusy as e:
+            # a headless agent already collects and uploads into this store: show its data, don't do it twice
+            self.agent = AgentService(self.cfg, read_only=True)
+            self.root.title(f"{APP_NAME} v{VERSION} (read-only: agent pid {e.pid or '?'} is running)")
         self.agent.start()
 
         self.syncer = None
-        if _HAS_SYNCER:
-            self.syncer = Syncer(self.cfg)
+        if _HAS_SYNCER and not self.agent.read_only:
+            self.syncer = Syncer(self.cfg, store=self.agent.store)
             self.syncer.start()
 
         # Build UI
@@ -106,6 +103,11 @@ class App:
 
         # State
         self.full_items: list[tuple[str, str]] = []
+        # search index: (iid, "key\x00value" lowercased) in display order
+        self._index: list[tuple[str, str]] = []
+        self._hidden: set[str] = set()
+        self._filter_q = ""
+        self._filter_job = None
 
         # First load
         self.refresh_info()
@@ -145,9 +147,13 @@ class App:
         self.theme_btn = ttk.Button(toolbar, text="Toggle Theme", command=self.toggle_theme)
         self.theme_btn.grid(row=0, column=4, padx=4)
 
+        # Tabs: the live inventory and the recorded history
+        self.tabs = ttk.Notebook(container)
+        self.tabs.grid(row=1, column=0, sticky="nsew")
+
         # Content area
-        content = ttk.Frame(container)
-        content.grid(row=1, column=0, sticky="nsew")
+        content = ttk.Frame(self.tabs, padding=(0, 8, 0, 0))
+        self.tabs.add(content, text="Inventory")
         content.columnconfigure(0, weight=1)
         content.rowconfigure(0, weight=1)
 
@@ -184,8 +190,13 @@ class App:
         ttk.Label(right, text="Quick Actions").pack(pady=(0, 6))
         ttk.Button(right, text="Check for Update", command=run_updater).pack(fill="x", pady=2)
         ttk.Button(right, text="Export Report", command=self.export_info).pack(fill="x", pady=2)
+        ttk.Button(right, text="Export History", command=self.export_history_dialog).pack(fill="x", pady=2)
         ttk.Button(right, text="Refresh Info", command=self.refresh_info).pack(fill="x", pady=2)
 
+        # History: charts load on their own thread once the tab is shown
+        self.history = HistoryView(self.tabs, self.agent.store, padding=(0, 8, 0, 0))
+        self.tabs.add(self.history, text="History")
+
         # Status bar
         self.status = ttk.Label(self.root, anchor="w", padding=(10, 4))
         self.status.grid(row=2, column=0, sticky="ew")
@@ -193,8 +204,15 @@ class App:
     def _build_menu(self):
         menubar = tk.Menu(self.root)
 
+        file_menu = tk.Menu(menubar, tearoff=0)
+        file_menu.add_command(label="Export Report...", command=self.export_info)
+        file_menu.add_command(label="Export History...", command=self.export_history_dialog)
+        menubar.add_cascade(label="File", menu=file_menu)
+
         view_menu = tk.Menu(menubar, tearoff=0)
         view_menu.add_command(label="Toggle Dark Mode", command=self.toggle_theme)
+        view_menu.add_command(label="Refresh (Ignore Cache)", command=self.refresh_uncached)
+        view_menu.add_command(label="Agent Health...", command=self.show_agent_health)
         menubar.add_cascade(label="View", menu=view_menu)
 
         update_menu = tk.Menu(menubar, tearoff=0)
@@ -218,26 +236,86 @@ class App:
         self.status.configure(text=msg)
 
     def _apply_filter(self, event=None):
+        """<KeyRelease> handler: debounce so a burst of keystrokes filters once."""
+        if self._filter_job is not None:
+            self.root.after_cancel(self._filter_job)
+        self._filter_job = self.root.after(FILTER_DEBOUNCE_MS, self._run_filter)
+
+    def _run_filter(self, force: bool = False):
+        self._filter_job = None
         q = (self.search_var.get() or "").strip().lower()
-        self.tree.delete(*self.tree.get_children())
-        for k, v in self.full_items:
-            if not q or q in k.lower() or q in str(v).lower():
-                self.tree.insert("", "end", values=(k, v))
+        if q == self._filter_q and not force:
+            return
+        # typing more characters can only hide rows: re-test just the visible ones
+        narrowing = not force and self._filter_q and q.startswith(self._filter_q)
+        self._filter_q = q
+
+        to_hide, to_show = [], []
+        for iid, hay in self._index:
+            if narrowing and iid in self._hidden:
+                continue
+            match = not q or q in hay
+            if match and iid in self._hidden:
+                to_show.append(iid)
+            elif not match and iid not in self._hidden:
+                to_hide.append(iid)
+
+        if to_hide:
+            self.tree.detach(*to_hide)
+            self._hidden.update(to_hide)
+        if to_show:
+            # reattach in index order so rows keep their original position
+            self._hidden.difference_update(to_show)
+            show = set(to_show)
+            pos = 0
+            for iid, _ in self._index:
+                if iid in self._hidden:
+                    continue
+                if iid in show:
+                    self.tree.move(iid, "", pos)
+                pos += 1
 
     def _reload_tree(self, items: list[tuple[str, str]]):
-        self.tree.delete(*self.tree.get_children())
+        self.tree.delete(*self._all_iids())
+        self._index = []
+        self._hidden = set()
         for k, v in items:
-            self.tree.insert("", "end", values=(k, v))
+            iid = self.tree.insert("", "end", values=(k, v))
+            self._index.append((iid, f"{k}\x00{v}".lower()))
+        self._run_filter(force=True)
+
+    def _all_iids(self):
+        return [iid for iid, _ in self._index] or list(self.tree.get_children())
 
     def refresh_info(self):
+        info = {}
+
+        def show(partial: dict, missing_only: bool = False):
+            # runs on the Tk thread; probes report in whatever order they finish
+            if missing_only:
+                partial = {k: v for k, v in partial.items() if k not in info}
+            info.update(partial)
+            items = sorted(info.items(), key=lambda kv: kv[0].lower())
+            self.full_items = items
+            self._reload_tree(items)
+
         def task():
             try:
                 self._set_status("Collecting system information...")
-                info = get_system_info()
-                items = sorted(info.items(), key=lambda kv: kv[0].lower())
-                self.full_items = items
-                self.tree.after(0, lambda: self._reload_tree(items))
-                self._set_status("System information loaded.")
+                facts = self.agent.facts
+                hits_before = facts.stats()["hits"]
+                final = get_system_info(on_result=lambda part: self.tree.after(0, show, part), cache=facts)
+                # fill fields that missed their deadline; late arrivals keep their value
+                self.tree.after(0, show, final, True)
+                notes = []
+                cached = facts.stats()["hits"] - hits_before
+                if cached:
+                    notes.append(f"{cached} cached")
+                late = sum(1 for v in final.values() if v == TIMED_OUT)
+                if late:
+                    notes.append(f"{late} field(s) timed out")
+                suffix = f" ({', '.join(notes)})" if notes else ""
+                self._set_status(f"System information loaded{suffix}.")
             except Exception as e:
                 self._set_status("Error while collecting info.")
                 messagebox.showerror("Error", str(e))
@@ -249,6 +327,42 @@ class App:
         self.export_btn.config(state="disabled")
         threading.Thread(target=task, daemon=True).start()
 
+    def refresh_uncached(self):
+        """Drop cached host facts (serial, public IP, geo...) and collect fresh ones."""
+        self.agent.facts.invalidate()
+        self.refresh_info()
+
+    def show_agent_health(self):
+        """Latest self-telemetry snapshot: agent CPU/RSS and per-stage latency."""
+        try:
+            latest = self.agent.store.telemetry_latest()
+        except Exception as e:
+            messagebox.showerror("Agent Health", str(e))
+            return
+        if not latest:
+            messagebox.showinfo("Agent Health", "No telemetry recorded yet.")
+            return
+        ts, agent, stages = latest
+
+        win = tk.Toplevel(self.root)
+        win.title("Agent Health")
+        win.geometry("760x420")
+        ttk.Label(win, padding=(10, 8), text=(
+            f"Snapshot {ts:%Y-%m-%d %H:%M:%S} UTC  |  CPU {_fmt(agent['cpu_percent'], '%')}  |  "
+            f"RSS {_fmt(agent['rss_mb'], ' MB')}  |  threads {agent['threads']}  |  "
+            f"skipped ticks {agent['skipped']}  |  errors {agent['errors']}"
+        )).pack(fill="x")
+
+        cols = ("stage", "count", "errors", "avg_ms", "p50_ms", "p95_ms", "max_ms")
+        tree = ttk.Treeview(win, columns=cols, show="headings")
+        for c in cols:
+            tree.heading(c, text=c)
+            tree.column(c, width=200 if c == "stage" else 80, anchor="w" if c == "stage" else "e")
+        for name, st in stages.items():
+            tree.insert("", "end", values=(name, st["count"], st["errors"],
+                                           *(_fmt(st[k]) for k in cols[3:])))
+        tree.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+
     def export_info(self):
         file = filedialog.asksaveasfilename(
             defaultextension=".txt",
@@ -266,6 +380,94 @@ class App:
         except Exception as e:
             messagebox.showerror("Error", str(e))
 
+    def export_history_dialog(self):
+        """Pick a range and format, then stream stored history to a file on a worker thread."""
+        win = tk.Toplevel(self.root)
+        win.title("Export History")
+        win.transient(self.root)
+        win.resizable(False, False)
+        frm = ttk.Frame(win, padding=12)
+        frm.pack(fill="both", expand=True)
+        frm.columnconfigure(1, weight=1)
+
+        range_var = tk.StringVar(value=EXPORT_RANGES[1][0])
+        fmt_var = tk.StringVar(value=EXPORT_FORMATS[0][0])
+        ttk.Label(frm, text="Range:").grid(row=0, column=0, sticky="w", padx=(0, 8), pady=2)
+        ttk.Combobox(frm, textvariable=range_var, values=[r for r, _ in EXPORT_RANGES],
+                     state="readonly", width=24).grid(row=0, column=1, sticky="ew", pady=2)
+        ttk.Label(frm, text="Format:").grid(row=1, column=0, sticky="w", padx=(0, 8), pady=2)
+        ttk.Combobox(frm, textvariable=fmt_var, values=[f for f, _ in EXPORT_FORMATS],
+                     state="readonly", width=24).grid(row=1, column=1, sticky="ew", pady=2)
+        bar = ttk.Progressbar(frm, mode="determinate", length=320)
+        bar.grid(row=2, column=0, columnspan=2, sticky="ew", pady=(10, 4))
+        note = ttk.Label(frm, text="")
+        note.grid(row=3, column=0, columnspan=2, sticky="w")
+        buttons = ttk.Frame(frm)
+        buttons.grid(row=4, column=0, columnspan=2, sticky="e", pady=(10, 0))
+
+        # closing the window cancels a running export; the partial file is removed
+        cancel = threading.Event()
+
+        def close():
+            cancel.set()
+            win.destroy()
+
+        def post(fn, *args):
+            # from the worker thread; the window may be gone by now
+            try:
+                win.after(0, fn, *args)
+            except (tk.TclError, RuntimeError):
+                pass
+
+        def show(done, total):
+            bar.configure(maximum=max(total, 1), value=done)
+            note.configure(text=f"{done:,} / {total:,} rows")
+
+        def finished(rows, path, err):
+            close_btn.config(text="Close")
+            if err is not None:
+                note.configure(text="Export failed.")
+                messagebox.showerror("Export History", str(err), parent=win)
+            elif rows is not None:
+                note.configure(text=f"{rows:,} rows saved.")
+                self._set_status(f"History exported to {path}")
+
+        def start():
+            fmt = dict(EXPORT_FORMATS)[fmt_var.get()]
+            path = filedialog.asksaveasfilename(
+                parent=win,
+                defaultextension=FORMATS[fmt],
+                filetypes=[(fmt_var.get(), "*" + FORMATS[fmt]), ("All files", "*.*")],
+                title="Export History",
+            )
+            if not path:
+                return
+            end = datetime.utcnow()
+            begin = end - timedelta(seconds=dict(EXPORT_RANGES)[range_var.get()])
+            start_btn.config(state="disabled")
+            close_btn.config(text="Cancel")
+            note.configure(text="Counting rows...")
+
+            def task():
+                rows, err = None, None
+                try:
+                    rows = export_history(self.agent.store, path, begin, end, fmt,
+                                          on_progress=lambda done, total: post(show, done, total), cancel=cancel)
+                except Exception as e:
+                    err = e
+                finally:
+                    # this thread ends here: don't leave its read connection open until the store closes
+                    self.agent.store.release()
+                post(finished, rows, path, err)
+
+            threading.Thread(target=task, name="insight-export", daemon=True).start()
+
+        start_btn = ttk.Button(buttons, text="Export...", command=start)
+        start_btn.pack(side="left", padx=(0, 6))
+        close_btn = ttk.Button(buttons, text="Close", command=close)
+        close_btn.pack(side="left")
+        win.protocol("WM_DELETE_WINDOW", close)
+
     def toggle_theme(self):
         if _HAS_TTKB:
             try:
@@ -282,6 +484,11 @@ class App:
                 pass
 
     def _on_close(self):
+        try:
+            if hasattr(self, "history"):
+                self.history.close()
+        except Exception:
+            pass
         try:
             if hasattr(self, "syncer") and self.syncer:
                 self.syncer.stop()
@@ -289,7 +496,7 @@ class App:
             pass
         try:
             if hasattr(self, "agent") and self.agent:
-                self.agent.stop()
+                self.agent.close()
         except Exception:
             pass
         self.root.destroy()
@@ -0,0 +1,98 @@
+import threading
+import time
+
+
+class Task:
+    __slots__ = ("name", "fn", "every", "scale", "due", "runs", "skipped", "errors", "last_duration")
+
+    def __init__(self, name: str, fn, every: float, due: float):
+        self.name = name
+        self.fn = fn
+        self.every = every
+        self.scale = 1.0
+        self.due = due
+        self.runs = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_duration = 0.0
+
+
+class Scheduler:
+    """
+    Periodic task runner on the monotonic clock.
+
+    Each task has its own cadence and fixed slots (start + k * every), so
+    time spent collecting never shifts later runs. A task that overruns one
+    or more of its slots skips them (counted in `skipped`) instead of
+    running back-to-back to catch up. `slow()` stretches a task's cadence
+    (backpressure) from its next slot on. `stop()` wakes the runner
+    immediately.
+    """
+
+    def __init__(self, stop_event: threading.Event = None, clock=time.monotonic):
+        self.stop_event = stop_event or threading.Event()
+        self.clock = clock
+        self.tasks: list[Task] = []
+        self.on_error = None   # optional callback(task_name, exc)
+        self.timer = None      # optional callback(task_name, seconds)
+
+    def add(self, name: str, fn, every: float, delay: float = 0.0) -> Task:
+        task = Task(name, fn, max(0.001, float(every)), self.clock() + delay)
+        self.tasks.append(task)
+        return task
+
+    def stop(self):
+        self.stop_event.set()
+
+    def slow(self, name: str, factor: float):
+        """Run task `name` every `factor` x its cadence (1 = normal) until changed again."""
+        for t in self.tasks:
+            if t.name == name:
+                t.scale = max(1.0, float(factor))
+
+    def skipped(self) -> int:
+        return sum(t.skipped for t in self.tasks)
+
+    def stats(self) -> dict:
+        return {
+            t.name: {
+                "every": t.every,
+                "scale": t.scale,
+                "runs": t.runs,
+                "skipped": t.skipped,
+                "errors": t.errors,
+                "last_duration": t.last_duration,
+            }
+            for t in self.tasks
+        }
+
+    def run(self):
+        """Run until stop(); call on the thread that should do the work."""
+        while not self.stop_event.is_set() and self.tasks:
+            # earliest due first; ties keep registration order
+            task = min(self.tasks, key=lambda t: t.due)
+            delay = task.due - self.clock()
+            if delay > 0 and self.stop_event.wait(delay):
+                return
+
+            started = self.clock()
+            try:
+                task.fn()
+            except Exception as e:
+                task.errors += 1
+                if self.on_error:
+                    try:
+                        self.on_error(task.name, e)
+                    except Exception:
+                        pass
+            finished = self.clock()
+            task.runs += 1
+            task.last_duration = finished - started
+            if self.timer:
+                self.timer(task.name, task.last_duration)
+
+            # next slot on the original grid; skip slots we already ran past
+            step = task.every * task.scale
+            missed = max(0, int((finished - task.due) // step))
+            task.skipped += missed
+            task.due += (missed + 1) * step
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import Any, List, Dict, Optional
 from datetime import datetime
 
 class DeviceIdentity(BaseModel):
@@ -12,6 +12,20 @@ class DeviceIdentity(BaseModel):
     model: Optional[str] = None
     domain: Optional[str] = None
 
+class NicRate(BaseModel):
+    name: str
+    tx_bps: float = 0.0
+    rx_bps: float = 0.0
+    tx_pps: float = 0.0
+    rx_pps: float = 0.0
+
+class DiskRate(BaseModel):
+    name: str
+    read_bps: float = 0.0
+    write_bps: float = 0.0
+    read_iops: float = 0.0
+    write_iops: float = 0.0
+
 class ResourceSample(BaseModel):
     ts: datetime
     cpu_percent: float
@@ -21,6 +35,8 @@ class ResourceSample(BaseModel):
     uptime_seconds: Optional[int] = None
     net_tx_kbps: Optional[float] = None
     net_rx_kbps: Optional[float] = None
+    nics: List[NicRate] = []
+    disks: List[DiskRate] = []
 
 class ProcessInfo(BaseModel):
     pid: int
@@ -30,7 +46,33 @@ class ProcessInfo(BaseModel):
 
 class ProcessSample(BaseModel):
     ts: datetime
+    # full top-N snapshot; the agent sends it every `process_full_every` ticks, only churn in between
     top: List[ProcessInfo] = []
+    # churn since the previous tick: new PIDs, PIDs gone (last values seen) and the biggest usage changes
+    spawned: List[ProcessInfo] = []
+    exited: List[ProcessInfo] = []
+    movers: List[ProcessInfo] = []
+
+class InventoryRecord(BaseModel):
+    ts: datetime
+    # hash of the whole normalized inventory once this record is applied
+    hash: str
+    # hash this delta applies to (None for a full record); a mismatch means the receiver needs the next full one
+    base: Optional[str] = None
+    # full: `fields` is the whole inventory; otherwise only the fields that changed
+    full: bool = False
+    fields: Dict[str, Any] = {}
+
+class Alert(BaseModel):
+    ts: datetime
+    rule: str
+    field: str
+    # "firing" when the rule trips, "resolved" when it clears
+    state: str
+    severity: str = "warning"
+    value: Optional[float] = None
+    # what the value was compared against: the threshold, EWMA band edge or rolling quantile
+    limit: Optional[float] = None
 
 class InsightEnvelope(BaseModel):
     version: str = "1.0"
@@ -38,3 +80,11 @@ class InsightEnvelope(BaseModel):
     samples: List[ResourceSample] = []
     processes: Optional[ProcessSample] = None
     tags: Dict[str, str] = {}
+    # hash of version + device + tags, so a receiver can key the static part once
+    identity: Optional[str] = None
+    # batched envelopes carry every process snapshot here (oldest first)
+    process_samples: List[ProcessSample] = []
+    # change-only inventory stream (see inventory.InventoryTracker)
+    inventory: List[InventoryRecord] = []
+    # local rule alerts (see anomaly.RuleEngine); delivered ahead of regular batches
+    alerts: List[Alert] = []
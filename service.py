@@ -14,6 +14,7 @@ if COLLECTORS_DIR not in sys.path:
 try:
     import collectors.processes as processes
     import collectors.net as net
+    import collectors.disk as disk
 except Exception:
     def _load_module(name, path):
         spec = importlib.util.spec_from_file_location(name, path)
@@ -23,52 +24,241 @@ except Exception:
 
     processes = _load_module("processes", os.path.join(COLLECTORS_DIR, "processes.py"))
     net = _load_module("net", os.path.join(COLLECTORS_DIR, "net.py"))
+    disk = _load_module("disk", os.path.join(COLLECTORS_DIR, "disk.py"))
 # --- end robust import setup ---
 
-import threading, time, json
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from schema import InsightEnvelope, DeviceIdentity, ResourceSample, ProcessSample, ProcessInfo
-from transport.local_store import LocalStore
+from schema import (InsightEnvelope, DeviceIdentity, ResourceSample, ProcessSample, ProcessInfo, NicRate, DiskRate,
+                    InventoryRecord, Alert)
+from transport.local_store import LocalStore, RESOURCE_FIELDS
+from factcache import FactCache
 import system_info  # your existing module
+from scheduler import Scheduler
+from telemetry import Telemetry
+from inventory import InventoryTracker
+from anomaly import RuleEngine
+
+RETENTION_CHECK_SECONDS = 60
+SPOOL_CHECK_SECONDS = 60
+# uploads stuck this long (oldest unacknowledged row) count as a stalled link
+SPOOL_STALL_SECONDS = 600
+# backpressure while the link is stalled, by store size as a fraction of spool_max_mb:
+# process lists slow down first, resource samples only when eviction is close
+BACKPRESSURE = (
+    (0.95, {"processes": 4, "resources": 2, "net": 2, "disk": 2}),
+    (0.8, {"processes": 4}),
+)
+
 
 class AgentService:
-    def __init__(self, cfg: dict):
+    def __init__(self, cfg: dict, read_only: bool = False):
         self.cfg = cfg
-        self.store = LocalStore(cfg.get("sqlite_path", "insight.db"))
-        self.identity = DeviceIdentity(**system_info.identity())
-        self._stop = False
+        # read_only: another process (agent.py) owns the store; serve its facts and history, collect nothing
+        self.read_only = read_only
+        # built first so a bad `alerts:` rule fails before anything is opened
+        self.rules = RuleEngine(cfg.get("alerts"), RESOURCE_FIELDS)
+        self.telemetry = Telemetry()
+        self.store = LocalStore(
+            cfg.get("sqlite_path", "insight.db"),
+            commit_interval=float(cfg.get("commit_interval_seconds", 5)),
+            rollup_retention=cfg.get("rollup_retention_days"),
+            timer=self.telemetry.record,
+            read_only=read_only,
+        )
+        self.facts = FactCache(
+            cfg.get("fact_cache_path", "insight_facts.json"),
+            ttls={**system_info.FACT_TTLS, **(cfg.get("fact_ttl_seconds") or {})},
+        )
+        self.identity = DeviceIdentity(**system_info.identity(cache=self.facts))
+        self.proc_collector = processes.ProcessCollector()
+        self.net_collector = net.NetCollector()
+        self.disk_collector = disk.DiskIOCollector()
+        self._stop = threading.Event()
         self._thread = None
+        self.scheduler = None
+        self._net = {"net_tx_kbps": 0.0, "net_rx_kbps": 0.0}
+        self._nics = []
+        self._disks = []
+        self._skipped_reported = 0
+        self._proc_ticks = 0
+        self.spool = {}
+        self.inventory = InventoryTracker(self.store.inventory_state())
+        # inventory probes can take seconds (subprocesses, public IP lookups); keep them off the scheduler thread.
+        # Created in start() so a stopped service can be started again
+        self._inventory_pool = None
+        self._inventory_job = None
 
     def start(self):
-        if self._thread and self._thread.is_alive():
+        if self.read_only or (self._thread and self._thread.is_alive()):
             return
-        self._stop = False
-        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._stop.clear()
+        if self._inventory_pool is None:
+            self._inventory_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="insight-inventory")
+            self._inventory_job = None
+        self.scheduler = self._build_scheduler()
+        self._thread = threading.Thread(target=self._run, name="insight-agent", daemon=True)
         self._thread.start()
 
     def stop(self):
-        self._stop = True
+        """Stop collecting and commit what is queued; start() may be called again."""
+        # wakes the scheduler immediately, even mid-wait
+        self._stop.set()
         if self._thread:
-            self._thread.join(timeout=2)
-
-    def _loop(self):
-        interval = int(self.cfg.get("interval_seconds", 30))
-        retention = int(self.cfg.get("retention_days", 14))
-        tags = self.cfg.get("tags", {})
-        while not self._stop:
-            try:
-                res = system_info.resources() | net.throughput()
-                sample = ResourceSample(ts=datetime.utcnow(), **res)
-                top_list = [ProcessInfo(**p) for p in processes.top_n(8)]
-                env = InsightEnvelope(
-                    device=self.identity,
-                    samples=[sample],
-                    processes=ProcessSample(ts=datetime.utcnow(), top=top_list),
-                    tags=tags
-                )
-                self.store.append_json(datetime.utcnow().isoformat(), env.model_dump_json())
-                self.store.prune_days(retention)
-            except Exception:
-                # keep agent resilient; you can add logging here
-                pass
-            time.sleep(interval)
+            self._thread.join(timeout=5)
+        if self._inventory_pool is not None:
+            self._inventory_pool.shutdown(wait=False, cancel_futures=True)
+            self._inventory_pool = None
+        if not self.store.closed:
+            self.store.flush(timeout=5)
+
+    def close(self):
+        """stop(), then release the DB; call once on exit."""
+        try:
+            self.stop()
+        finally:
+            self.store.close()
+
+    # ---------- Scheduling ----------
+    def cadences(self) -> dict:
+        """Seconds between runs per collector; `cadences:` in insight.yaml overrides."""
+        interval = float(self.cfg.get("interval_seconds", 30))
+        cad = {"resources": interval, "net": None, "disk": None, "processes": interval, "inventory": 3600}
+        cad.update(self.cfg.get("cadences") or {})
+        for name in ("net", "disk"):
+            if not cad[name]:
+                cad[name] = cad["resources"]
+        return cad
+
+    def _build_scheduler(self) -> Scheduler:
+        cad = self.cadences()
+        sched = Scheduler(self._stop)
+        sched.timer = lambda name, secs: self.telemetry.record(f"task.{name}", secs)
+        sched.on_error = lambda name, e: self.telemetry.error(f"task.{name}", e)
+        # net/disk first so a resources run in the same slot sees fresh rates. These measure "since the
+        # last call": the first run is one cadence after _run() primes them, so it covers a full interval
+        for name, fn in (("net", self._collect_net), ("disk", self._collect_disk),
+                         ("resources", self._collect_resources), ("processes", self._collect_processes)):
+            sched.add(name, fn, cad[name], delay=cad[name])
+        sched.add("inventory", self._collect_inventory, cad["inventory"])
+        sched.add("retention", self._expire, RETENTION_CHECK_SECONDS)
+        sched.add("spool", self._spool, SPOOL_CHECK_SECONDS, delay=SPOOL_CHECK_SECONDS)
+        sched.add("telemetry", self._report_telemetry, float(self.cfg.get("telemetry_seconds", 300)),
+                  delay=float(self.cfg.get("telemetry_seconds", 300)))
+        self._skipped_reported = 0
+        return sched
+
+    def _run(self):
+        # baselines: CPU%, per-process CPU and net/disk rates are all "since last call"
+        try:
+            system_info.resources(cpu_interval=None)
+            self.proc_collector.collect()
+            self.net_collector.collect()
+            self.disk_collector.collect()
+        except Exception:
+            pass
+        self.scheduler.run()
+
+    # ---------- Collectors ----------
+    def _collect_net(self):
+        cur = self.net_collector.collect()
+        self._nics = cur.pop("nics")
+        self._net = cur
+
+    def _collect_disk(self):
+        self._disks = self.disk_collector.collect()
+
+    def _collect_resources(self):
+        res = system_info.resources(cpu_interval=None) | self._net
+        with self.telemetry.time("envelope"):
+            sample = ResourceSample(
+                ts=datetime.utcnow(),
+                nics=[NicRate(**n) for n in self._nics],
+                disks=[DiskRate(**d) for d in self._disks],
+                **res,
+            )
+            env = InsightEnvelope(device=self.identity, samples=[sample], tags=self.cfg.get("tags", {}))
+        self.store.append_envelope(env)
+        with self.telemetry.time("rules"):
+            alerts = self.rules.feed(sample.ts, res)
+        if alerts:
+            self.store.append_alerts(InsightEnvelope(device=self.identity, alerts=[Alert(**a) for a in alerts],
+                                                     tags=self.cfg.get("tags", {})))
+
+    def _collect_processes(self):
+        # churn every tick; the full top-N only every `process_full_every` ticks
+        tick = self.proc_collector.churn(8)
+        every = max(1, int(self.cfg.get("process_full_every", 10)))
+        if self._proc_ticks % every:
+            tick["top"] = []
+        self._proc_ticks += 1
+        with self.telemetry.time("envelope"):
+            env = InsightEnvelope(
+                device=self.identity,
+                processes=ProcessSample(
+                    ts=datetime.utcnow(),
+                    **{kind: [ProcessInfo(**p) for p in procs] for kind, procs in tick.items()},
+                ),
+                tags=self.cfg.get("tags", {}),
+            )
+        self.store.append_envelope(env)
+
+    def _collect_inventory(self):
+        pool = self._inventory_pool
+        if pool is not None and (self._inventory_job is None or self._inventory_job.done()):
+            self._inventory_job = pool.submit(self._report_inventory)
+
+    def _report_inventory(self):
+        """Collect the inventory report and store a record only if something changed (see InventoryTracker)."""
+        try:
+            with self.telemetry.time("inventory"):
+                info = system_info.get_system_info(cache=self.facts)
+            record = self.inventory.update(info)
+            if record is None:
+                return
+            env = InsightEnvelope(device=self.identity, inventory=[InventoryRecord(**record)],
+                                  tags=self.cfg.get("tags", {}))
+            self.store.append_inventory(env, self.inventory.state())
+        except Exception as e:
+            self.telemetry.error("inventory", e)
+
+    def _delivered(self):
+        """(row id, alert id) every configured sink has acknowledged; (None, None) without sinks."""
+        from syncer import alert_cursor, sink_configs
+
+        names = [sc["name"] for sc in sink_configs(self.cfg)]
+        return self.store.delivered(names), self.store.delivered([alert_cursor(n) for n in names])
+
+    def _expire(self):
+        # no-op until a day boundary passes (see LocalStore.prune_days); keeps what a sink still needs
+        self.store.prune_days(int(self.cfg.get("retention_days", 14)), *self._delivered())
+
+    def _spool(self):
+        """Keep the store under spool_max_mb, reclaim free pages, and slow collection while uploads are stalled."""
+        cap = float(self.cfg.get("spool_max_mb") or 0) * 1024 ** 2
+        self.spool = self.store.maintain(int(cap) or None, self._delivered()[0])
+        if self.spool["undelivered"]:
+            # the cap won over delivery: one error per dropped row, shown in Agent Health
+            self.telemetry.error("spool.undelivered", count=self.spool["undelivered"])
+        slow = {}
+        if cap and self._upload_stalled():
+            usage = self.spool["used_bytes"] / cap
+            slow = next((s for level, s in BACKPRESSURE if usage >= level), {})
+        for name in ("resources", "net", "disk", "processes"):
+            self.scheduler.slow(name, slow.get(name, 1))
+
+    def _upload_stalled(self) -> bool:
+        """True if any delivery sink has had unacknowledged rows for longer than SPOOL_STALL_SECONDS."""
+        from syncer import sink_configs
+
+        # without sinks nothing waits to be delivered; old data just ages out
+        pending = [self.store.pending_since(sc["name"]) for sc in sink_configs(self.cfg)]
+        pending = [p for p in pending if p is not None]
+        return bool(pending) and (datetime.utcnow() - min(pending)).total_seconds() > SPOOL_STALL_SECONDS
+
+    def _report_telemetry(self):
+        skipped = self.scheduler.skipped()
+        snap = self.telemetry.snapshot(skipped=skipped - self._skipped_reported)
+        self._skipped_reported = skipped
+        self.store.append_telemetry(datetime.utcnow(), snap)
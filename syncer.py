@@ -1,39 +1,414 @@
 import threading, time, json
+from bisect import bisect_right
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from transport.local_store import LocalStore
-from transport.http_out import post_batch
 
-class Syncer:
-    def __init__(self, cfg: dict):
-        self.cfg = cfg
-        self.store = LocalStore(cfg.get("sqlite_path", "insight.db"))
-        self._stop = False
+# rows the shared feed keeps in memory for sinks that read the same stretch
+FEED_ROWS = 5000
+# a failing sink waits sync_idle_seconds, doubling per failed round up to this
+RETRY_MAX_SECONDS = 300
+
+
+class BatchSizer:
+    """
+    Adapts rows-per-batch to the link: grows while uploads are fast and
+    small, shrinks when they are slow or fail, and never lets the estimated
+    body exceed `max_bytes`.
+    """
+
+    def __init__(self, start: int = 200, lo: int = 20, hi: int = 5000,
+                 target_latency: float = 2.0, max_bytes: int = 2_000_000):
+        self.rows = start
+        self.lo = lo
+        self.hi = hi
+        self.target_latency = target_latency
+        self.max_bytes = max_bytes
+
+    def observe(self, rows: int, nbytes: int, latency: float):
+        if rows <= 0:
+            return
+        if latency > self.target_latency:
+            size = self.rows // 2
+        elif latency < self.target_latency / 2 and rows >= self.rows:
+            size = self.rows * 2
+        else:
+            size = self.rows
+        per_row = max(1, nbytes // rows)
+        size = min(size, self.max_bytes // per_row)
+        self.rows = max(self.lo, min(self.hi, size))
+
+    def failure(self):
+        self.rows = max(self.lo, self.rows // 2)
+
+
+class RateLimiter:
+    """
+    Token bucket over bytes: `rate` bytes per second on average, bursts of
+    up to one second's worth. Spending can overdraw it; delay() is how long
+    until it is back in credit. rate <= 0 means unlimited.
+    """
+
+    def __init__(self, rate: float = 0, clock=time.monotonic):
+        self.rate = float(rate or 0)
+        self.clock = clock
+        self._tokens = self.rate
+        self._at = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self._tokens = min(self.rate, self._tokens + (now - self._at) * self.rate)
+        self._at = now
+
+    def spend(self, nbytes: int):
+        if self.rate > 0:
+            self._refill()
+            self._tokens -= nbytes
+
+    def delay(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+
+class Feed:
+    """
+    Shared read-ahead over the store for all sinks.
+
+    Rows one sink reads are kept in memory (at most FEED_ROWS, as a
+    contiguous id range), so sinks reading the same stretch, normally the
+    tail, hit SQLite once between them. The window follows the leading
+    sink and is trimmed once every sink inside it has moved on; a sink that
+    falls behind it reads from the store on its own until it catches up,
+    so it never holds the others back.
+    """
+
+    def __init__(self, store: LocalStore, max_rows: int = FEED_ROWS):
+        self.store = store
+        self.max_rows = max_rows
+        self._lock = threading.Lock()
+        self._after = None   # the window holds every row with _after < id <= _hi
+        self._hi = None
+        self._ids = []
+        self._rows = []
+        self._pos = {}       # sink -> id it last read after
+        self.hits = 0        # rows served from memory
+        self.misses = 0      # rows read from the store
+
+    def read(self, sink: str, after_id: int, limit: int):
+        """Up to `limit` rows with id > after_id, as LocalStore.rows_after()."""
+        with self._lock:
+            self._pos[sink] = after_id
+            if self._after is None or after_id > self._hi:
+                # nothing cached yet, or this sink leads: start the window here
+                self._after = self._hi = after_id
+                self._ids, self._rows = [], []
+            if after_id >= self._after:
+                i = bisect_right(self._ids, after_id)
+                out = self._rows[i:i + limit]
+                self.hits += len(out)
+                if len(out) < limit:
+                    more = self.store.rows_after(self._hi, limit - len(out))
+                    self.misses += len(more)
+                    if more:
+                        self._ids += [r[0][0] for r in more]
+                        self._rows += more
+                        self._hi = self._ids[-1]
+                        out += more
+                self._trim()
+                return out
+        # behind the window: read on our own
+        rows = self.store.rows_after(after_id, limit)
+        with self._lock:
+            self.misses += len(rows)
+        return rows
+
+    def forget(self, sink: str):
+        with self._lock:
+            self._pos.pop(sink, None)
+
+    def _trim(self):
+        inside = [p for p in self._pos.values() if p >= self._after]
+        cut = bisect_right(self._ids, min(inside)) if inside else 0
+        cut = max(cut, len(self._ids) - self.max_rows)
+        if cut > 0:
+            self._after = self._ids[cut - 1]
+            del self._ids[:cut]
+            del self._rows[:cut]
+
+
+def sink_configs(cfg: dict) -> list:
+    """
+    Delivery targets: the `sinks:` list in insight.yaml, or else the legacy
+    http_endpoint/device_token pair when enable_http is on (named "http",
+    so its delivery cursor carries over). Each entry gets a unique `name`
+    and a `type` ("http" or "file").
+    """
+    if cfg.get("sinks"):
+        out, seen = [], set()
+        for s in cfg["sinks"]:
+            s = {"type": "http", **s}
+            if not s.get("enabled", True):
+                continue
+            s.setdefault("name", s["type"])
+            if s["name"] in seen:
+                raise ValueError(f"Duplicate sink name: {s['name']}")
+            if s["type"] not in ("http", "file"):
+                raise ValueError(f"Unknown sink type: {s['type']}")
+            seen.add(s["name"])
+            out.append(s)
+        return out
+    if cfg.get("enable_http") and cfg.get("http_endpoint") and cfg.get("device_token"):
+        return [{
+            "name": Syncer.CURSOR,
+            "type": "http",
+            "endpoint": cfg["http_endpoint"],
+            "token": cfg["device_token"],
+        }]
+    return []
+
+
+def alert_cursor(name: str) -> str:
+    """Cursor name for the alerts delivered to sink `name`."""
+    return f"{name}.alerts"
+
+
+class Sink:
+    """
+    One delivery target on its own thread, with its own acknowledged-id
+    cursor (stored as `cursor:<name>`), batch sizing, rate limit and retry
+    backoff.
+
+    Up to `max_in_flight` batches are posted concurrently. The cursor only
+    moves past a batch once that batch and every batch before it succeeded,
+    so a crash or failure re-sends from the last contiguous ack.
+
+    Alerts have a cursor of their own (`cursor:<name>.alerts`). wake() is
+    called when new ones are committed, and they are posted before any
+    further sample batch, so an alert never queues behind a backlog.
+    """
+
+    def __init__(self, name: str, open_client, store: LocalStore, feed: Feed, max_in_flight: int = 4,
+                 batch_rows: int = 200, idle_seconds: float = 10, rate_limit_kbps: float = 0):
+        self.name = name
+        self.open_client = open_client
+        self.store = store
+        self.feed = feed
+        self.max_in_flight = max(1, int(max_in_flight))
+        self.idle_seconds = float(idle_seconds)
+        self.sizer = BatchSizer(start=int(batch_rows))
+        # kilobits per second of request body, before compression
+        self.limiter = RateLimiter(float(rate_limit_kbps or 0) * 1000 / 8)
+        self.client = None
+        self.acked = store.get_cursor(name)
+        self.alerts_acked = store.get_cursor(self.alert_cursor)
+        self.failures = 0      # consecutive failed rounds
+        self.last_error = None
+        self._stop = threading.Event()
+        # set when alerts may be waiting; starts set so a restart drains what was left
+        self._wake = threading.Event()
+        self._wake.set()
         self._t = None
 
+    @property
+    def alert_cursor(self) -> str:
+        return alert_cursor(self.name)
+
     def start(self):
-        if not self.cfg.get("enable_http"):
-            return
-        self._stop = False
-        self._t = threading.Thread(target=self._loop, daemon=True)
+        self._stop.clear()
+        self._t = threading.Thread(target=self._loop, name=f"insight-sink-{self.name}", daemon=True)
         self._t.start()
 
-    def stop(self):
-        self._stop = True
+    def wake(self):
+        self._wake.set()
+
+    def stop(self, timeout: float = 2):
+        self._stop.set()
+        self._wake.set()
         if self._t:
-            self._t.join(timeout=2)
+            self._t.join(timeout=timeout)
+        if self.client:
+            self.client.close()
+        self.feed.forget(self.name)
+
+    def status(self) -> dict:
+        return {"acked": self.acked, "alerts_acked": self.alerts_acked, "batch_rows": self.sizer.rows,
+                "failures": self.failures, "last_error": self.last_error}
+
+    def _post(self, groups):
+        t0 = time.monotonic()
+        nbytes = self.client.post_groups(groups)
+        return time.monotonic() - t0, nbytes
+
+    def _send_alerts(self):
+        """Post every pending alert in one request, ahead of the sample pipeline. Raises on failure."""
+        last_id, groups = self.store.alert_groups(self.alerts_acked)
+        if not groups:
+            return
+        _, nbytes = self._post(groups)
+        # alerts skip the rate limit, but their bytes still count against it
+        self.limiter.spend(nbytes)
+        self.alerts_acked = last_id
+        self.store.set_cursor(self.alert_cursor, last_id)
+
+    def _retry_delay(self) -> float:
+        return min(RETRY_MAX_SECONDS, self.idle_seconds * 2 ** max(0, self.failures - 1))
 
     def _loop(self):
-        endpoint = self.cfg.get("http_endpoint")
-        token = self.cfg.get("device_token")
-        if not (endpoint and token):
+        try:
+            self.client = self.open_client()
+        except Exception as e:
+            self.last_error = str(e)
             return
-        while not self._stop:
-            rows = self.store.batch(limit=200)
-            if rows:
-                ids, payloads = zip(*rows)
-                try:
-                    post_batch(endpoint, token, list(payloads))
-                    self.store.delete_ids(list(ids))
-                except Exception:
-                    # keep trying later
-                    pass
-            time.sleep(10)
+        pool = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix=f"insight-sync-{self.name}")
+        acked = self.acked = self.store.get_cursor(self.name)
+        next_id = acked       # highest id already handed to a batch
+        window = deque()      # [first_id, last_id, done] in id order
+        inflight = {}         # future -> (window entry, rows)
+        failed = False
+        try:
+            while not self._stop.is_set():
+                if not failed and self._wake.is_set():
+                    self._wake.clear()
+                    try:
+                        self._send_alerts()
+                    except Exception as e:
+                        self._wake.set()
+                        self.failures += 1
+                        failed = True
+                        self.last_error = str(e)
+
+                # keep the pipeline full unless recovering from a failure or over the rate limit
+                while not failed and len(inflight) < self.max_in_flight and self.limiter.delay() <= 0:
+                    try:
+                        groups = self.store.group_rows(self.feed.read(self.name, next_id, self.sizer.rows))
+                    except Exception:
+                        groups = []
+                    if not groups:
+                        break
+                    entry = [groups[0][0], groups[-1][1], False]
+                    window.append(entry)
+                    fut = pool.submit(self._post, [g[3] for g in groups])
+                    inflight[fut] = (entry, sum(g[2] for g in groups))
+                    next_id = entry[1]
+
+                if not inflight:
+                    if failed:
+                        # everything settled; resend from the last contiguous ack
+                        window.clear()
+                        next_id = acked
+                        failed = False
+                        self._stop.wait(self._retry_delay())
+                    else:
+                        self._wake.wait(self.limiter.delay() or self.idle_seconds)
+                    continue
+
+                done, _ = wait(list(inflight), timeout=1.0, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    entry, nrows = inflight.pop(fut)
+                    try:
+                        latency, nbytes = fut.result()
+                        entry[2] = True
+                        self.sizer.observe(nrows, nbytes, latency)
+                        self.limiter.spend(nbytes)
+                        self.failures = 0
+                    except Exception as e:
+                        # keep trying later, backing off while it keeps failing
+                        if not failed:
+                            self.failures += 1
+                        failed = True
+                        self.last_error = str(e)
+                        self.sizer.failure()
+
+                moved = False
+                while window and window[0][2]:
+                    acked = window.popleft()[1]
+                    moved = True
+                if moved:
+                    self.acked = acked
+                    self.store.set_cursor(self.name, acked)
+        finally:
+            pool.shutdown(wait=False)
+
+
+class Syncer:
+    """
+    Delivers stored samples to every configured sink (see sink_configs):
+    Core ingest over HTTP, a second HTTP collector, a file drop.
+
+    Each sink runs independently with its own cursor, rate limit and retry
+    state, so a slow or unreachable sink never stalls the others; they
+    share one Feed, so rows are read from SQLite once while sinks keep
+    pace. Batches are sent as few envelopes as possible: consecutive rows
+    that share a device identity are folded into one group (see
+    LocalStore.row_groups). HTTP sinks negotiate the wire format (columnar
+    or JSON) in their Uploader.
+
+    Rows are not deleted on delivery; they stay for local history until
+    retention or the spool cap (LocalStore.maintain) removes them, oldest
+    first, and neither removes rows a sink has not acknowledged unless the
+    cap leaves no choice (see AgentService._delivered).
+    """
+
+    CURSOR = "http"
+
+    def __init__(self, cfg: dict, store: LocalStore = None):
+        self.cfg = cfg
+        # share the agent's store so there is a single writer per DB file
+        self.store = store or LocalStore(cfg.get("sqlite_path", "insight.db"))
+        self.feed = Feed(self.store)
+        self.sinks = {}
+        for sc in sink_configs(cfg):
+            self.sinks[sc["name"]] = Sink(
+                sc["name"],
+                self._client_factory(sc),
+                self.store,
+                self.feed,
+                max_in_flight=sc.get("max_in_flight", cfg.get("sync_max_in_flight", 4)),
+                batch_rows=sc.get("batch_rows", cfg.get("sync_batch_rows", 200)),
+                idle_seconds=sc.get("idle_seconds", cfg.get("sync_idle_seconds", 10)),
+                rate_limit_kbps=sc.get("rate_limit_kbps", 0),
+            )
+
+    def _client_factory(self, sc: dict):
+        cfg = self.cfg
+        if sc["type"] == "file":
+            def open_file():
+                from transport.file_out import FileDrop
+
+                return FileDrop(sc["path"], encoding=sc.get("encoding", "json"))
+
+            return open_file
+
+        def open_http():
+            # requests is only imported once there is somewhere to upload to
+            from transport.http_out import Uploader
+
+            return Uploader(
+                sc["endpoint"],
+                sc["token"],
+                compress=bool(sc.get("compress", cfg.get("http_compress", True))),
+                encoding=sc.get("encoding", cfg.get("http_encoding", "json")),
+            )
+
+        return open_http
+
+    def start(self):
+        self.store.on_alert(self._wake_sinks)
+        for sink in self.sinks.values():
+            sink.start()
+
+    def stop(self):
+        self.store.off_alert(self._wake_sinks)
+        for sink in self.sinks.values():
+            sink._stop.set()
+        for sink in self.sinks.values():
+            sink.stop()
+
+    def _wake_sinks(self):
+        for sink in self.sinks.values():
+            sink.wake()
+
+    def status(self) -> dict:
+        return {name: s.status() for name, s in self.sinks.items()}
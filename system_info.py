@@ -7,23 +7,44 @@ import sys
 import datetime
 import time
 import psutil
-import uuid
-import urllib.request
 import json
 import getpass
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
 
 from utils import safe_int, bytes_to_gb
 
 CREATE_NO_WINDOW = subprocess.CREATE_NO_WINDOW if sys.platform == "win32" else 0
 IS_WIN = os.name == "nt"
 
+# Seconds each slow-changing fact may be served from a FactCache
+FACT_TTLS = {
+    "public_ip": 6 * 3600,
+    "geo": 6 * 3600,
+    "macs": 24 * 3600,
+    "install_date": 7 * 86400,
+    "memory": 7 * 86400,
+    "model": 30 * 86400,
+    "serial": 30 * 86400,
+}
+
+
+def _cacheable(value):
+    """Only cache real answers, never placeholders from a failed/slow probe."""
+    if isinstance(value, dict):
+        return not any(v in ("Unavailable", "Timed out") for v in value.values())
+    return bool(value)
+
+
+def _cached(cache, key, fetch):
+    if cache is None:
+        return fetch()
+    return cache.get(key, fetch, _cacheable)
+
+
 # -------------------------
 # Core identity & resources
 # -------------------------
-def identity():
-    host = socket.gethostname()
-    os_name = platform.system()
-    os_ver = platform.version()
+def _mac_list():
     macs = []
     try:
         for _, addrs in psutil.net_if_addrs().items():
@@ -34,12 +55,20 @@ def identity():
                     macs.append(addr)
     except Exception:
         pass
+    return macs
+
+
+def identity(cache=None):
+    """DeviceIdentity fields. Serial/model/MACs come from `cache` (a FactCache) while fresh."""
+    host = socket.gethostname()
+    os_name = platform.system()
+    os_ver = platform.version()
 
     base = {
         "hostname": host,
         "os": os_name,
         "os_version": os_ver,
-        "macs": macs,
+        "macs": _cached(cache, "macs", _mac_list),
         "serial": None,
         "model": None,
         "domain": os.environ.get("USERDOMAIN") or None,
@@ -47,31 +76,18 @@ def identity():
 
     # Windows: enrich with WMIC where available
     if IS_WIN:
-        try:
-            model_output = subprocess.check_output(
-                ["wmic", "computersystem", "get", "model"],
-                universal_newlines=True,
-                creationflags=CREATE_NO_WINDOW,
-            ).strip().splitlines()
-            base["model"] = _first_value_after_header(model_output, "Model")
-        except Exception:
-            pass
-
-        try:
-            serial_output = subprocess.check_output(
-                ["wmic", "bios", "get", "serialnumber"],
-                universal_newlines=True,
-                creationflags=CREATE_NO_WINDOW,
-            ).strip().splitlines()
-            base["serial"] = _first_value_after_header(serial_output, "Serial")
-        except Exception:
-            pass
+        base["model"] = _cached(cache, "model", lambda: _probe_model(10))["Model"]
+        base["serial"] = _cached(cache, "serial", lambda: _probe_serial(10))["Serial Number"]
 
     return base
 
 
-def resources():
-    cpu = psutil.cpu_percent(interval=0.2)
+def resources(cpu_interval=0.2):
+    """
+    Point-in-time resource usage. cpu_interval=None makes CPU% non-blocking:
+    it then covers the time since the previous call (periodic callers).
+    """
+    cpu = psutil.cpu_percent(interval=cpu_interval)
     mem = psutil.virtual_memory()
     disk = psutil.disk_usage("C:\\" if IS_WIN else "/")
     boot_ts = psutil.boot_time()
@@ -107,6 +123,7 @@ def get_logged_in_email_or_upn():
                 ["whoami", "/upn"],
                 universal_newlines=True,
                 creationflags=CREATE_NO_WINDOW,
+                timeout=5,
             ).strip()
             if upn and "@" in upn:
                 return upn
@@ -153,18 +170,36 @@ def get_timezone_info():
     return tz_name, utc_offset
 
 
+def _urlopen(url: str, timeout: float = 5):
+    # urllib.request pulls in ssl; import it only when a probe actually goes online
+    import urllib.request
+
+    return urllib.request.urlopen(url, timeout=timeout)
+
+
+def _budget(deadline, timeout: float = 5) -> float:
+    """`timeout`, cut to what is left before the time.monotonic() `deadline` (None: no deadline)."""
+    if deadline is None:
+        return timeout
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise TimeoutError("probe deadline passed")
+    return min(timeout, left)
+
+
 def get_public_ip():
     try:
-        return urllib.request.urlopen("https://api.ipify.org", timeout=5).read().decode("utf-8")
+        return _urlopen("https://api.ipify.org", timeout=5).read().decode("utf-8")
     except Exception:
         return "Unavailable"
 
 
-def get_ip_geolocation(ip: str):
+def get_ip_geolocation(ip: str, deadline=None):
     """
     Fetch geo info for a public IP.
     Primary: ipapi.co
     Fallback: ipinfo.io
+    Each request waits up to 5 s, less if that would run past `deadline` (time.monotonic()).
     Returns dict with city, region, country, org, latitude, longitude, timezone (from provider).
     """
     if not ip or ip == "Unavailable":
@@ -180,7 +215,7 @@ def get_ip_geolocation(ip: str):
 
     # ipapi.co
     try:
-        with urllib.request.urlopen(f"https://ipapi.co/{ip}/json/", timeout=5) as resp:
+        with _urlopen(f"https://ipapi.co/{ip}/json/", timeout=_budget(deadline)) as resp:
             data = json.loads(resp.read().decode("utf-8"))
             return {
                 "city": data.get("city") or "Unavailable",
@@ -196,7 +231,7 @@ def get_ip_geolocation(ip: str):
 
     # ipinfo.io fallback
     try:
-        with urllib.request.urlopen(f"https://ipinfo.io/{ip}/json", timeout=5) as resp:
+        with _urlopen(f"https://ipinfo.io/{ip}/json", timeout=_budget(deadline)) as resp:
             data = json.loads(resp.read().decode("utf-8"))
             loc = data.get("loc", "")
             lat, lon = (loc.split(",") + [None, None])[:2] if loc else (None, None)
@@ -226,6 +261,8 @@ def get_ip_geolocation(ip: str):
 # Existing helpers
 # -------------------------
 def get_mac_address():
+    import uuid
+
     mac = uuid.getnode()
     return ":".join(("%012X" % mac)[i:i+2] for i in range(0, 12, 2))
 
@@ -250,153 +287,247 @@ def _safe_float(x):
 # -------------------------
 # Main single-shot collector
 # -------------------------
-def get_system_info():
+TIMED_OUT = "Timed out"
+
+
+def _check_lines(args, timeout):
+    return subprocess.check_output(
+        args,
+        universal_newlines=True,
+        creationflags=CREATE_NO_WINDOW,
+        timeout=timeout,
+    ).strip().splitlines()
+
+
+def _probe_host():
+    computer_name = socket.gethostname()
+    # Local IPv4 best-effort
     try:
-        computer_name = socket.gethostname()
+        ip_address = socket.gethostbyname(computer_name)
+    except Exception:
+        ip_address = "Unavailable"
+    return {
+        "Computer Name": computer_name,
+        "IP Address": ip_address,
+        "MAC Address": get_mac_address(),
+        "Domain": os.environ.get("USERDOMAIN", "Unknown"),
+        "OS Version": platform.platform(),
+    }
 
-        # Local IPv4 best-effort
-        try:
-            ip_address = socket.gethostbyname(computer_name)
-        except Exception:
-            ip_address = "Unavailable"
 
-        public_ip = get_public_ip()
-        mac_address = get_mac_address()
-        domain = os.environ.get("USERDOMAIN", "Unknown")
-        os_version = platform.platform()
+def _probe_install_date(timeout):
+    # OS Install Date (Windows)
+    if not IS_WIN:
+        return {"OS Install Date": "Unavailable"}
+    try:
+        install_output = _check_lines(
+            ["powershell", "-Command",
+             "(Get-ItemProperty 'HKLM:\\SOFTWARE\\Microsoft\\Windows NT\\CurrentVersion').InstallDate"],
+            timeout,
+        )
+        install_epoch = next((ln.strip() for ln in install_output if ln.strip().isdigit()), None)
+        os_install_date = datetime.datetime.fromtimestamp(int(install_epoch)).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        ) if install_epoch else "Unavailable"
+    except Exception:
+        os_install_date = "Unavailable"
+    return {"OS Install Date": os_install_date}
 
-        # OS Install Date (Windows)
-        if IS_WIN:
-            try:
-                install_output = subprocess.check_output(
-                    ["powershell", "-Command",
-                     "(Get-ItemProperty 'HKLM:\\SOFTWARE\\Microsoft\\Windows NT\\CurrentVersion').InstallDate"],
-                    universal_newlines=True,
-                    creationflags=CREATE_NO_WINDOW,
-                ).strip().splitlines()
-                install_epoch = next((ln.strip() for ln in install_output if ln.strip().isdigit()), None)
-                os_install_date = datetime.datetime.fromtimestamp(int(install_epoch)).strftime(
-                    "%Y-%m-%d %H:%M:%S"
-                ) if install_epoch else "Unavailable"
-            except Exception:
-                os_install_date = "Unavailable"
-        else:
-            os_install_date = "Unavailable"
 
-        # Model (Windows WMIC)
-        if IS_WIN:
-            try:
-                model_output = subprocess.check_output(
-                    ["wmic", "computersystem", "get", "model"],
-                    universal_newlines=True,
-                    creationflags=CREATE_NO_WINDOW,
-                ).strip().splitlines()
-                model = _first_value_after_header(model_output, "Model")
-            except Exception:
-                model = "Unavailable"
-        else:
-            model = "Unavailable"
+def _probe_model(timeout):
+    # Model (Windows WMIC)
+    if not IS_WIN:
+        return {"Model": "Unavailable"}
+    try:
+        model = _first_value_after_header(_check_lines(["wmic", "computersystem", "get", "model"], timeout), "Model")
+    except Exception:
+        model = "Unavailable"
+    return {"Model": model}
 
-        # Last Booted (Windows WMIC)
-        if IS_WIN:
-            try:
-                boot_output = subprocess.check_output(
-                    ["wmic", "os", "get", "lastbootuptime"],
-                    universal_newlines=True,
-                    creationflags=CREATE_NO_WINDOW,
-                ).strip().splitlines()
-                boot_time_raw = _first_value_after_header(boot_output, "Boot")
-                boot_time = datetime.datetime.strptime(boot_time_raw[:14], "%Y%m%d%H%M%S").strftime(
-                    "%Y-%m-%d %H:%M:%S"
-                ) if boot_time_raw and boot_time_raw != "Unavailable" else "Unavailable"
-            except Exception:
-                boot_time = "Unavailable"
-        else:
-            # Cross-platform fallback
-            try:
-                boot_ts = psutil.boot_time()
-                boot_time = datetime.datetime.fromtimestamp(boot_ts).strftime("%Y-%m-%d %H:%M:%S")
-            except Exception:
-                boot_time = "Unavailable"
 
-        # Free Disk Space (GB) on system drive
+def _probe_boot_time(timeout):
+    # Last Booted (Windows WMIC)
+    if IS_WIN:
         try:
-            root_path = "C:\\" if IS_WIN else "/"
-            total, used, free = shutil.disk_usage(root_path)
-            free_gb = free // (2**30)
+            boot_output = _check_lines(["wmic", "os", "get", "lastbootuptime"], timeout)
+            boot_time_raw = _first_value_after_header(boot_output, "Boot")
+            boot_time = datetime.datetime.strptime(boot_time_raw[:14], "%Y%m%d%H%M%S").strftime(
+                "%Y-%m-%d %H:%M:%S"
+            ) if boot_time_raw and boot_time_raw != "Unavailable" else "Unavailable"
         except Exception:
-            free_gb = "Unavailable"
-
-        # Installed Memory (GB)
+            boot_time = "Unavailable"
+    else:
+        # Cross-platform fallback
         try:
-            if IS_WIN:
-                ram_output = subprocess.check_output(
-                    ["wmic", "computersystem", "get", "totalphysicalmemory"],
-                    universal_newlines=True,
-                    creationflags=CREATE_NO_WINDOW,
-                ).strip().splitlines()
-                ram_bytes = next((ln.strip() for ln in ram_output if ln.strip().isdigit()), None)
-                ram_gb = bytes_to_gb(safe_int(ram_bytes))
-            else:
-                ram = psutil.virtual_memory()
-                ram_gb = bytes_to_gb(int(ram.total))
+            boot_ts = psutil.boot_time()
+            boot_time = datetime.datetime.fromtimestamp(boot_ts).strftime("%Y-%m-%d %H:%M:%S")
         except Exception:
-            ram_gb = "Unavailable"
+            boot_time = "Unavailable"
+    return {"Last Booted": boot_time}
 
-        # Serial Number (Windows WMIC)
+
+def _probe_disk():
+    # Free Disk Space (GB) on system drive
+    try:
+        root_path = "C:\\" if IS_WIN else "/"
+        total, used, free = shutil.disk_usage(root_path)
+        free_gb = free // (2**30)
+    except Exception:
+        free_gb = "Unavailable"
+    return {"Free Disk Space (GB)": free_gb}
+
+
+def _probe_memory(timeout):
+    # Installed Memory (GB)
+    try:
         if IS_WIN:
-            try:
-                serial_output = subprocess.check_output(
-                    ["wmic", "bios", "get", "serialnumber"],
-                    universal_newlines=True,
-                    creationflags=CREATE_NO_WINDOW,
-                ).strip().splitlines()
-                serial = _first_value_after_header(serial_output, "Serial")
-            except Exception:
-                serial = "Unavailable"
+            ram_output = _check_lines(["wmic", "computersystem", "get", "totalphysicalmemory"], timeout)
+            ram_bytes = next((ln.strip() for ln in ram_output if ln.strip().isdigit()), None)
+            ram_gb = bytes_to_gb(safe_int(ram_bytes))
         else:
-            serial = "Unavailable"
+            ram = psutil.virtual_memory()
+            ram_gb = bytes_to_gb(int(ram.total))
+    except Exception:
+        ram_gb = "Unavailable"
+    return {"Installed Memory (GB)": ram_gb}
 
-        # NEW: user + email/UPN + timezone + IP geolocation
-        user = get_current_user()
-        upn_or_email = get_logged_in_email_or_upn()
-        tz_name, utc_offset = get_timezone_info()
-        geo = get_ip_geolocation(public_ip)
 
-        return {
-            # Device & network
-            "Computer Name": computer_name,
-            "IP Address": ip_address,
-            "Public IP": public_ip,
-            "MAC Address": mac_address,
-            "Domain": domain,
-
-            # OS
-            "OS Version": os_version,
-            "OS Install Date": os_install_date,
-            "Model": model,
-            "Last Booted": boot_time,
-            "Free Disk Space (GB)": free_gb,
-            "Installed Memory (GB)": ram_gb,
-            "Serial Number": serial,
-
-            # NEW: User/identity
-            "Current User": user,
-            "Logged-in Email/UPN": upn_or_email,
-
-            # NEW: Timezone
-            "Time Zone (System)": tz_name,
-            "UTC Offset": utc_offset,
-
-            # NEW: Public IP Geo
-            "IP Location (City)": geo.get("city"),
-            "IP Location (Region)": geo.get("region"),
-            "IP Location (Country)": geo.get("country"),
-            "ISP / Org": geo.get("org"),
-            "Latitude": geo.get("latitude"),
-            "Longitude": geo.get("longitude"),
-            "Provider Timezone (IP)": geo.get("provider_tz"),
-        }
+def _probe_serial(timeout):
+    # Serial Number (Windows WMIC)
+    if not IS_WIN:
+        return {"Serial Number": "Unavailable"}
+    try:
+        serial = _first_value_after_header(_check_lines(["wmic", "bios", "get", "serialnumber"], timeout), "Serial")
+    except Exception:
+        serial = "Unavailable"
+    return {"Serial Number": serial}
+
+
+def _probe_user():
+    return {
+        "Current User": get_current_user(),
+        "Logged-in Email/UPN": get_logged_in_email_or_upn(),
+    }
+
+
+def _probe_timezone():
+    tz_name, utc_offset = get_timezone_info()
+    return {"Time Zone (System)": tz_name, "UTC Offset": utc_offset}
+
+
+def _probe_public_ip():
+    return {"Public IP": get_public_ip()}
+
+
+def _probe_geo(public_ip_future, ip_timeout, deadline, cache=None):
+    """Geo fields for the public IP; the IP wait and both lookups share one time.monotonic() `deadline`."""
+    try:
+        ip = public_ip_future.result(timeout=_budget(deadline, ip_timeout))["Public IP"]
+    except Exception:
+        ip = "Unavailable"
+    if cache is not None and ip not in ("Unavailable", TIMED_OUT):
+        return cache.get(f"geo:{ip}", lambda: _geo_fields(ip, deadline), _cacheable)
+    return _geo_fields(ip, deadline)
+
+
+def _geo_fields(ip, deadline=None):
+    geo = get_ip_geolocation(ip, deadline)
+    return {
+        "IP Location (City)": geo.get("city"),
+        "IP Location (Region)": geo.get("region"),
+        "IP Location (Country)": geo.get("country"),
+        "ISP / Org": geo.get("org"),
+        "Latitude": geo.get("latitude"),
+        "Longitude": geo.get("longitude"),
+        "Provider Timezone (IP)": geo.get("provider_tz"),
+    }
+
+
+# (probe name, fields it fills, deadline in seconds)
+PROBES = (
+    ("host", ("Computer Name", "IP Address", "MAC Address", "Domain", "OS Version"), 5),
+    ("public_ip", ("Public IP",), 6),
+    ("install_date", ("OS Install Date",), 8),
+    ("model", ("Model",), 8),
+    ("boot_time", ("Last Booted",), 8),
+    ("disk", ("Free Disk Space (GB)",), 3),
+    ("memory", ("Installed Memory (GB)",), 8),
+    ("serial", ("Serial Number",), 8),
+    ("user", ("Current User", "Logged-in Email/UPN"), 6),
+    ("timezone", ("Time Zone (System)", "UTC Offset"), 2),
+    ("geo", ("IP Location (City)", "IP Location (Region)", "IP Location (Country)", "ISP / Org",
+             "Latitude", "Longitude", "Provider Timezone (IP)"), 12),
+)
+
+# Report order (matches the original single-shot layout)
+FIELDS = [
+    "Computer Name", "IP Address", "Public IP", "MAC Address", "Domain",
+    "OS Version", "OS Install Date", "Model", "Last Booted", "Free Disk Space (GB)",
+    "Installed Memory (GB)", "Serial Number",
+    "Current User", "Logged-in Email/UPN",
+    "Time Zone (System)", "UTC Offset",
+    "IP Location (City)", "IP Location (Region)", "IP Location (Country)", "ISP / Org",
+    "Latitude", "Longitude", "Provider Timezone (IP)",
+]
+
+
+def get_system_info(on_result=None, cache=None):
+    """
+    Collect the inventory report with every probe running concurrently, one
+    thread each. Each probe has its own deadline; fields of a probe that
+    misses it read TIMED_OUT instead of holding up the report.
+
+    on_result(partial: dict) is called from a worker thread as each probe
+    finishes, so callers can render fields as they arrive. With a FactCache,
+    probes listed in FACT_TTLS are answered from it while fresh.
+    """
+    try:
+        # one thread per probe: every deadline runs from the same start, so none may sit queued
+        pool = ThreadPoolExecutor(max_workers=len(PROBES), thread_name_prefix="sysinfo")
+        deadlines = {name: t for name, _, t in PROBES}
+
+        def submit(name, fn, *args):
+            if name in FACT_TTLS:
+                return pool.submit(_cached, cache, name, lambda: fn(*args))
+            return pool.submit(fn, *args)
+
+        futures = {}
+        futures["host"] = submit("host", _probe_host)
+        futures["public_ip"] = submit("public_ip", _probe_public_ip)
+        futures["install_date"] = submit("install_date", _probe_install_date, deadlines["install_date"])
+        futures["model"] = submit("model", _probe_model, deadlines["model"])
+        futures["boot_time"] = submit("boot_time", _probe_boot_time, deadlines["boot_time"])
+        futures["disk"] = submit("disk", _probe_disk)
+        futures["memory"] = submit("memory", _probe_memory, deadlines["memory"])
+        futures["serial"] = submit("serial", _probe_serial, deadlines["serial"])
+        futures["user"] = submit("user", _probe_user)
+        futures["timezone"] = submit("timezone", _probe_timezone)
+        # keyed by IP inside the probe ("geo:<ip>"), so not wrapped by submit(). Its HTTP calls get what is
+        # left of the geo deadline after waiting for the public IP, so a slow IP lookup can't push them past it
+        futures["geo"] = pool.submit(_probe_geo, futures["public_ip"], deadlines["public_ip"],
+                                     time.monotonic() + deadlines["geo"], cache)
+
+        if on_result:
+            def _deliver(fut):
+                if fut.exception() is None:
+                    on_result(fut.result())
+
+            for fut in futures.values():
+                fut.add_done_callback(_deliver)
+
+        start = time.monotonic()
+        info = {}
+        for name, fields, deadline in PROBES:
+            remaining = max(0.0, start + deadline - time.monotonic())
+            try:
+                info.update(futures[name].result(timeout=remaining))
+            except FuturesTimeout:
+                info.update({f: TIMED_OUT for f in fields})
+            except Exception:
+                info.update({f: "Unavailable" for f in fields})
+        # don't wait for stragglers; their subprocess/HTTP timeouts end them
+        pool.shutdown(wait=False)
+        return {k: info.get(k, "Unavailable") for k in FIELDS}
 
     except Exception as e:
         raise RuntimeError(f"System info collection failed: {e}")
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+import psutil
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram: O(1) record, bounded memory."""
+
+    __slots__ = ("counts", "count", "total_ms", "max_ms")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, ms: float):
+        self.counts[bisect_left(BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def quantile(self, q: float):
+        """Upper bound of the bucket holding the q-quantile, capped at the observed max."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return min(BUCKETS_MS[i], self.max_ms) if i < len(BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+
+class Telemetry:
+    """
+    Agent self-instrumentation: per-stage latency histograms, error and
+    skipped-tick counters, plus the agent process's own CPU% and RSS.
+
+    Stages accumulate until snapshot(), which returns the interval's figures
+    and starts a new interval.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: dict[str, LatencyHistogram] = {}
+        self._errors: dict[str, int] = {}
+        self._proc = psutil.Process(os.getpid())
+        try:
+            self._proc.cpu_percent(interval=None)  # baseline
+        except Exception:
+            pass
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            hist = self._stages.get(stage)
+            if hist is None:
+                hist = self._stages[stage] = LatencyHistogram()
+            hist.record(seconds * 1000.0)
+
+    def error(self, stage: str, exc: Exception = None, count: int = 1):
+        with self._lock:
+            self._errors[stage] = self._errors.get(stage, 0) + count
+
+    @contextmanager
+    def time(self, stage: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception as e:
+            self.error(stage, e)
+            raise
+        finally:
+            self.record(stage, time.perf_counter() - t0)
+
+    def rss_mb(self):
+        try:
+            return self._proc.memory_info().rss / (1024 ** 2)
+        except Exception:
+            return None
+
+    def snapshot(self, skipped: int = 0) -> dict:
+        """{"agent": {...}, "stages": {stage: {...}}} for the interval since the last call."""
+        with self._lock:
+            stages, self._stages = self._stages, {}
+            errors, self._errors = self._errors, {}
+        try:
+            cpu = float(self._proc.cpu_percent(interval=None))
+            rss_mb = self.rss_mb()
+            threads = self._proc.num_threads()
+        except Exception:
+            cpu, rss_mb, threads = None, None, None
+        out = {}
+        for name in sorted(set(stages) | set(errors)):
+            h = stages.get(name) or LatencyHistogram()
+            out[name] = {
+                "count": h.count,
+                "errors": errors.get(name, 0),
+                "avg_ms": h.total_ms / h.count if h.count else None,
+                "p50_ms": h.quantile(0.5),
+                "p95_ms": h.quantile(0.95),
+                "max_ms": h.max_ms if h.count else None,
+            }
+        return {
+            "agent": {
+                "cpu_percent": cpu,
+                "rss_mb": rss_mb,
+                "threads": threads,
+                "skipped": skipped,
+                "errors": sum(errors.values()),
+            },
+            "stages": out,
+        }
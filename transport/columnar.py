@@ -0,0 +1,419 @@
+import json
+import struct
+import sys
+from array import array
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+from schema import InsightEnvelope
+
+CONTENT_TYPE = "application/vnd.insight.columnar"
+MAGIC = b"ISC1"
+
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+_SWAP = sys.byteorder == "big"  # the wire is little-endian
+
+# mirrors schema.ResourceSample (and local_store.RESOURCE_FIELDS)
+SAMPLE_FIELDS = (
+    "cpu_percent",
+    "mem_percent",
+    "disk_used_gb",
+    "disk_total_gb",
+    "uptime_seconds",
+    "net_tx_kbps",
+    "net_rx_kbps",
+)
+_DEVICE_KINDS = ("nic", "disk")
+# process entry kinds, named after the schema.ProcessSample lists they belong to
+PROCESS_KINDS = ("top", "spawned", "exited", "movers")
+
+# Fixed-point scale per numeric column, matching how its source quantises it: psutil reports CPU% and
+# memory% in steps of 0.1, the net/disk collectors round rates to 0.1 and 0.01, disk sizes are
+# bytes / 2**30. A column travels as integers (value * scale) only if every value comes back exactly,
+# otherwise as float64; None (process mem_percent, which nothing rounds) is always float64.
+# Decoding is lossless either way.
+SAMPLE_SCALES = {
+    "cpu_percent": 10,
+    "mem_percent": 10,
+    "disk_used_gb": 2 ** 30,
+    "disk_total_gb": 2 ** 30,
+    "uptime_seconds": 1,
+    "net_tx_kbps": 10,
+    "net_rx_kbps": 10,
+}
+# per-NIC / per-disk (in, out, in_ops, out_ops)
+DEVICE_SCALES = (10, 10, 100, 100)
+# process cpu_percent (psutil: steps of 0.1), mem_percent (unrounded)
+PROCESS_SCALES = (10, None)
+_INT_CODES = ("b", "h", "i", "q")
+# numeric column flags; SHUFFLE stores byte 0 of every value, then byte 1, ... (gzip-friendly)
+_DELTA, _NULLS, _FLOAT, _SHUFFLE = 1, 2, 4, 8
+
+# Model-free form of one envelope, shared by the store, the encoder and the decoder:
+#   meta:    {"version", "device" (dict), "tags" (dict), "identity"[, "single"]}
+#   samples: [(ts_us, (SAMPLE_FIELDS values...), [(kind, name, in, out, in_ops, out_ops), ...])]
+#   snaps:   [(ts_us, [(pid, name, cpu_percent, mem_percent, kind), ...])]  kind: PROCESS_KINDS index
+#   inventory: [(ts_us, {"hash", "base", "full", "fields"}), ...]  (rare; rides in the JSON header)
+#   alerts:    [(ts_us, {"rule", "field", "state", "severity", "value", "limit"}), ...]  (likewise)
+RowGroup = namedtuple("RowGroup", "meta samples snaps inventory alerts", defaults=((), ()))
+
+
+def to_us(dt: datetime) -> int:
+    """Datetime (naive UTC or aware) -> integer microseconds since the epoch."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH) // _US
+
+
+# ---------- Models <-> RowGroup ----------
+def from_envelope(env: InsightEnvelope) -> RowGroup:
+    meta = {
+        "version": env.version,
+        "device": env.device.model_dump(mode="json"),
+        "tags": dict(env.tags),
+        "identity": env.identity,
+    }
+    if env.processes is not None and not env.process_samples:
+        meta["single"] = True
+    samples = [
+        (
+            to_us(s.ts),
+            tuple(getattr(s, f) for f in SAMPLE_FIELDS),
+            [("nic", n.name, n.rx_bps, n.tx_bps, n.rx_pps, n.tx_pps) for n in s.nics]
+            + [("disk", d.name, d.read_bps, d.write_bps, d.read_iops, d.write_iops) for d in s.disks],
+        )
+        for s in env.samples
+    ]
+    snaps = ([env.processes] if env.processes else []) + list(env.process_samples)
+    snaps = [
+        (to_us(p.ts), [(i.pid, i.name, i.cpu_percent, i.mem_percent, k)
+                       for k, kind in enumerate(PROCESS_KINDS) for i in getattr(p, kind)])
+        for p in snaps
+    ]
+    inventory = [
+        (to_us(r.ts), {"hash": r.hash, "base": r.base, "full": r.full, "fields": r.fields})
+        for r in env.inventory
+    ]
+    alerts = [(to_us(a.ts), a.model_dump(exclude={"ts"})) for a in env.alerts]
+    return RowGroup(meta, samples, snaps, inventory, alerts)
+
+
+def to_envelope(group: RowGroup, single: bool = None) -> InsightEnvelope:
+    """
+    Build the pydantic envelope for a RowGroup. With single=True (default:
+    meta["single"]) a lone process snapshot goes in `processes`, the
+    one-row form; otherwise all snapshots go in `process_samples`.
+    """
+    # one model_validate over plain dicts is cheaper than building each model in Python
+    return InsightEnvelope.model_validate(envelope_dict(group, single))
+
+
+def envelope_dict(group: RowGroup, single: bool = None) -> dict:
+    """to_envelope() as plain dicts and lists, without building models."""
+    samples = [
+        {
+            **dict(zip(SAMPLE_FIELDS, values)),
+            "ts": _EPOCH + ts * _US,
+            "nics": [{"name": n, "rx_bps": i, "tx_bps": o, "rx_pps": io, "tx_pps": oo}
+                     for k, n, i, o, io, oo in devices if k == "nic"],
+            "disks": [{"name": n, "read_bps": i, "write_bps": o, "read_iops": io, "write_iops": oo}
+                      for k, n, i, o, io, oo in devices if k == "disk"],
+        }
+        for ts, values, devices in group.samples
+    ]
+    snaps = []
+    for ts, procs in group.snaps:
+        snap = {"ts": _EPOCH + ts * _US, **{kind: [] for kind in PROCESS_KINDS}}
+        for p, n, c, m, k in procs:
+            snap[PROCESS_KINDS[k]].append({"pid": p, "name": n, "cpu_percent": c, "mem_percent": m})
+        snaps.append(snap)
+    meta = group.meta
+    if single is None:
+        single = meta.get("single", False)
+    single = single and len(snaps) == 1
+    return {
+        "version": meta["version"] or "1.0",
+        "device": meta["device"],
+        "samples": samples,
+        "processes": snaps[0] if single else None,
+        "process_samples": [] if single else snaps,
+        "tags": meta["tags"] or {},
+        "identity": meta.get("identity"),
+        "inventory": [{"ts": _EPOCH + ts * _US, **rec} for ts, rec in group.inventory],
+        "alerts": [{"ts": _EPOCH + ts * _US, **rec} for ts, rec in group.alerts],
+    }
+
+
+# ---------- Binary form ----------
+def _deltas(values):
+    """First value absolute, the rest as differences (small and repetitive on a fixed cadence)."""
+    return array("q", [b - a for a, b in zip([0, *values], values)])
+
+
+def _undelta(arr, base: int = 0):
+    out, acc = [], base
+    for d in arr:
+        acc += d
+        out.append(acc)
+    return out
+
+
+class _Dict:
+    """String dictionary: each distinct value stored once, referenced by index."""
+
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def __call__(self, s: str) -> int:
+        i = self._index.get(s)
+        if i is None:
+            i = self._index[s] = len(self.values)
+            self.values.append(s)
+        return i
+
+
+def _pack(out: bytearray, arr: array):
+    if _SWAP:
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    out += struct.pack("<cI", arr.typecode.encode(), len(arr))
+    out += arr.tobytes()
+
+
+def _unpack(buf: memoryview, pos: int):
+    code, n = struct.unpack_from("<cI", buf, pos)
+    pos += 5
+    arr = array(code.decode())
+    end = pos + n * arr.itemsize
+    arr.frombytes(buf[pos:end])
+    if _SWAP:
+        arr.byteswap()
+    return arr, end
+
+
+def _narrow(values):
+    """Smallest signed array type holding every value, or None if they need more than 64 bits."""
+    lo, hi = min(values, default=0), max(values, default=0)
+    for code in _INT_CODES:
+        bound = 1 << (8 * array(code).itemsize - 1)
+        if -bound <= lo and hi < bound:
+            return array(code, values)
+    return None
+
+
+def _fixed(values, scale: int):
+    """values * scale as ints if every one of them decodes back exactly, else None."""
+    try:
+        ints = [round(v * scale) for v in values]
+    except (OverflowError, ValueError):  # inf / nan
+        return None
+    if scale == 1:
+        exact = all(q == v for q, v in zip(ints, values))
+    else:
+        exact = all(q / scale == v for q, v in zip(ints, values))
+    return ints if exact else None
+
+
+def _pack_ints(out: bytearray, values, scale: int = 1):
+    """
+    A numeric column as fixed-point integers (value * scale) in the
+    narrowest type, delta-encoded when that is narrower still. None becomes
+    a presence mask; a column that the scale would not carry exactly (or
+    that does not fit in 64 bits) is sent as float64.
+    """
+    present = [v for v in values if v is not None]
+    flags = _NULLS if len(present) < len(values) else 0
+    ints = _fixed(present, scale) if scale else None
+    col = None if ints is None else _narrow(ints)
+    base = 0
+    if col is None:
+        flags |= _FLOAT
+        col = array("d", present)
+    elif len(ints) > 1:
+        deltas = _narrow([b - a for a, b in zip(ints, ints[1:])])
+        if deltas is not None and deltas.itemsize < col.itemsize:
+            flags |= _DELTA
+            base, col = ints[0], deltas
+    if col.itemsize > 1:
+        flags |= _SHUFFLE
+    out += struct.pack("<BIq", flags, scale or 0, base)
+    if flags & _NULLS:
+        _pack(out, array("B", [v is not None for v in values]))
+    if flags & _SHUFFLE:
+        if _SWAP:
+            col = array(col.typecode, col)
+            col.byteswap()
+        raw, size = col.tobytes(), col.itemsize
+        out += struct.pack("<cI", col.typecode.encode(), len(col))
+        out += b"".join(raw[i::size] for i in range(size))
+    else:
+        _pack(out, col)
+
+
+def _unpack_ints(buf: memoryview, pos: int):
+    flags, scale, base = struct.unpack_from("<BIq", buf, pos)
+    pos += 13
+    mask = None
+    if flags & _NULLS:
+        mask, pos = _unpack(buf, pos)
+    if flags & _SHUFFLE:
+        code, n = struct.unpack_from("<cI", buf, pos)
+        pos += 5
+        col = array(code.decode())
+        size = col.itemsize
+        raw = bytearray(n * size)
+        for i in range(size):
+            raw[i::size] = buf[pos + i * n:pos + (i + 1) * n]
+        pos += n * size
+        col.frombytes(raw)
+        if _SWAP:
+            col.byteswap()
+    else:
+        col, pos = _unpack(buf, pos)
+    if flags & _FLOAT:
+        values = col.tolist()
+    else:
+        values = [base, *_undelta(col, base)] if flags & _DELTA else col.tolist()
+        if scale != 1:
+            # exact: the encoder checked that n / scale gives back every original value
+            values = [v / scale for v in values]
+    if mask is not None:
+        it = iter(values)
+        values = [next(it) if m else None for m in mask]
+    return values, pos
+
+
+def _encode_group(group: RowGroup) -> bytes:
+    samples, snaps = group.samples, group.snaps
+    names, dev_names = _Dict(), _Dict()
+    out = bytearray()
+
+    _pack_ints(out, [s[0] for s in samples])
+    for i, f in enumerate(SAMPLE_FIELDS):
+        _pack_ints(out, [s[1][i] for s in samples], SAMPLE_SCALES[f])
+    devices = [d for s in samples for d in s[2]]
+    _pack(out, _narrow([len(s[2]) for s in samples]))
+    _pack(out, array("B", [_DEVICE_KINDS.index(d[0]) for d in devices]))
+    _pack(out, _narrow([dev_names(d[1]) for d in devices]))
+    for i, scale in enumerate(DEVICE_SCALES, 2):
+        _pack_ints(out, [d[i] for d in devices], scale)
+
+    procs = [p for snap in snaps for p in snap[1]]
+    _pack_ints(out, [snap[0] for snap in snaps])
+    _pack(out, _narrow([len(snap[1]) for snap in snaps]))
+    _pack_ints(out, [p[0] for p in procs])
+    _pack(out, _narrow([names(p[1]) for p in procs]))
+    _pack_ints(out, [p[2] for p in procs], PROCESS_SCALES[0])
+    _pack_ints(out, [p[3] for p in procs], PROCESS_SCALES[1])
+    _pack(out, array("B", [p[4] for p in procs]))
+
+    header = {**group.meta, "names": names.values, "devices": dev_names.values}
+    if group.inventory:
+        header["inventory"] = group.inventory
+    if group.alerts:
+        header["alerts"] = group.alerts
+    header = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    return struct.pack("<I", len(header)) + header + bytes(out)
+
+
+def _decode_group(buf: memoryview) -> RowGroup:
+    (hlen,) = struct.unpack_from("<I", buf, 0)
+    header = json.loads(bytes(buf[4:4 + hlen]))
+    pos = 4 + hlen
+
+    def take():
+        nonlocal pos
+        arr, pos = _unpack(buf, pos)
+        return arr
+
+    def take_num():
+        nonlocal pos
+        values, pos = _unpack_ints(buf, pos)
+        return values
+
+    ts = take_num()
+    fields = [take_num() for _ in SAMPLE_FIELDS]
+    counts, kinds, idx = take(), take(), take()
+    vals = [take_num() for _ in range(4)]
+    dev_names = header.pop("devices")
+    devices = [
+        (_DEVICE_KINDS[kinds[j]], dev_names[idx[j]], vals[0][j], vals[1][j], vals[2][j], vals[3][j])
+        for j in range(len(idx))
+    ]
+    samples, at = [], 0
+    for i, t in enumerate(ts):
+        samples.append((t, tuple(col[i] for col in fields), devices[at:at + counts[i]]))
+        at += counts[i]
+
+    snap_ts, counts = take_num(), take()
+    pids, idx, cpu, mem, kinds = take_num(), take(), take_num(), take_num(), take()
+    names = header.pop("names")
+    snaps, at = [], 0
+    for t, n in zip(snap_ts, counts):
+        snaps.append((t, [(pids[j], names[idx[j]], cpu[j], mem[j], kinds[j]) for j in range(at, at + n)]))
+        at += n
+    inventory = [(ts, rec) for ts, rec in header.pop("inventory", ())]
+    alerts = [(ts, rec) for ts, rec in header.pop("alerts", ())]
+    return RowGroup(header, samples, snaps, inventory, alerts)
+
+
+def encode_groups(groups) -> bytes:
+    """
+    Columnar binary form of a batch of RowGroups.
+
+    Per group: a small JSON header (identity, tags and the string
+    dictionaries) followed by little-endian arrays: microsecond timestamps,
+    one column per sample field, the per-NIC/per-disk rate table and the
+    process table, with names as dictionary indexes and a kind column
+    (PROCESS_KINDS). Numbers are fixed-point integers at the column's scale
+    (SAMPLE_SCALES / DEVICE_SCALES / PROCESS_SCALES) in the narrowest
+    integer type that holds them, delta-encoded where that is narrower
+    (timestamps, uptime, disk sizes); a column the scale cannot carry
+    exactly stays float64, so decoding gives back the values that were
+    encoded. Multi-byte columns are byte-shuffled to help gzip. Inventory
+    records and alerts, when present, are carried in the header.
+    """
+    out = bytearray(MAGIC)
+    for group in groups:
+        out += frame_group(group)
+    return bytes(out)
+
+
+def frame_group(group: RowGroup) -> bytes:
+    """One length-prefixed group. MAGIC followed by any number of these is an encode_groups() body."""
+    body = _encode_group(group)
+    return struct.pack("<I", len(body)) + body
+
+
+def decode_groups(data: bytes):
+    buf = memoryview(data)
+    if bytes(buf[:4]) != MAGIC:
+        raise ValueError("Not an Insight columnar batch")
+    pos, out = 4, []
+    while pos < len(buf):
+        (n,) = struct.unpack_from("<I", buf, pos)
+        pos += 4
+        out.append(_decode_group(buf[pos:pos + n]))
+        pos += n
+    return out
+
+
+def encode(envelopes) -> bytes:
+    """encode_groups() for pydantic envelopes."""
+    return encode_groups([from_envelope(e) for e in envelopes])
+
+
+def decode(data: bytes):
+    """Inverse of encode(): the list of InsightEnvelope models."""
+    return [to_envelope(g) for g in decode_groups(data)]
+
+
+def decode_dicts(data: bytes):
+    """
+    Like decode(), but plain envelope-shaped dicts (datetimes for ts)
+    without pydantic validation, for receivers that trust the sender and
+    only need the values; several times faster than decode().
+    """
+    return [envelope_dict(g) for g in decode_groups(data)]
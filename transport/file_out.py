@@ -0,0 +1,42 @@
+import os
+import time
+
+from transport import columnar
+
+
+class FileDrop:
+    """
+    Sink that writes each batch to a directory instead of posting it, for a
+    local collector or a share another process picks up.
+
+    Same interface as http_out.Uploader (post_groups / close). Each batch is
+    one file: a JSON array of envelopes (".json") or the columnar body
+    (".isc"). Files are written under a temporary name and renamed into
+    place, so a reader never sees a partial batch.
+    """
+
+    def __init__(self, path: str, encoding: str = "json"):
+        if encoding not in ("json", "columnar"):
+            raise ValueError(f"Unknown file encoding: {encoding}")
+        self.path = path
+        self.encoding = encoding
+        self._seq = 0
+        os.makedirs(path, exist_ok=True)
+
+    def post_groups(self, groups) -> int:
+        """Write one batch file; returns its size in bytes. Raises on failure."""
+        if self.encoding == "columnar":
+            data, ext = columnar.encode_groups(groups), "isc"
+        else:
+            rows = [columnar.to_envelope(g).model_dump_json() for g in groups]
+            data, ext = ("[" + ",".join(rows) + "]").encode("utf-8"), "json"
+        self._seq += 1
+        name = f"insight-{time.time_ns()}-{self._seq:06d}.{ext}"
+        tmp = os.path.join(self.path, name + ".tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, os.path.join(self.path, name))
+        return len(data)
+
+    def close(self):
+        pass
@@ -1,7 +1,17 @@
-import json
+import time
+import zlib
 import requests
 from requests.adapters import HTTPAdapter, Retry
 
+from transport import columnar
+
+_CHUNK_BYTES = 64 * 1024
+# a server that cannot read the columnar body says so with one of these (422: pydantic/FastAPI validation)
+_UNSUPPORTED = (400, 406, 415, 422)
+# a server that reads columnar bodies lists columnar.CONTENT_TYPE in this response header
+ADVERTISE_HEADER = "Accept-Post"
+
+
 def _session():
     s = requests.Session()
     retries = Retry(
@@ -14,16 +24,140 @@ def _session():
     s.mount("http://", HTTPAdapter(max_retries=retries))
     return s
 
+
+class JsonArrayBody:
+    """
+    Streams rows (JSON strings) as one JSON array, gzip-compressed when asked.
+
+    Chunks are produced lazily, so the full array is never built as a single
+    string. The object is re-iterable: urllib3 replays it on retry.
+    """
+
+    def __init__(self, rows, compress: bool = True, chunk_bytes: int = _CHUNK_BYTES):
+        self.rows = rows
+        self.compress = compress
+        self.chunk_bytes = chunk_bytes
+
+    def _text(self):
+        yield b"["
+        for i, row in enumerate(self.rows):
+            if i:
+                yield b","
+            yield row.encode("utf-8") if isinstance(row, str) else row
+        yield b"]"
+
+    def __iter__(self):
+        comp = zlib.compressobj(6, zlib.DEFLATED, 31) if self.compress else None  # wbits 31 = gzip
+        buf, size = [], 0
+        for part in self._text():
+            buf.append(part)
+            size += len(part)
+            if size >= self.chunk_bytes:
+                data = b"".join(buf)
+                buf, size = [], 0
+                out = comp.compress(data) if comp else data
+                if out:
+                    yield out
+        data = b"".join(buf)
+        out = (comp.compress(data) + comp.flush()) if comp else data
+        if out:
+            yield out
+
+
+class Uploader:
+    """
+    Long-lived uploader for one endpoint: keeps a single Session (pooled,
+    keep-alive connections, so TLS is negotiated once) and sends gzip-compressed,
+    streamed JSON bodies.
+
+    post_groups() picks the body format per endpoint: "json" (default),
+    "columnar" (the binary form in transport.columnar; the server must read
+    it) or "auto": JSON until a response advertises columnar support in
+    ADVERTISE_HEADER, then columnar. If the server then rejects a columnar
+    body, that batch is resent as JSON and columnar is only tried again
+    after `reprobe_seconds`.
+    """
+
+    def __init__(self, endpoint: str, token: str, compress: bool = True, timeout: float = 20,
+                 encoding: str = "json", reprobe_seconds: float = 3600):
+        if encoding not in ("auto", "json", "columnar"):
+            raise ValueError(f"Unknown http encoding: {encoding}")
+        self.endpoint = endpoint
+        self.compress = compress
+        self.timeout = timeout
+        self.encoding = encoding
+        self.reprobe_seconds = reprobe_seconds
+        self._json_until = 0.0
+        self._advertised = False
+        self.session = _session()
+        self.session.headers.update({
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        })
+        if compress:
+            self.session.headers["Content-Encoding"] = "gzip"
+
+    def post_rows(self, rows):
+        """
+        rows: iterable of JSON strings (each an InsightEnvelope)
+        Sends them as a JSON array. Raises on failure.
+        """
+        body = JsonArrayBody(rows, compress=self.compress)
+        resp = self.session.post(self.endpoint, data=body, timeout=self.timeout)
+        resp.raise_for_status()
+        return resp
+
+    def use_columnar(self) -> bool:
+        if self.encoding == "auto":
+            return self._advertised and time.monotonic() >= self._json_until
+        return self.encoding == "columnar"
+
+    def _note_support(self, resp):
+        # the server may stop advertising (e.g. after a downgrade); follow whatever it last said
+        self._advertised = columnar.CONTENT_TYPE in resp.headers.get(ADVERTISE_HEADER, "")
+
+    def post_groups(self, groups):
+        """
+        groups: transport.columnar.RowGroup list. Sends them columnar or as a
+        JSON array of envelopes, as negotiated. Returns the body size before
+        compression. Raises on failure.
+        """
+        if self.use_columnar():
+            data = columnar.encode_groups(groups)
+            body = data
+            if self.compress:
+                comp = zlib.compressobj(6, zlib.DEFLATED, 31)
+                body = comp.compress(data) + comp.flush()
+            resp = self.session.post(
+                self.endpoint, data=body, timeout=self.timeout,
+                headers={"Content-Type": columnar.CONTENT_TYPE},
+            )
+            if not (self.encoding == "auto" and resp.status_code in _UNSUPPORTED):
+                resp.raise_for_status()
+                self._note_support(resp)
+                return len(data)
+            # advertised but rejected; resend this batch as JSON
+            self._json_until = time.monotonic() + self.reprobe_seconds
+        rows = [columnar.to_envelope(g).model_dump_json() for g in groups]
+        resp = self.post_rows(rows)
+        if self.encoding == "auto":
+            self._note_support(resp)
+        return sum(len(r) for r in rows) + len(rows) + 1
+
+    def close(self):
+        self.session.close()
+
+
+_uploaders: dict = {}
+
+
 def post_batch(endpoint: str, token: str, rows: list[str]):
     """
     rows: list of JSON strings (each an InsightEnvelope)
     Sends a JSON array to endpoint. Raises on failure.
+    Reuses one Uploader (and its connections) per endpoint/token.
     """
-    payload = "[" + ",".join(rows) + "]"
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Content-Type": "application/json",
-    }
-    resp = _session().post(endpoint, data=payload, headers=headers, timeout=20)
-    resp.raise_for_status()
-    return resp
+    up = _uploaders.get((endpoint, token))
+    if up is None:
+        up = _uploaders[(endpoint, token)] = Uploader(endpoint, token)
+    return up.post_rows(rows)
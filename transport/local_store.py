@@ -1,40 +1,1174 @@
+import bisect
+import hashlib
+import heapq
+import json
+import os
+import pathlib
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+from datetime import datetime, timedelta, timezone
+
+from anomaly import SEVERITIES
+from schema import InsightEnvelope
+from transport.columnar import RowGroup, PROCESS_KINDS, to_envelope
+from transport.rollups import Rollups, TIERS, TIER_WIDTH, ROLLUP_FIELDS
+from transport.writer import StoreWriter
+
+SCHEMA_VERSION = 6
+
+# Typed columns mirrored from schema.ResourceSample / schema.ProcessInfo
+RESOURCE_FIELDS = (
+    "cpu_percent",
+    "mem_percent",
+    "disk_used_gb",
+    "disk_total_gb",
+    "uptime_seconds",
+    "net_tx_kbps",
+    "net_rx_kbps",
+)
+PROCESS_FIELDS = ("pid", "name", "cpu_percent", "mem_percent")
+# process rows also carry their kind (index into columnar.PROCESS_KINDS: top, spawned, exited, movers)
+PROCESS_COLUMNS = (*PROCESS_FIELDS, "kind")
+SAMPLE_COLUMNS = ("id", "ts", *RESOURCE_FIELDS, "proc_ts", "ident")
+# v1-v4 rows repeated the envelope's static part inline
+_INLINE_COLUMNS = ("id", "ts", *RESOURCE_FIELDS, "proc_ts", "version", "device", "tags")
+# Per-device rates share one child table: kind "nic" (rx -> in, tx -> out) or "disk" (read -> in, write -> out)
+DEVICE_FIELDS = ("kind", "name", "in_bps", "out_bps", "in_ops", "out_ops")
+
+DAY_SECONDS = 86400
+# query() reads rollup tiers at least this wide; a 1m tier row per metric is no fewer rows than 30 s samples
+QUERY_MIN_TIER_SECONDS = 3600
+
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+_MIGRATE_CHUNK = 500
+# free pages returned to the OS per maintain() call, so one pass never stalls the writer for long
+_VACUUM_PAGES = 2048
+# eviction stops once the store is back under this fraction of the cap, so it does not run on every check
+_EVICT_TARGET = 0.9
+
+
+def to_epoch(dt: datetime) -> float:
+    """Naive-UTC (or aware) datetime -> epoch seconds, as stored in `ts` columns."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH).total_seconds()
+
+
+def from_epoch(ts: float) -> datetime:
+    return _EPOCH + timedelta(seconds=ts)
+
+
+def day_key(ts: float) -> str:
+    """Partition suffix (UTC day, YYYYMMDD) for an epoch timestamp."""
+    return from_epoch(ts - ts % DAY_SECONDS).strftime("%Y%m%d")
+
+
+def identity_hash(version: str, device_json: str, tags_json: str) -> str:
+    """Stable short hash of an envelope's static part (version, device, tags)."""
+    h = hashlib.sha1("\0".join((version or "", device_json, tags_json or "")).encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def _enable_incremental_vacuum(path: str):
+    """Switch the file to auto_vacuum=INCREMENTAL; an existing file needs a one-off VACUUM to convert."""
+    conn = sqlite3.connect(path, isolation_level=None)
+    try:
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+            return
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        if conn.execute("PRAGMA page_count").fetchone()[0]:
+            conn.execute("VACUUM")
+    except sqlite3.OperationalError:
+        # another process holds the file; try again on the next start
+        pass
+    finally:
+        conn.close()
+
+
+class StoreBusy(RuntimeError):
+    """Another process owns the store for writing (see LocalStore, read_only)."""
+
+    def __init__(self, path: str, pid: str = ""):
+        self.path = path
+        self.pid = pid
+        super().__init__(f"{path} is in use by another Insight agent" + (f" (pid {pid})" if pid else ""))
+
+
+def _lock_owner(path: str):
+    """
+    Take the cross-process owner lock `<path>.lock` and write our PID into
+    it; returns the open file (keep it open to hold the lock). The OS drops
+    the lock if the process dies, so a crash never leaves the store locked.
+    Raises StoreBusy if another process holds it.
+    """
+    f = open(path + ".lock", "a+")
+    try:
+        f.seek(0)
+        if os.name == "nt":
+            import msvcrt
+
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        try:
+            f.seek(0)
+            pid = f.read().strip()
+        except OSError:
+            # Windows: the owner's locked byte cannot be read
+            pid = ""
+        f.close()
+        raise StoreBusy(path, pid)
+    f.seek(0)
+    f.truncate()
+    f.write(str(os.getpid()))
+    f.flush()
+    return f
+
+
+def _check_fields(fields):
+    bad = [f for f in fields if f not in RESOURCE_FIELDS]
+    if bad:
+        raise ValueError(f"Unknown sample field(s): {', '.join(bad)}")
+    return list(fields)
+
 
 class LocalStore:
-    def __init__(self, path: str = "insight.db"):
-        self.conn = sqlite3.connect(path, check_same_thread=False)
-        self.conn.execute("""
-            CREATE TABLE IF NOT EXISTS metrics(
+    """
+    Typed sample store on a single SQLite file.
+
+    Samples live in per-day partitions (`samples_YYYYMMDD` plus matching
+    `processes_YYYYMMDD` and `devices_YYYYMMDD` child tables) listed in the
+    `partitions` catalog. The envelope's static part (version, device,
+    tags) is stored once in `identities` and rows reference it by id.
+    Retention drops whole partitions, so pruning cost does not grow with
+    the amount of history kept. Row ids come from one store-wide sequence.
+    Every resource sample is also folded into 1m/1h/1d rollups as it is
+    written, each tier with its own retention.
+
+    The file uses incremental auto-vacuum: maintain() hands pages freed by
+    retention and eviction back to the OS a bounded slice at a time, and
+    can cap the store's size by evicting the oldest detail first.
+
+    All writes go through one StoreWriter (group commits, WAL journal); reads
+    use a per-thread connection so the collector and the syncer never block
+    each other; a short-lived thread (an export) calls release() when it is
+    done. Share one LocalStore per file within a process.
+
+    read_only=True opens an existing file for queries alone (cli.py, or the
+    GUI next to a running headless agent): no writer, no migrations or
+    vacuum, and write methods are unavailable. Only one process may open a
+    file for writing; a second one gets StoreBusy.
+    """
+
+    def __init__(self, path: str = "insight.db", commit_interval: float = 2.0, rollup_retention: dict = None,
+                 timer=None, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        # a sample can become visible to readers up to this long after its ts
+        self.commit_interval = float(commit_interval)
+        self._rollups = Rollups(rollup_retention)
+        self._local = threading.local()
+        self._ident_cache = {}
+        self._readers = []
+        self._readers_lock = threading.Lock()
+        self._alert_listeners = []
+        # writer-thread state
+        self._last_id = 0
+        self._days = {}
+        self._idents = {}
+        self._pruned_before = None
+        self._prune_held = False
+        self._owner = None
+        if read_only:
+            # for tools beside a running agent: no writer thread, no migrations, never creates the file
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"No Insight store at {path}")
+            self._writer = None
+            self._closed = False
+            version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+            if version != SCHEMA_VERSION:
+                raise ValueError(f"{path} has store schema v{version}, expected v{SCHEMA_VERSION}; "
+                                 "run the agent once to migrate it")
+            return
+        # before touching the file, so a second writer fails fast instead of on "database is locked"
+        self._owner = _lock_owner(path)
+        try:
+            _enable_incremental_vacuum(path)
+            self._writer = StoreWriter(path, commit_interval=commit_interval, on_rollback=self._load_state,
+                                       timer=timer)
+            self._writer.call(self._ensure_schema)
+        except BaseException:
+            self._owner.close()
+            raise
+
+    @property
+    def closed(self) -> bool:
+        return self._closed if self._writer is None else self._writer.closed
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        """Read connection for the calling thread."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.read_only:
+                conn = sqlite3.connect(f"{pathlib.Path(self.path).absolute().as_uri()}?mode=ro", uri=True,
+                                       check_same_thread=False)
+            else:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA busy_timeout=5000")
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        return conn
+
+    def release(self):
+        """Close the calling thread's read connection; the next read on this thread opens a new one."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            return
+        self._local.conn = None
+        with self._readers_lock:
+            if conn in self._readers:
+                self._readers.remove(conn)
+        conn.close()
+
+    def flush(self, timeout: float = None):
+        """Wait until every queued write is committed."""
+        if self._writer:
+            self._writer.flush(timeout)
+
+    def close(self, timeout: float = 5.0):
+        """Commit pending writes, stop the writer and close read connections."""
+        if self._writer:
+            self._writer.close(timeout)
+        else:
+            self._closed = True
+        if self._owner is not None:
+            self._owner.close()
+            self._owner = None
+        with self._readers_lock:
+            for conn in self._readers:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._readers.clear()
+        self._local = threading.local()
+
+    # ---------- Schema ----------
+    def _ensure_schema(self, c: sqlite3.Connection):
+        c.execute("CREATE TABLE IF NOT EXISTS meta(key TEXT PRIMARY KEY, value)")
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS partitions(
+              day TEXT PRIMARY KEY,
+              start REAL NOT NULL,
+              lo_id INTEGER NOT NULL,
+              hi_id INTEGER NOT NULL
+            )
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS identities(
               id INTEGER PRIMARY KEY,
-              ts TEXT NOT NULL,
-              payload TEXT NOT NULL
+              hash TEXT NOT NULL UNIQUE,
+              version TEXT,
+              device TEXT NOT NULL,
+              tags TEXT
+            )
+        """)
+        # change-only inventory records; each rides on a sample row (resource fields NULL) for delivery
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS inventory(
+              sample_id INTEGER PRIMARY KEY,
+              ts REAL NOT NULL,
+              hash TEXT NOT NULL,
+              base TEXT,
+              full INTEGER NOT NULL,
+              fields TEXT NOT NULL
+            )
+        """)
+        # local rule alerts; a delivery stream of their own, sent ahead of the sample rows
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS alerts(
+              id INTEGER PRIMARY KEY AUTOINCREMENT,
+              ts REAL NOT NULL,
+              ident INTEGER NOT NULL,
+              priority INTEGER NOT NULL,
+              rule TEXT NOT NULL,
+              field TEXT NOT NULL,
+              state TEXT NOT NULL,
+              severity TEXT NOT NULL,
+              value REAL,
+              lim REAL
             )
         """)
-        self.conn.commit()
+        c.execute("CREATE INDEX IF NOT EXISTS ix_alerts_ts ON alerts(ts)")
+        Rollups.create(c)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS agent_stats(
+              ts REAL NOT NULL,
+              cpu_percent REAL,
+              rss_mb REAL,
+              threads INTEGER,
+              skipped INTEGER,
+              errors INTEGER
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS ix_agent_stats_ts ON agent_stats(ts)")
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS agent_stage_stats(
+              ts REAL NOT NULL,
+              stage TEXT NOT NULL,
+              count INTEGER,
+              errors INTEGER,
+              avg_ms REAL,
+              p50_ms REAL,
+              p95_ms REAL,
+              max_ms REAL
+            )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS ix_agent_stage_stats_ts ON agent_stage_stats(ts)")
+        self._load_state(c)
+
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            self._migrate_json_metrics(c)
+        if version < 2:
+            self._migrate_flat_tables(c)
+        elif version < 3:
+            self._backfill_rollups(c)
+        if version < 4:
+            for day in self._days:
+                self._create_partition_tables(c, day)
+        if version < 5:
+            self._migrate_inline_identity(c)
+        if version < 6:
+            for day in self._days:
+                cols = [r[1] for r in c.execute(f"PRAGMA table_info(processes_{day})")]
+                if "kind" not in cols:
+                    # every process row written before v6 was a top-N entry
+                    c.execute(f"ALTER TABLE processes_{day} ADD COLUMN kind INTEGER NOT NULL DEFAULT 0")
+        c.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _load_state(self, c: sqlite3.Connection):
+        """(Re)load writer-thread caches from the DB; also used after a rollback."""
+        row = c.execute("SELECT value FROM meta WHERE key='last_id'").fetchone()
+        self._last_id = int(row[0]) if row else 0
+        self._days = {day: (lo, hi) for day, lo, hi in c.execute("SELECT day, lo_id, hi_id FROM partitions")}
+        self._idents = dict(c.execute("SELECT hash, id FROM identities"))
+        self._rollups.reset()
+
+    def _table_exists(self, c: sqlite3.Connection, name: str) -> bool:
+        return c.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)
+        ).fetchone() is not None
+
+    def _migrate_json_metrics(self, c: sqlite3.Connection):
+        """Move legacy `metrics(id, ts, payload)` JSON rows into the typed tables."""
+        if not self._table_exists(c, "metrics"):
+            return
+        last_id = 0
+        while True:
+            rows = c.execute(
+                "SELECT id, payload FROM metrics WHERE id > ? ORDER BY id ASC LIMIT ?",
+                (last_id, _MIGRATE_CHUNK),
+            ).fetchall()
+            if not rows:
+                break
+            for row_id, payload in rows:
+                try:
+                    env = InsightEnvelope.model_validate_json(payload)
+                except Exception:
+                    # unreadable legacy row; nothing typed to keep
+                    continue
+                self._insert_envelope(c, env)
+            last_id = rows[-1][0]
+        c.execute("DROP TABLE metrics")
+
+    def _migrate_flat_tables(self, c: sqlite3.Connection):
+        """Split the v1 single `samples`/`processes` tables into day partitions."""
+        if not self._table_exists(c, "samples"):
+            return
+        cols = ", ".join(_INLINE_COLUMNS)
+        last_id = 0
+        while True:
+            rows = c.execute(
+                f"SELECT {cols} FROM samples WHERE id > ? ORDER BY id ASC LIMIT ?",
+                (last_id, _MIGRATE_CHUNK),
+            ).fetchall()
+            if not rows:
+                break
+            procs = {}
+            for sample_id, *p in c.execute(
+                f"SELECT sample_id, {', '.join(PROCESS_FIELDS)} FROM processes "
+                "WHERE sample_id BETWEEN ? AND ? ORDER BY rowid",
+                (rows[0][0], rows[-1][0]),
+            ):
+                procs.setdefault(sample_id, []).append((*p, 0))
+            for row in rows:
+                ident = self._identity_id(c, *row[-3:])
+                self._insert_row(c, (*row[1:-3], ident), procs.get(row[0], []), row_id=row[0])
+            last_id = rows[-1][0]
+        c.execute("DROP TABLE samples")
+        c.execute("DROP TABLE IF EXISTS processes")
+
+    def _migrate_inline_identity(self, c: sqlite3.Connection):
+        """Replace per-row version/device/tags with an `identities` reference (v4 -> v5)."""
+        for day in list(self._days):
+            cols = [r[1] for r in c.execute(f"PRAGMA table_info(samples_{day})")]
+            if "ident" in cols:
+                continue
+            for version, device, tags in c.execute(
+                f"SELECT DISTINCT version, device, tags FROM samples_{day}"
+            ).fetchall():
+                self._identity_id(c, version, device, tags)
+            c.execute(f"ALTER TABLE samples_{day} RENAME TO samples_{day}_v4")
+            c.execute(f"DROP INDEX IF EXISTS ix_samples_{day}_ts")
+            self._create_partition_tables(c, day)
+            keep = ", ".join(SAMPLE_COLUMNS[:-1])
+            c.execute(
+                f"INSERT INTO samples_{day}({keep}, ident) "
+                f"SELECT {', '.join('s.' + k for k in SAMPLE_COLUMNS[:-1])}, i.id FROM samples_{day}_v4 s "
+                "JOIN identities i ON i.device = s.device AND i.version IS s.version AND i.tags IS s.tags"
+            )
+            c.execute(f"DROP TABLE samples_{day}_v4")
+
+    def _backfill_rollups(self, c: sqlite3.Connection):
+        """Build rollups for history written before they existed (v2 -> v3)."""
+        cols = ", ".join(("ts", *RESOURCE_FIELDS))
+        for (day,) in c.execute("SELECT day FROM partitions ORDER BY start ASC").fetchall():
+            for ts, *values in c.execute(
+                f"SELECT {cols} FROM samples_{day} WHERE cpu_percent IS NOT NULL ORDER BY ts ASC"
+            ).fetchall():
+                self._rollups.add(c, ts, dict(zip(RESOURCE_FIELDS, values)))
+
+    def _ensure_partition(self, c: sqlite3.Connection, day: str, start: float, row_id: int):
+        if day in self._days:
+            lo, hi = self._days[day]
+            if lo <= row_id <= hi:
+                return
+            lo, hi = min(lo, row_id), max(hi, row_id)
+            c.execute("UPDATE partitions SET lo_id=?, hi_id=? WHERE day=?", (lo, hi, day))
+            self._days[day] = (lo, hi)
+            return
+        self._create_partition_tables(c, day)
+        c.execute(
+            "INSERT INTO partitions(day, start, lo_id, hi_id) VALUES (?, ?, ?, ?)",
+            (day, start - start % DAY_SECONDS, row_id, row_id),
+        )
+        self._days[day] = (row_id, row_id)
+
+    def _create_partition_tables(self, c: sqlite3.Connection, day: str):
+        c.execute(f"""
+            CREATE TABLE IF NOT EXISTS samples_{day}(
+              id INTEGER PRIMARY KEY,
+              ts REAL NOT NULL,
+              {", ".join(f"{f} {'INTEGER' if f == 'uptime_seconds' else 'REAL'}" for f in RESOURCE_FIELDS)},
+              proc_ts REAL,
+              ident INTEGER
+            )
+        """)
+        c.execute(f"CREATE INDEX IF NOT EXISTS ix_samples_{day}_ts ON samples_{day}(ts)")
+        c.execute(f"""
+            CREATE TABLE IF NOT EXISTS processes_{day}(
+              sample_id INTEGER NOT NULL,
+              pid INTEGER NOT NULL,
+              name TEXT NOT NULL,
+              cpu_percent REAL NOT NULL,
+              mem_percent REAL NOT NULL,
+              kind INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        c.execute(f"CREATE INDEX IF NOT EXISTS ix_processes_{day}_sample ON processes_{day}(sample_id)")
+        c.execute(f"""
+            CREATE TABLE IF NOT EXISTS devices_{day}(
+              sample_id INTEGER NOT NULL,
+              kind TEXT NOT NULL,
+              name TEXT NOT NULL,
+              in_bps REAL,
+              out_bps REAL,
+              in_ops REAL,
+              out_ops REAL
+            )
+        """)
+        c.execute(f"CREATE INDEX IF NOT EXISTS ix_devices_{day}_sample ON devices_{day}(sample_id)")
+
+    def _drop_partition(self, c: sqlite3.Connection, day: str):
+        if day in self._days:
+            c.execute("DELETE FROM inventory WHERE sample_id BETWEEN ? AND ?", self._days[day])
+        c.execute(f"DROP TABLE IF EXISTS processes_{day}")
+        c.execute(f"DROP TABLE IF EXISTS devices_{day}")
+        c.execute(f"DROP TABLE IF EXISTS samples_{day}")
+        c.execute("DELETE FROM partitions WHERE day=?", (day,))
+        self._days.pop(day, None)
+
+    # ---------- Writes ----------
+    def _identity_id(self, c: sqlite3.Connection, version: str, device: str, tags: str) -> int:
+        """Row id of the (version, device, tags) identity, inserting it the first time it is seen."""
+        h = identity_hash(version, device, tags)
+        ident = self._idents.get(h)
+        if ident is None:
+            ident = c.execute(
+                "INSERT INTO identities(hash, version, device, tags) VALUES (?, ?, ?, ?)",
+                (h, version, device, tags),
+            ).lastrowid
+            self._idents[h] = ident
+        return ident
+
+    def _insert_row(self, c: sqlite3.Connection, values, procs, row_id: int = None, devices=()):
+        """
+        values: SAMPLE_COLUMNS minus id; procs: PROCESS_COLUMNS tuples;
+        devices: DEVICE_FIELDS tuples. Runs on the writer thread.
+        """
+        if row_id is None:
+            row_id = self._last_id + 1
+        self._last_id = max(self._last_id, row_id)
+        ts = values[0]
+        day = day_key(ts)
+        self._ensure_partition(c, day, ts, row_id)
+        c.execute(
+            f"INSERT INTO samples_{day}({', '.join(SAMPLE_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(SAMPLE_COLUMNS))})",
+            (row_id, *values),
+        )
+        if procs:
+            c.executemany(
+                f"INSERT INTO processes_{day}(sample_id, {', '.join(PROCESS_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                [(row_id, *p) for p in procs],
+            )
+        if devices:
+            c.executemany(
+                f"INSERT INTO devices_{day}(sample_id, {', '.join(DEVICE_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(row_id, *d) for d in devices],
+            )
+        c.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('last_id', ?)", (self._last_id,))
+        if values[1] is not None:
+            self._rollups.add(c, ts, dict(zip(RESOURCE_FIELDS, values[1:1 + len(RESOURCE_FIELDS)])))
+        return row_id
+
+    def _insert_envelope(self, c: sqlite3.Connection, env: InsightEnvelope):
+        device = env.device.model_dump_json()
+        tags = json.dumps(env.tags, separators=(",", ":"))
+        ident = self._identity_id(c, env.version, device, tags)
+        snaps = ([env.processes] if env.processes else []) + list(env.process_samples)
+
+        def procs(snap):
+            return [(p.pid, p.name, p.cpu_percent, p.mem_percent, k)
+                    for k, kind in enumerate(PROCESS_KINDS) for p in getattr(snap, kind)]
+
+        # the first process snapshot rides on the first sample row, the rest get rows of their own
+        for i, s in enumerate(env.samples):
+            attach = snaps[0] if i == 0 and snaps else None
+            values = [getattr(s, f) for f in RESOURCE_FIELDS]
+            devices = [("nic", n.name, n.rx_bps, n.tx_bps, n.rx_pps, n.tx_pps) for n in s.nics]
+            devices += [("disk", d.name, d.read_bps, d.write_bps, d.read_iops, d.write_iops) for d in s.disks]
+            self._insert_row(
+                c, (to_epoch(s.ts), *values, to_epoch(attach.ts) if attach else None, ident),
+                procs(attach) if attach else [], devices=devices,
+            )
+        for snap in snaps[1 if env.samples else 0:]:
+            ts = to_epoch(snap.ts)
+            self._insert_row(c, (ts, *[None] * len(RESOURCE_FIELDS), ts, ident), procs(snap))
+        for rec in env.inventory:
+            ts = to_epoch(rec.ts)
+            row_id = self._insert_row(c, (ts, *[None] * len(RESOURCE_FIELDS), None, ident), [])
+            c.execute(
+                "INSERT INTO inventory(sample_id, ts, hash, base, full, fields) VALUES (?, ?, ?, ?, ?, ?)",
+                (row_id, ts, rec.hash, rec.base, int(rec.full),
+                 json.dumps(rec.fields, separators=(",", ":"), default=str)),
+            )
+
+    def append_envelope(self, env: InsightEnvelope):
+        """Queue an envelope for the next group commit; returns a Future."""
+        return self._writer.submit(lambda conn: self._insert_envelope(conn, env))
+
+    def append_inventory(self, env: InsightEnvelope, state: dict):
+        """Queue an envelope of inventory records together with the tracker state they leave behind."""
+
+        def job(conn):
+            self._insert_envelope(conn, env)
+            conn.execute("INSERT OR REPLACE INTO meta(key, value) VALUES ('inventory', ?)",
+                         (json.dumps(state, separators=(",", ":"), default=str),))
+
+        return self._writer.submit(job)
+
+    def inventory_state(self):
+        """Tracker state saved by the last append_inventory(), or None."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key='inventory'").fetchone()
+        return json.loads(row[0]) if row else None
+
+    def append_alerts(self, env: InsightEnvelope):
+        """
+        Record an envelope's alerts and commit at once rather than with the
+        next group commit; on_alert() listeners run once they are durable.
+        """
+        ident_args = (env.version, env.device.model_dump_json(), json.dumps(env.tags, separators=(",", ":")))
+
+        def job(conn):
+            ident = self._identity_id(conn, *ident_args)
+            conn.executemany(
+                "INSERT INTO alerts(ts, ident, priority, rule, field, state, severity, value, lim) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(to_epoch(a.ts), ident, SEVERITIES.get(a.severity, 0), a.rule, a.field, a.state, a.severity,
+                  a.value, a.limit) for a in env.alerts],
+            )
+
+        fut = self._writer.submit(job, flush=True)
+        fut.add_done_callback(self._alerted)
+        return fut
+
+    def on_alert(self, fn):
+        """Call fn() (on the writer thread; keep it cheap) whenever new alerts are committed."""
+        self._alert_listeners.append(fn)
+
+    def off_alert(self, fn):
+        if fn in self._alert_listeners:
+            self._alert_listeners.remove(fn)
+
+    def _alerted(self, fut):
+        if fut.exception() is None:
+            for fn in list(self._alert_listeners):
+                fn()
 
     def append_json(self, ts_iso: str, payload_json: str):
-        self.conn.execute(
-            "INSERT INTO metrics(ts, payload) VALUES (?, ?)",
-            (ts_iso, payload_json)
+        """Compatibility shim: parse an envelope JSON string into typed rows."""
+        return self.append_envelope(InsightEnvelope.model_validate_json(payload_json))
+
+    def prune_days(self, days: int = 14, delivered: int = None, alerts_delivered: int = None):
+        """
+        Drop day partitions that lie entirely before now - `days`, and trim
+        each rollup tier to its own retention.
+
+        `delivered` / `alerts_delivered` are the ids every sink has
+        acknowledged (see delivered(); None when there are no sinks):
+        partitions and alerts a sink still needs are kept past retention
+        until it catches up, leaving the spool cap (maintain) as the only
+        thing that drops them early.
+
+        Cheap to call every loop: nothing is queued until the cutoff crosses
+        into a new day (or while expired data is held for a sink), so at
+        most one expiry job runs per day boundary.
+        """
+        now = to_epoch(datetime.utcnow())
+        cutoff = now - days * DAY_SECONDS
+        boundary = cutoff - cutoff % DAY_SECONDS
+        if boundary == self._pruned_before and not self._prune_held:
+            return None
+        self._pruned_before = boundary
+
+        def job(conn):
+            expired, held = [], False
+            for day, hi_id in conn.execute("SELECT day, hi_id FROM partitions WHERE start + ? <= ?",
+                                           (DAY_SECONDS, boundary)).fetchall():
+                if delivered is not None and hi_id > delivered:
+                    held = True
+                    continue
+                self._drop_partition(conn, day)
+                expired.append(day)
+            self._rollups.prune(conn, now)
+            if alerts_delivered is None:
+                conn.execute("DELETE FROM alerts WHERE ts < ?", (boundary,))
+            else:
+                conn.execute("DELETE FROM alerts WHERE ts < ? AND id <= ?", (boundary, alerts_delivered))
+                held = held or conn.execute("SELECT 1 FROM alerts WHERE ts < ? LIMIT 1", (boundary,)).fetchone()
+            self._prune_held = bool(held)
+            conn.execute("DELETE FROM agent_stats WHERE ts < ?", (boundary,))
+            conn.execute("DELETE FROM agent_stage_stats WHERE ts < ?", (boundary,))
+            return expired
+
+        return self._writer.submit(job)
+
+    def append_telemetry(self, ts: datetime, snap: dict):
+        """Store one Telemetry.snapshot() next to the samples it describes."""
+        t = to_epoch(ts)
+        agent = snap.get("agent") or {}
+        stages = snap.get("stages") or {}
+
+        def job(conn):
+            conn.execute(
+                "INSERT INTO agent_stats(ts, cpu_percent, rss_mb, threads, skipped, errors) VALUES (?, ?, ?, ?, ?, ?)",
+                (t, agent.get("cpu_percent"), agent.get("rss_mb"), agent.get("threads"),
+                 agent.get("skipped"), agent.get("errors")),
+            )
+            conn.executemany(
+                "INSERT INTO agent_stage_stats(ts, stage, count, errors, avg_ms, p50_ms, p95_ms, max_ms) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(t, name, st["count"], st["errors"], st["avg_ms"], st["p50_ms"], st["p95_ms"], st["max_ms"])
+                 for name, st in stages.items()],
+            )
+
+        return self._writer.submit(job)
+
+    # ---------- Spool size ----------
+    @staticmethod
+    def _pragma(c: sqlite3.Connection, name: str) -> int:
+        return c.execute(f"PRAGMA {name}").fetchone()[0]
+
+    def _used_bytes(self, c: sqlite3.Connection) -> int:
+        return (self._pragma(c, "page_count") - self._pragma(c, "freelist_count")) * self._pragma(c, "page_size")
+
+    @staticmethod
+    def _strip_detail(c: sqlite3.Connection, day: str, upto: int = None) -> bool:
+        """Delete one day's process lists and per-device rates (of rows up to id `upto`); False if there were none."""
+        where, args = ("", ()) if upto is None else (" WHERE sample_id <= ?", (upto,))
+        gone = c.execute(f"DELETE FROM processes_{day}{where}", args).rowcount
+        gone += c.execute(f"DELETE FROM devices_{day}{where}", args).rowcount
+        if not gone:
+            return False
+        also = "" if upto is None else " AND id <= ?"
+        # rows that only carried a process snapshot have nothing left
+        c.execute(f"DELETE FROM samples_{day} WHERE cpu_percent IS NULL AND proc_ts IS NOT NULL{also}", args)
+        c.execute(f"UPDATE samples_{day} SET proc_ts = NULL WHERE proc_ts IS NOT NULL{also}", args)
+        return True
+
+    def _evict(self, c: sqlite3.Connection, max_bytes: int, delivered: int = None):
+        """
+        Bring the store back under `max_bytes`, lowest-value data first:
+        process lists and per-device rates of the oldest days, then whole
+        sample partitions, oldest first. The newest day's samples and the
+        rollups (bounded by their own retention) are never evicted.
+
+        `delivered` is the id every sink has acknowledged (None when there
+        are no sinks). Only rows up to it are evicted at first; rows a sink
+        still needs go only if the store is over `max_bytes` even after that.
+        Returns ([(day, "detail" | "samples")] in eviction order, number of
+        undelivered rows dropped). Undelivered rows that only lose their
+        detail are still delivered, so they are not counted.
+        """
+        target = max_bytes * _EVICT_TARGET
+        used = self._used_bytes(c)
+        if used <= max_bytes:
+            return [], 0
+        evicted, lost, hard = [], {}, None
+        parts = c.execute("SELECT day, hi_id FROM partitions ORDER BY start ASC").fetchall()
+        for upto in ([None] if delivered is None else [delivered, None]):
+            if upto is None and delivered is not None:
+                if used <= max_bytes:
+                    break
+                # hard cap: from here on rows no sink has acknowledged are evicted too
+                hard = len(evicted)
+                for day, hi_id in parts:
+                    if hi_id > delivered:
+                        lost[day] = c.execute(f"SELECT COUNT(*) FROM samples_{day} WHERE id > ?",
+                                              (delivered,)).fetchone()[0]
+            for day, _ in parts:
+                if used <= target:
+                    break
+                if self._strip_detail(c, day, upto):
+                    evicted.append((day, "detail"))
+                    used = self._used_bytes(c)
+            for day, hi_id in parts[:-1]:
+                if used <= target:
+                    break
+                if upto is not None and hi_id > upto:
+                    break
+                self._drop_partition(c, day)
+                evicted.append((day, "samples"))
+                used = self._used_bytes(c)
+            gone = {day for day, kind in evicted if kind == "samples"}
+            parts = [p for p in parts if p[0] not in gone]
+        dropped = {day for day, kind in evicted[hard:] if kind == "samples"} if hard is not None else set()
+        return evicted, sum(n for day, n in lost.items() if day in dropped)
+
+    def _vacuum(self, c: sqlite3.Connection, pages: int) -> int:
+        """Release up to `pages` free pages to the OS; returns how many were released."""
+        n = min(pages, self._pragma(c, "freelist_count"))
+        # sqlite3 steps a PRAGMA once, and each step of incremental_vacuum frees one page
+        for _ in range(n):
+            c.execute("PRAGMA incremental_vacuum(1)")
+        return n
+
+    def maintain(self, max_bytes: int = None, delivered: int = None) -> dict:
+        """
+        Evict down under `max_bytes` (if given), sparing rows above
+        `delivered` unless the cap leaves no choice (see _evict), then
+        release a bounded number of free pages to the OS. Blocks until
+        committed and returns {"used_bytes", "file_bytes", "evicted",
+        "undelivered", "vacuumed"}.
+        """
+
+        def job(conn):
+            evicted, undelivered = self._evict(conn, max_bytes, delivered) if max_bytes else ([], 0)
+            vacuumed = self._vacuum(conn, _VACUUM_PAGES)
+            return {
+                "used_bytes": self._used_bytes(conn),
+                "file_bytes": self._pragma(conn, "page_count") * self._pragma(conn, "page_size"),
+                "evicted": evicted,
+                "undelivered": undelivered,
+                "vacuumed": vacuumed,
+            }
+
+        return self._writer.call(job)
+
+    # ---------- Reads ----------
+    def _partitions(self, start: float = None, end: float = None, after_id: int = None):
+        """Day partitions overlapping [start, end) / holding ids > after_id, oldest first."""
+        q, args = "SELECT day FROM partitions WHERE 1=1", []
+        if start is not None:
+            q += " AND start + ? > ?"
+            args += [DAY_SECONDS, start]
+        if end is not None:
+            q += " AND start < ?"
+            args.append(end)
+        if after_id is not None:
+            q += " AND hi_id > ?"
+            args.append(after_id)
+        return [d for (d,) in self.conn.execute(q + " ORDER BY start ASC", args)]
+
+    def _meta(self, ident: int) -> dict:
+        """RowGroup meta for an identities row; rows never change, so cache them."""
+        meta = self._ident_cache.get(ident)
+        if meta is None:
+            h, version, device, tags = self.conn.execute(
+                "SELECT hash, version, device, tags FROM identities WHERE id=?", (ident,)
+            ).fetchone()
+            meta = self._ident_cache[ident] = {
+                "version": version or "1.0",
+                "device": json.loads(device),
+                "tags": json.loads(tags or "{}"),
+                "identity": h,
+            }
+        return meta
+
+    def _group(self, ident: int, rows) -> RowGroup:
+        """RowGroup for rows_after() tuples that share an identity."""
+        samples = [
+            ((timedelta(seconds=row[1])) // _US, tuple(row[2:9]), devices)
+            for row, procs, devices, inv in rows if row[2] is not None
+        ]
+        snaps = [
+            ((timedelta(seconds=row[9])) // _US, procs)
+            for row, procs, devices, inv in rows if row[9] is not None
+        ]
+        inventory = [((timedelta(seconds=row[1])) // _US, inv) for row, procs, devices, inv in rows if inv]
+        return RowGroup(self._meta(ident), samples, snaps, inventory)
+
+    def rows_after(self, after_id: int, limit: int):
+        """
+        Up to `limit` (row, procs, devices, inventory) tuples with id >
+        after_id, in id order; inventory is the row's record dict or None.
+        """
+        cols = ", ".join(SAMPLE_COLUMNS)
+        picked = []
+        parts = self.conn.execute(
+            "SELECT day, lo_id FROM partitions WHERE hi_id > ? ORDER BY lo_id ASC", (after_id,)
+        ).fetchall()
+        for day, lo_id in parts:
+            # picked ids below this partition's lowest id beat anything in it; ranges only overlap for late rows
+            settled = bisect.bisect_left(picked, lo_id, key=lambda rd: rd[0][0])
+            if settled >= limit:
+                break
+            rows = [(row, day) for row in self.conn.execute(
+                f"SELECT {cols} FROM samples_{day} WHERE id > ? ORDER BY id ASC LIMIT ?",
+                (after_id, limit - settled),
+            )]
+            picked = list(heapq.merge(picked, rows, key=lambda rd: rd[0][0]))[:limit]
+        return self._with_children(picked)
+
+    def _with_children(self, picked):
+        """[(row, day), ...] in id order -> rows_after() tuples."""
+        # one child-table range read per partition instead of one per row
+        procs = {}
+        devices = {}
+        by_day = {}
+        for row, day in picked:
+            by_day.setdefault(day, []).append(row[0])
+        for day, ids in by_day.items():
+            for sample_id, *p in self.conn.execute(
+                f"SELECT sample_id, {', '.join(PROCESS_COLUMNS)} FROM processes_{day} "
+                "WHERE sample_id BETWEEN ? AND ? ORDER BY rowid",
+                (ids[0], ids[-1]),
+            ):
+                procs.setdefault(sample_id, []).append(p)
+            for sample_id, *d in self.conn.execute(
+                f"SELECT sample_id, {', '.join(DEVICE_FIELDS)} FROM devices_{day} "
+                "WHERE sample_id BETWEEN ? AND ? ORDER BY rowid",
+                (ids[0], ids[-1]),
+            ):
+                devices.setdefault(sample_id, []).append(d)
+        inventory = {}
+        if picked:
+            for sample_id, h, base, full, fields in self.conn.execute(
+                "SELECT sample_id, hash, base, full, fields FROM inventory WHERE sample_id BETWEEN ? AND ?",
+                (picked[0][0][0], picked[-1][0][0]),
+            ):
+                inventory[sample_id] = {"hash": h, "base": base, "full": bool(full), "fields": json.loads(fields)}
+        return [(row, procs.get(row[0], []), devices.get(row[0], []), inventory.get(row[0])) for row, _ in picked]
+
+    def groups_between(self, start: datetime, end: datetime, chunk_rows: int = 5000):
+        """
+        Every stored row with ts in [start, end), yielded as row_groups()
+        lists of at most `chunk_rows` rows each, partition by partition in
+        id order. Only one chunk is in memory at a time.
+        """
+        cols = ", ".join(SAMPLE_COLUMNS)
+        lo, hi = to_epoch(start), to_epoch(end)
+        for day in self._partitions(lo, hi):
+            after = 0
+            while True:
+                rows = self.conn.execute(
+                    f"SELECT {cols} FROM samples_{day} WHERE id > ? AND ts >= ? AND ts < ? ORDER BY id ASC LIMIT ?",
+                    (after, lo, hi, chunk_rows),
+                ).fetchall()
+                if not rows:
+                    break
+                after = rows[-1][0]
+                yield self.group_rows(self._with_children([(row, day) for row in rows]))
+
+    def count_between(self, start: datetime, end: datetime, samples_only: bool = True) -> int:
+        """Rows with ts in [start, end): resource samples only, or every row groups_between() yields."""
+        lo, hi = to_epoch(start), to_epoch(end)
+        where = "ts >= ? AND ts < ?" + (" AND cpu_percent IS NOT NULL" if samples_only else "")
+        return sum(
+            self.conn.execute(f"SELECT COUNT(*) FROM samples_{day} WHERE {where}", (lo, hi)).fetchone()[0]
+            for day in self._partitions(lo, hi)
         )
-        self.conn.commit()
 
-    def prune_days(self, days: int = 14):
-        cutoff = (datetime.utcnow() - timedelta(days=days)).isoformat()
-        self.conn.execute("DELETE FROM metrics WHERE ts < ?", (cutoff,))
-        self.conn.commit()
+    def batch(self, limit: int = 200, after_id: int = 0):
+        """
+        Oldest `limit` rows with id > after_id as (id, envelope_json), rebuilt
+        from the typed tables.
+        """
+        return [
+            (r[0][0], to_envelope(self._group(r[0][10], [r]), single=True).model_dump_json())
+            for r in self.rows_after(after_id, limit)
+        ]
+
+    def row_groups(self, limit: int = 200, after_id: int = 0):
+        """
+        Up to `limit` rows with id > after_id, with consecutive rows that
+        share an identity folded into one RowGroup. Returns
+        (first_id, last_id, rows, RowGroup) tuples; see transport.columnar.
+        """
+        return self.group_rows(self.rows_after(after_id, limit))
+
+    def group_rows(self, rows):
+        """row_groups() for tuples already read with rows_after()."""
+        runs = []
+        for r in rows:
+            if not runs or runs[-1][0] != r[0][10]:
+                runs.append((r[0][10], []))
+            runs[-1][1].append(r)
+        return [
+            (rows[0][0][0], rows[-1][0][0], len(rows), self._group(ident, rows))
+            for ident, rows in runs
+        ]
+
+    def alert_groups(self, after_id: int = 0, limit: int = 500):
+        """
+        Alerts with id > after_id as (last_id, [RowGroup, ...]): one group
+        per identity, each ordered by priority (critical first), then id.
+        last_id is the cursor to store once they are delivered.
+        """
+        rows = self.conn.execute(
+            "SELECT id, ts, ident, priority, rule, field, state, severity, value, lim FROM alerts "
+            "WHERE id > ? ORDER BY id ASC LIMIT ?",
+            (after_id, limit),
+        ).fetchall()
+        if not rows:
+            return after_id, []
+        by_ident = {}
+        for row in sorted(rows, key=lambda r: (-r[3], r[0])):
+            by_ident.setdefault(row[2], []).append(row)
+        groups = [
+            RowGroup(self._meta(ident), [], [], (), [
+                ((timedelta(seconds=ts)) // _US,
+                 {"rule": rule, "field": field, "state": state, "severity": sev, "value": value, "limit": lim})
+                for _, ts, _, _, rule, field, state, sev, value, lim in picked
+            ])
+            for ident, picked in by_ident.items()
+        ]
+        return rows[-1][0], groups
+
+    def telemetry_latest(self):
+        """Most recent telemetry snapshot as (ts, agent, stages), or None."""
+        row = self.conn.execute(
+            "SELECT ts, cpu_percent, rss_mb, threads, skipped, errors FROM agent_stats ORDER BY ts DESC LIMIT 1"
+        ).fetchone()
+        if not row:
+            return None
+        ts, cpu, rss, threads, skipped, errors = row
+        stages = {
+            stage: {"count": n, "errors": e, "avg_ms": avg, "p50_ms": p50, "p95_ms": p95, "max_ms": mx}
+            for stage, n, e, avg, p50, p95, mx in self.conn.execute(
+                "SELECT stage, count, errors, avg_ms, p50_ms, p95_ms, max_ms FROM agent_stage_stats "
+                "WHERE ts = ? ORDER BY stage",
+                (ts,),
+            )
+        }
+        agent = {"cpu_percent": cpu, "rss_mb": rss, "threads": threads, "skipped": skipped, "errors": errors}
+        return from_epoch(ts), agent, stages
+
+    # ---------- Delivery cursors ----------
+    def get_cursor(self, name: str) -> int:
+        """Highest row id acknowledged by delivery target `name` (0 if none)."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key=?", (f"cursor:{name}",)).fetchone()
+        return int(row[0]) if row else 0
 
-    def batch(self, limit: int = 200):
+    def set_cursor(self, name: str, row_id: int):
+        """Persist a delivery cursor with the next group commit; returns a Future."""
+        return self._writer.submit(
+            lambda conn: conn.execute(
+                "INSERT OR REPLACE INTO meta(key, value) VALUES (?, ?)", (f"cursor:{name}", int(row_id))
+            )
+        )
+
+    def delivered(self, names):
+        """Highest row id acknowledged by every target in `names` (None if there are none)."""
+        return min((self.get_cursor(name) for name in names), default=None)
+
+    def pending_since(self, name: str):
+        """Timestamp of the oldest row not yet acknowledged by `name`, or None when it is caught up."""
+        after = self.get_cursor(name)
+        for day in self._partitions(after_id=after):
+            row = self.conn.execute(
+                f"SELECT ts FROM samples_{day} WHERE id > ? ORDER BY id ASC LIMIT 1", (after,)
+            ).fetchone()
+            if row:
+                return from_epoch(row[0])
+        return None
+
+    def samples_between(self, start: datetime, end: datetime, fields=RESOURCE_FIELDS):
+        """Yield (ts, *fields) for resource samples in [start, end), oldest first."""
+        cols = _check_fields(fields)
+        lo, hi = to_epoch(start), to_epoch(end)
+        # partitions are per day, so walking them in day order keeps ts order
+        for day in self._partitions(lo, hi):
+            cur = self.conn.execute(
+                f"SELECT ts, {', '.join(cols)} FROM samples_{day} "
+                "WHERE ts >= ? AND ts < ? AND cpu_percent IS NOT NULL ORDER BY ts ASC",
+                (lo, hi),
+            )
+            for ts, *values in cur:
+                yield (from_epoch(ts), *values)
+
+    def query(self, start: datetime, end: datetime, fields=RESOURCE_FIELDS, bucket: float = 300):
+        """
+        Yield (bucket_start, {field: {"min", "max", "avg", "n"}}) for resource
+        samples in [start, end), grouped into epoch-aligned `bucket`-second
+        buckets, oldest first. Empty buckets are skipped.
+
+        When every field is rolled up and `bucket` is a multiple of an hourly
+        or coarser tier's width, the tier-aligned middle of the range is read from the
+        coarsest such tier still retained there (one row per tier bucket
+        instead of every sample) and only the partial buckets at either end
+        from the raw partitions; n/min/max/sum merge exactly, so the result
+        is the same. Otherwise each day partition is aggregated in SQL over
+        its ts index. Results are streamed; a bucket that straddles a
+        partition (or tier) boundary is merged.
+        """
+        cols = _check_fields(fields)
+        bucket = float(bucket)
+        if bucket <= 0:
+            raise ValueError("bucket must be a positive number of seconds")
+        lo, hi = to_epoch(start), to_epoch(end)
+        parts = [self._raw_buckets(cols, lo, hi, bucket)]
+        if set(cols) <= set(ROLLUP_FIELDS):
+            for tier, width in reversed(self.rollup_tiers(start)):
+                if width >= QUERY_MIN_TIER_SECONDS and bucket % width == 0:
+                    a = min(hi, lo + (-lo) % width)  # first tier boundary at or after lo
+                    z = max(a, hi - hi % width)
+                    parts = [self._raw_buckets(cols, lo, a, bucket), self._rollup_buckets(tier, cols, a, z, bucket),
+                             self._raw_buckets(cols, z, hi, bucket)]
+                    break
+        pending = None  # [bucket, [n, min, max, sum] * len(cols)]
+        for b, *agg in (row for part in parts for row in part):
+            if pending and pending[0] == b:
+                acc = pending[1]
+                for i in range(len(cols)):
+                    n, mn, mx, total = agg[4 * i: 4 * i + 4]
+                    if not n:
+                        continue
+                    pn, pmn, pmx, ptotal = acc[4 * i: 4 * i + 4]
+                    acc[4 * i: 4 * i + 4] = [
+                        pn + n,
+                        mn if pmn is None else min(pmn, mn),
+                        mx if pmx is None else max(pmx, mx),
+                        total + (ptotal or 0),
+                    ]
+                continue
+            if pending:
+                yield self._query_point(pending, cols, bucket)
+            pending = [b, list(agg)]
+        if pending:
+            yield self._query_point(pending, cols, bucket)
+
+    def _raw_buckets(self, cols, lo: float, hi: float, bucket: float):
+        """(bucket index, [n, min, max, sum] per field) from the day partitions over [lo, hi)."""
+        if hi <= lo:
+            return
+        exprs = ", ".join(f"COUNT({f}), MIN({f}), MAX({f}), SUM({f})" for f in cols)
+        for day in self._partitions(lo, hi):
+            yield from self.conn.execute(
+                f"SELECT CAST(ts / ? AS INTEGER) AS b, {exprs} FROM samples_{day} "
+                "WHERE ts >= ? AND ts < ? AND cpu_percent IS NOT NULL GROUP BY b ORDER BY b",
+                (bucket, lo, hi),
+            )
+
+    def _rollup_buckets(self, tier: str, cols, lo: float, hi: float, bucket: float):
+        """_raw_buckets() rows built from `tier`'s rollups for a tier-aligned [lo, hi)."""
+        if hi <= lo:
+            return
+        at = {f: 4 * i for i, f in enumerate(cols)}
         cur = self.conn.execute(
-            "SELECT id, payload FROM metrics ORDER BY id ASC LIMIT ?",
-            (limit,)
+            f"SELECT CAST(bucket / ? AS INTEGER) AS b, metric, SUM(n), MIN(min), MAX(max), SUM(sum) FROM rollups "
+            f"WHERE tier=? AND bucket >= ? AND bucket < ? AND metric IN ({', '.join('?' * len(cols))}) "
+            "GROUP BY b, metric ORDER BY b",
+            (bucket, tier, lo, hi, *cols),
         )
-        return cur.fetchall()
+        b0, agg = None, None
+        for b, metric, *stats in cur:
+            if b != b0:
+                if agg:
+                    yield (b0, *agg)
+                b0, agg = b, [0, None, None, None] * len(cols)
+            agg[at[metric]: at[metric] + 4] = stats
+        if agg:
+            yield (b0, *agg)
 
-    def delete_ids(self, ids):
-        if not ids:
+    def rollup_tiers(self, start: datetime):
+        """[(tier, width)] whose retention still reaches back to `start`, finest first."""
+        age = to_epoch(datetime.utcnow()) - to_epoch(start)
+        return [(tier, width) for tier, width in TIERS
+                if self._rollups.retention.get(tier) is None or age <= self._rollups.retention[tier] * DAY_SECONDS]
+
+    @staticmethod
+    def _query_point(pending, cols, bucket):
+        b, acc = pending
+        point = {}
+        for i, f in enumerate(cols):
+            n, mn, mx, total = acc[4 * i: 4 * i + 4]
+            point[f] = {"min": mn, "max": mx, "avg": total / n if n else None, "n": n}
+        return from_epoch(b * bucket), point
+
+    def rollup_series(self, tier: str, start: datetime, end: datetime, fields=ROLLUP_FIELDS):
+        """
+        Yield (bucket_start, {field: {"min", "max", "avg", "p95", "n"}}) for a
+        rollup tier ("1m", "1h", "1d") over [start, end), oldest first.
+        """
+        if tier not in TIER_WIDTH:
+            raise ValueError(f"Unknown rollup tier: {tier}")
+        cols = [f for f in _check_fields(fields) if f in ROLLUP_FIELDS]
+        if not cols:
             return
-        q = "DELETE FROM metrics WHERE id IN ({})".format(",".join("?" * len(ids)))
-        self.conn.execute(q, ids)
-        self.conn.commit()
+        cur = self.conn.execute(
+            f"SELECT bucket, metric, n, min, max, sum, p95 FROM rollups "
+            f"WHERE tier=? AND bucket >= ? AND bucket < ? AND metric IN ({', '.join('?' * len(cols))}) "
+            "ORDER BY bucket ASC",
+            (tier, to_epoch(start), to_epoch(end), *cols),
+        )
+        bucket, point = None, {}
+        for b, metric, n, mn, mx, total, p95 in cur:
+            if b != bucket and point:
+                yield from_epoch(bucket), point
+                point = {}
+            bucket = b
+            if p95 is not None and mn is not None:
+                # rows written before p95 was clamped to the observed range
+                p95 = min(max(p95, mn), mx)
+            point[metric] = {"min": mn, "max": mx, "avg": total / n if n else None, "p95": p95, "n": n}
+        if point:
+            yield from_epoch(bucket), point
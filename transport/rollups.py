@@ -0,0 +1,182 @@
+import json
+import math
+import sqlite3
+
+# (name, bucket width in seconds)
+TIERS = (("1m", 60), ("1h", 3600), ("1d", 86400))
+TIER_WIDTH = dict(TIERS)
+
+# default per-tier retention in days (raw samples use retention_days)
+DEFAULT_RETENTION = {"1m": 3, "1h": 180, "1d": 1825}
+
+# ResourceSample fields worth downsampling
+ROLLUP_FIELDS = ("cpu_percent", "mem_percent", "disk_used_gb", "net_tx_kbps", "net_rx_kbps")
+
+
+class QuantileSketch:
+    """
+    Log-bucketed histogram with bounded relative error (DDSketch style).
+
+    Values land in bucket ceil(log_gamma(x)); any quantile is then within
+    `alpha` of the true value. Memory is O(distinct buckets), which stays
+    small for metrics such as percentages and kbps.
+    """
+
+    def __init__(self, alpha: float = 0.02, bins: dict = None, zeros: float = 0.0):
+        self.alpha = alpha
+        self._gamma = (1 + alpha) / (1 - alpha)
+        self._log_gamma = math.log(self._gamma)
+        self.bins = bins or {}
+        self.zeros = zeros
+        self.count = zeros + sum(self.bins.values())
+
+    def add(self, x: float, weight: float = 1.0):
+        if x <= 0:
+            self.zeros += weight
+        else:
+            k = math.ceil(math.log(x) / self._log_gamma)
+            self.bins[k] = self.bins.get(k, 0) + weight
+        self.count += weight
+
+    def merge(self, other: "QuantileSketch"):
+        for k, c in other.bins.items():
+            self.bins[k] = self.bins.get(k, 0) + c
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def scale(self, factor: float):
+        """Multiply every count by `factor` (exponential decay of old data)."""
+        self.bins = {k: c * factor for k, c in self.bins.items() if c * factor >= 1e-3}
+        self.zeros *= factor
+        self.count = self.zeros + sum(self.bins.values())
+
+    def quantile(self, q: float):
+        if self.count <= 0:
+            return None
+        rank = q * (self.count - 1)
+        seen = self.zeros
+        if rank < seen:
+            return 0.0
+        for k in sorted(self.bins):
+            seen += self.bins[k]
+            if seen > rank:
+                # midpoint of the bucket in log space
+                return 2 * self._gamma ** k / (self._gamma + 1)
+        return 2 * self._gamma ** max(self.bins) / (self._gamma + 1)
+
+    def to_json(self) -> str:
+        return json.dumps({"z": self.zeros, "b": self.bins}, separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, text: str, alpha: float = 0.02) -> "QuantileSketch":
+        data = json.loads(text) if text else {}
+        bins = {int(k): v for k, v in (data.get("b") or {}).items()}
+        return cls(alpha, bins=bins, zeros=data.get("z", 0.0))
+
+
+class Aggregate:
+    """min/max/sum/count plus a quantile sketch for one metric in one bucket."""
+
+    __slots__ = ("n", "min", "max", "sum", "sketch")
+
+    def __init__(self, n=0, mn=None, mx=None, total=0.0, sketch=None):
+        self.n = n
+        self.min = mn
+        self.max = mx
+        self.sum = total
+        self.sketch = sketch or QuantileSketch()
+
+    def add(self, x: float):
+        self.n += 1
+        self.min = x if self.min is None else min(self.min, x)
+        self.max = x if self.max is None else max(self.max, x)
+        self.sum += x
+        self.sketch.add(x)
+
+    def p95(self):
+        # the sketch answers with a bucket midpoint, which can land just outside what was observed
+        q = self.sketch.quantile(0.95)
+        return None if q is None else min(max(q, self.min), self.max)
+
+    def row(self):
+        return self.n, self.min, self.max, self.sum, self.p95(), self.sketch.to_json()
+
+
+class Rollups:
+    """
+    Incrementally maintained 1m/1h/1d aggregates stored in the `rollups` table.
+
+    Only the open bucket of each tier/metric is cached; a sample for any other
+    bucket (restart, late data) loads that bucket's row first, so updates are
+    always read-merge-write and never re-scan raw samples.
+    """
+
+    def __init__(self, retention: dict = None):
+        self.retention = dict(DEFAULT_RETENTION)
+        self.retention.update(retention or {})
+        self._open = {}  # (tier, metric) -> (bucket, Aggregate)
+
+    def reset(self):
+        """Forget cached open buckets; the next add() reloads them from the table."""
+        self._open = {}
+
+    @staticmethod
+    def create(c: sqlite3.Connection):
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS rollups(
+              tier TEXT NOT NULL,
+              bucket REAL NOT NULL,
+              metric TEXT NOT NULL,
+              n INTEGER NOT NULL,
+              min REAL,
+              max REAL,
+              sum REAL,
+              p95 REAL,
+              sketch TEXT,
+              PRIMARY KEY (tier, bucket, metric)
+            ) WITHOUT ROWID
+        """)
+
+    def _load(self, c: sqlite3.Connection, tier: str, bucket: float, metric: str) -> Aggregate:
+        row = c.execute(
+            "SELECT n, min, max, sum, sketch FROM rollups WHERE tier=? AND bucket=? AND metric=?",
+            (tier, bucket, metric),
+        ).fetchone()
+        if not row:
+            return Aggregate()
+        n, mn, mx, total, sketch = row
+        return Aggregate(n, mn, mx, total, QuantileSketch.from_json(sketch))
+
+    def add(self, c: sqlite3.Connection, ts: float, values: dict):
+        """Fold one sample into every tier. Runs on the store's writer thread."""
+        rows = []
+        for tier, width in TIERS:
+            bucket = ts - ts % width
+            for metric in ROLLUP_FIELDS:
+                x = values.get(metric)
+                if x is None:
+                    continue
+                key = (tier, metric)
+                cached = self._open.get(key)
+                if cached and cached[0] == bucket:
+                    agg = cached[1]
+                else:
+                    agg = self._load(c, tier, bucket, metric)
+                    if not cached or bucket >= cached[0]:
+                        self._open[key] = (bucket, agg)
+                agg.add(float(x))
+                rows.append((tier, bucket, metric, *agg.row()))
+        if rows:
+            c.executemany(
+                "INSERT OR REPLACE INTO rollups(tier, bucket, metric, n, min, max, sum, p95, sketch) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+
+    def prune(self, c: sqlite3.Connection, now: float):
+        """Per-tier retention; a primary-key range delete per tier."""
+        for tier, _ in TIERS:
+            days = self.retention.get(tier)
+            if days is None:
+                continue
+            c.execute("DELETE FROM rollups WHERE tier=? AND bucket < ?", (tier, now - float(days) * 86400))
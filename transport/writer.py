@@ -0,0 +1,149 @@
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+
+_STOP = object()
+
+
+class StoreWriter:
+    """
+    Owns the only write connection to a SQLite file.
+
+    Jobs are callables `fn(conn)` run on a dedicated thread. Consecutive jobs
+    share one transaction that is committed when `commit_interval` seconds
+    have passed, `max_batch` jobs are pending, or someone asks for a flush.
+    Each job runs inside its own SAVEPOINT, so a failing job is rolled back
+    on its own without losing the rest of the group.
+
+    `submit()` returns a Future that resolves with the job's return value
+    once the group containing it has been committed. `on_rollback(conn)` is
+    called after any rollback so owners can resync cached writer state, and
+    `timer(stage, seconds)` receives "store.job" / "store.commit" timings.
+    """
+
+    def __init__(self, path: str, commit_interval: float = 2.0, max_batch: int = 256,
+                 on_rollback=None, timer=None):
+        self.on_rollback = on_rollback
+        self.timer = timer
+        self.commit_interval = max(0.0, float(commit_interval))
+        self.max_batch = max(1, int(max_batch))
+        self._q: "queue.Queue" = queue.Queue()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL: fsync on checkpoint, not on every commit
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="insight-store-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def submit(self, fn, flush: bool = False) -> Future:
+        if self._closed:
+            raise RuntimeError("StoreWriter is closed")
+        fut = Future()
+        self._q.put((fn, fut, flush))
+        return fut
+
+    def call(self, fn, timeout: float = None):
+        """Run `fn(conn)` on the writer thread, commit, and return its result."""
+        return self.submit(fn, flush=True).result(timeout)
+
+    def flush(self, timeout: float = None):
+        """Block until everything queued so far is committed."""
+        if self._closed:
+            return
+        self.submit(lambda conn: None, flush=True).result(timeout)
+
+    def pending(self) -> int:
+        return self._q.qsize()
+
+    def close(self, timeout: float = 5.0):
+        if self._closed:
+            return
+        self._closed = True
+        self._q.put(_STOP)
+        self._thread.join(timeout)
+
+    # ---------- Writer thread ----------
+    def _run(self):
+        conn = self.conn
+        group = []  # futures waiting on the open transaction
+        deadline = None
+        while True:
+            try:
+                wait = None if deadline is None else max(0.0, deadline - time.monotonic())
+                item = self._q.get(timeout=wait)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                self._commit(group)
+                conn.close()
+                return
+
+            if item is not None:
+                fn, fut, force = item
+                if not group:
+                    conn.execute("BEGIN")
+                    deadline = time.monotonic() + self.commit_interval
+                conn.execute("SAVEPOINT job")
+                t0 = time.perf_counter()
+                try:
+                    result = fn(conn)
+                    conn.execute("RELEASE job")
+                    group.append((fut, result, None))
+                    self._time("store.job", t0)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO job")
+                    conn.execute("RELEASE job")
+                    group.append((fut, None, e))
+                    self._rolled_back()
+                if not (force or len(group) >= self.max_batch or time.monotonic() >= deadline):
+                    continue
+
+            if group:
+                self._commit(group)
+            group = []
+            deadline = None
+
+    def _commit(self, group):
+        if not group:
+            return
+        t0 = time.perf_counter()
+        try:
+            self.conn.execute("COMMIT")
+            self._time("store.commit", t0)
+        except Exception as e:
+            try:
+                self.conn.execute("ROLLBACK")
+            except Exception:
+                pass
+            self._rolled_back()
+            for fut, _, _ in group:
+                fut.set_exception(e)
+            return
+        for fut, result, err in group:
+            if err is not None:
+                fut.set_exception(err)
+            else:
+                fut.set_result(result)
+
+    def _time(self, stage, t0):
+        if self.timer:
+            try:
+                self.timer(stage, time.perf_counter() - t0)
+            except Exception:
+                pass
+
+    def _rolled_back(self):
+        if self.on_rollback:
+            try:
+                self.on_rollback(self.conn)
+            except Exception:
+                pass